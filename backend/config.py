@@ -1,9 +1,10 @@
 # Firebase Configuration for Trade-Mart Backend
-import firebase_admin
-from firebase_admin import credentials, firestore, auth
 import os
 from dotenv import load_dotenv
 
+from .storage import LazyStorage, create_storage
+from .utils.db_stats import instrument_client
+
 load_dotenv()
 
 SERVICE_ACCOUNT_PATH = os.environ.get(
@@ -21,11 +22,123 @@ FIREBASE_CONFIG = {
     "measurementId": "G-TVDRCZEL4M"
 }
 
+# 'firestore' (default), or 'memory' / 'sqlite' to run the whole API offline
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'firestore')
+SQLITE_PATH = os.environ.get('SQLITE_PATH', os.path.join(os.path.dirname(__file__), 'trademart.db'))
+
 SECRET_KEY = os.environ.get('SECRET_KEY', 'trademartkey123supersecret')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
+# Logging (see backend/utils/logconfig.py)
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_FILE = os.environ.get('LOG_FILE', 'backend.log')
+LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')  # 'json' or 'text'
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', '')  # e.g. 'midnight' for time-based rotation
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+LOG_SUCCESS_SAMPLE_RATE = float(os.environ.get('LOG_SUCCESS_SAMPLE_RATE', 1.0))
+
+# Traffic capture for replay (see backend/utils/capture.py); empty CAPTURE_FILE disables it
+CAPTURE_FILE = os.environ.get('CAPTURE_FILE', '')
+CAPTURE_SAMPLE_RATE = float(os.environ.get('CAPTURE_SAMPLE_RATE', 1.0))
+CAPTURE_MAX_BODY_BYTES = int(os.environ.get('CAPTURE_MAX_BODY_BYTES', 64 * 1024))
+
+# Shared secret for /api/admin/diagnostics and X-Profile arming; empty disables both
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN', '')
+
+# Request profiler (see backend/utils/profiler.py)
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(os.path.dirname(__file__), 'profiles'))
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.0))
+PROFILE_SLOW_THRESHOLD_MS = float(os.environ.get('PROFILE_SLOW_THRESHOLD_MS', 0))  # 0 disables
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+PROFILE_MAX_BYTES = int(os.environ.get('PROFILE_MAX_BYTES', 50 * 1024 * 1024))
+
+# Event-loop lag monitor (see backend/utils/loopmon.py); LOOP_MONITOR_INTERVAL_MS=0 disables it
+LOOP_MONITOR_INTERVAL_MS = float(os.environ.get('LOOP_MONITOR_INTERVAL_MS', 50))
+LOOP_STALL_THRESHOLD_MS = float(os.environ.get('LOOP_STALL_THRESHOLD_MS', 100))
+
+# Memory diagnostics (see backend/utils/heap.py); REQUEST_MEMORY_TRACKING=0 disables per-request RSS growth
+REQUEST_MEMORY_TRACKING = os.environ.get('REQUEST_MEMORY_TRACKING', '1') != '0'
+REQUEST_MEMORY_WARN_MB = float(os.environ.get('REQUEST_MEMORY_WARN_MB', 0))  # 0 disables the warning
+HEAP_MAX_SNAPSHOTS = int(os.environ.get('HEAP_MAX_SNAPSHOTS', 5))
+
+# Tracing (see backend/utils/tracing.py); enabled when TRACE_FILE or TRACE_OTLP_ENDPOINT is set
+TRACE_FILE = os.environ.get('TRACE_FILE', '')
+TRACE_OTLP_ENDPOINT = os.environ.get('TRACE_OTLP_ENDPOINT', '')  # e.g. http://localhost:4318
+TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', 1.0))
+TRACE_SERVICE_NAME = os.environ.get('TRACE_SERVICE_NAME', 'trademart-backend')
+
+# Product images (see backend/utils/images.py): 'local' serves variants from IMAGE_DIR at IMAGE_BASE_URL
+IMGBB_API_KEY = os.environ.get('IMGBB_API_KEY', '')
+IMAGE_STORE = os.environ.get('IMAGE_STORE', 'imgbb' if IMGBB_API_KEY else 'local')
+IMAGE_DIR = os.environ.get('IMAGE_DIR', os.path.join(os.path.dirname(__file__), 'media'))
+IMAGE_BASE_URL = os.environ.get('IMAGE_BASE_URL', '/media')
+IMAGE_SPOOL_DIR = os.environ.get('IMAGE_SPOOL_DIR', os.path.join(os.path.dirname(__file__), 'spool'))
+IMAGE_MAX_UPLOAD_MB = float(os.environ.get('IMAGE_MAX_UPLOAD_MB', 10))
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', 2))
+IMAGE_QUALITY = int(os.environ.get('IMAGE_QUALITY', 80))  # WebP quality
+# Seconds before an image left 'processing' by a stopped worker is taken over; live workers renew theirs
+IMAGE_PROCESSING_LEASE_SECONDS = int(os.environ.get('IMAGE_PROCESSING_LEASE_SECONDS', 600))
+IMGBB_RETRIES = int(os.environ.get('IMGBB_RETRIES', 3))
+# Resized copies served by /api/images (see backend/routes/images.py)
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(os.path.dirname(__file__), 'image_cache'))
+IMAGE_CACHE_MAX_MB = float(os.environ.get('IMAGE_CACHE_MAX_MB', 512))
+IMAGE_RESIZE_WORKERS = int(os.environ.get('IMAGE_RESIZE_WORKERS', 2))
+
+# Fall back to email/username queries for users without reservation documents; set to 0 once
+# python -m backend.migrations.user_identifiers has run
+USER_INDEX_LEGACY_LOOKUP = os.environ.get('USER_INDEX_LEGACY_LOOKUP', '1') != '0'
+
+# Bulk product moderation (/api/admin/products/bulk-*): ids accepted per request, and how many
+# 500-product transactions run at once
+BULK_MODERATION_MAX_IDS = int(os.environ.get('BULK_MODERATION_MAX_IDS', 5000))
+BULK_COMMIT_PARALLELISM = int(os.environ.get('BULK_COMMIT_PARALLELISM', 4))
+
+# Orders above this total are written to the oversight feed (GET /api/admin/oversight-feed)
+HIGH_VALUE_ORDER_THRESHOLD = float(os.environ.get('HIGH_VALUE_ORDER_THRESHOLD', 50000))
+
+# Moderation queue (/api/admin/moderation-queue): page size cap, and how long claimed products stay
+# reserved for the claiming reviewer before others can claim them
+MODERATION_PAGE_MAX = int(os.environ.get('MODERATION_PAGE_MAX', 100))
+MODERATION_LEASE_SECONDS = int(os.environ.get('MODERATION_LEASE_SECONDS', 600))
+
+# Bearer token checks (see backend/utils/tokens.py): decoded claims are cached until the token expires,
+# user status (suspension, user type) for USER_STATUS_CACHE_TTL seconds; 0 reads the user on every request
+USER_STATUS_CACHE_TTL = float(os.environ.get('USER_STATUS_CACHE_TTL', 30))
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 50000))
+
+# Password hashing (see backend/utils/passwords.py): scrypt cost and the process pool that runs it
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 0))  # 0 = one per CPU
+PASSWORD_HASH_MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', 64))
+PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+
+# Rate limiting and load shedding (see backend/utils/ratelimit.py); both are off while their setting is empty
+# RATE_LIMITS: <group>=<requests per second>/<burst> per client IP, e.g. 'login=0.2/5,search=5/20'
+# CONCURRENCY_LIMITS: <group>=<requests served at once per worker>, e.g. 'login=8,search=16,admin=4'
+# Groups: login, search, admin, write, default
+RATE_LIMITS = os.environ.get('RATE_LIMITS', '')
+CONCURRENCY_LIMITS = os.environ.get('CONCURRENCY_LIMITS', '')
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE', 'memory')  # or redis://host:6379/0 to share buckets
+# Proxies in front of the app; clients are keyed by the X-Forwarded-For hop the outermost one appended
+RATE_LIMIT_TRUST_FORWARDED = int(os.environ.get('RATE_LIMIT_TRUST_FORWARDED', 0))
+SHED_TARGET_DELAY_MS = float(os.environ.get('SHED_TARGET_DELAY_MS', 50))
+SHED_INTERVAL_MS = float(os.environ.get('SHED_INTERVAL_MS', 100))
+SHED_MAX_WAIT_MS = float(os.environ.get('SHED_MAX_WAIT_MS', 2000))
+
+# Response compression (see backend/utils/compression.py)
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', 1024))
+COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+COMPRESSION_ZSTD_LEVEL = int(os.environ.get('COMPRESSION_ZSTD_LEVEL', 3))
+
 def init_firebase():
+    # firebase_admin and google-cloud-firestore take a few hundred ms to import; only pay for them when used
+    import firebase_admin
+    from firebase_admin import credentials
     try:
         firebase_admin.get_app()
     except ValueError:
@@ -36,7 +149,23 @@ def init_firebase():
             firebase_admin.initialize_app()
     return firebase_admin.get_app()
 
-init_firebase()
+# Same query shape issued more than this many times in one request is flagged as a probable N+1
+FIRESTORE_N_PLUS_ONE_THRESHOLD = int(os.environ.get('FIRESTORE_N_PLUS_ONE_THRESHOLD', 10))
+
+def init_storage():
+    if STORAGE_BACKEND == 'firestore':
+        from firebase_admin import firestore
+        init_firebase()
+        storage = create_storage('firestore', client=firestore.client())
+    else:
+        storage = create_storage(STORAGE_BACKEND, sqlite_path=SQLITE_PATH)
+    return instrument_client(storage)
+
+def get_firebase_auth():
+    """firebase_admin.auth, initializing Firebase on first use"""
+    from firebase_admin import auth
+    init_firebase()
+    return auth
 
-db = firestore.client()
-firebase_auth = auth
+# Built on first use (or by the startup warm-up), so importing config never touches the network
+db = LazyStorage(init_storage)
@@ -3,8 +3,13 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+import asyncio
 import os
 
+from .routes.products import image_pipeline
+from .routes.images import shutdown_pool as shutdown_image_resizers
+from .routes.auth import password_hasher
 from .routes import (
     auth_router,
     products_router,
@@ -12,9 +17,70 @@ from .routes import (
     orders_router,
     messages_router,
     offers_router,
-    admin_router
+    admin_router,
+    diagnostics_router,
+    images_router
 )
 from .models import init_firestore_data
+from .config import (
+    db,
+    LOG_LEVEL,
+    LOG_FILE,
+    LOG_FORMAT,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_WHEN,
+    LOG_BACKUP_COUNT,
+    LOG_SUCCESS_SAMPLE_RATE,
+    FIRESTORE_N_PLUS_ONE_THRESHOLD,
+    COMPRESSION_MINIMUM_SIZE,
+    COMPRESSION_GZIP_LEVEL,
+    COMPRESSION_BROTLI_QUALITY,
+    COMPRESSION_ZSTD_LEVEL,
+    CAPTURE_FILE,
+    CAPTURE_SAMPLE_RATE,
+    CAPTURE_MAX_BODY_BYTES,
+    ADMIN_TOKEN,
+    PROFILE_DIR,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SLOW_THRESHOLD_MS,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+    PROFILE_MAX_BYTES,
+    LOOP_MONITOR_INTERVAL_MS,
+    LOOP_STALL_THRESHOLD_MS,
+    REQUEST_MEMORY_TRACKING,
+    REQUEST_MEMORY_WARN_MB,
+    TRACE_FILE,
+    TRACE_OTLP_ENDPOINT,
+    TRACE_SAMPLE_RATE,
+    TRACE_SERVICE_NAME,
+    IMAGE_STORE,
+    IMAGE_DIR,
+    IMAGE_BASE_URL,
+    RATE_LIMITS,
+    CONCURRENCY_LIMITS,
+    RATE_LIMIT_STORE,
+    RATE_LIMIT_TRUST_FORWARDED,
+    SHED_TARGET_DELAY_MS,
+    SHED_INTERVAL_MS,
+    SHED_MAX_WAIT_MS
+)
+from .utils.compression import CompressionMiddleware
+from .utils.capture import CaptureMiddleware, open_capture_log
+from .utils.profiler import ProfilerMiddleware, ProfileStore
+from .utils.loopmon import LoopLagMonitor, LoopLagMiddleware
+from .utils.heap import MemoryMiddleware
+from .utils.ratelimit import RateLimitMiddleware, create_bucket_store, parse_limits, parse_rate
+from .utils.tracing import TracingMiddleware, configure_tracing, current_span
+from .utils.metrics import (
+    REGISTRY,
+    PROMETHEUS_CONTENT_TYPE,
+    route_template,
+    http_request_duration,
+    http_requests_in_flight
+)
+from .utils.logconfig import setup_logging, request_id_var
+from .utils import db_stats
 
 app = FastAPI(
     title="Trade Mart API",
@@ -36,23 +102,83 @@ app.include_router(auth_router)
 # Logging Configuration
 import logging
 import time
+import uuid
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("backend.log")
-    ]
+setup_logging(
+    level=LOG_LEVEL,
+    log_file=LOG_FILE,
+    log_format=LOG_FORMAT,
+    max_bytes=LOG_MAX_BYTES,
+    rotate_when=LOG_ROTATE_WHEN,
+    backup_count=LOG_BACKUP_COUNT,
+    success_sample_rate=LOG_SUCCESS_SAMPLE_RATE
 )
 logger = logging.getLogger(__name__)
 
+# Must sit inside log_requests: BaseHTTPMiddleware re-streams bodies, which
+# would make every response look like a streaming one to the compressor
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MINIMUM_SIZE,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    zstd_level=COMPRESSION_ZSTD_LEVEL
+)
+
+if REQUEST_MEMORY_TRACKING:
+    app.add_middleware(MemoryMiddleware, warn_bytes=int(REQUEST_MEMORY_WARN_MB * 1024 * 1024))
+
+# Inside log_requests, whose call_next runs the endpoint in a task of its own
+if LOOP_MONITOR_INTERVAL_MS > 0:
+    app.state.loop_monitor = LoopLagMonitor(LOOP_MONITOR_INTERVAL_MS / 1000, LOOP_STALL_THRESHOLD_MS / 1000)
+    app.add_middleware(LoopLagMiddleware, monitor=app.state.loop_monitor)
+
+# Inside log_requests (so profiles carry the request id) but outside compression
+if ADMIN_TOKEN or PROFILE_SAMPLE_RATE > 0 or PROFILE_SLOW_THRESHOLD_MS > 0:
+    app.add_middleware(
+        ProfilerMiddleware,
+        store=ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_MAX_BYTES),
+        sample_rate=PROFILE_SAMPLE_RATE,
+        slow_threshold=PROFILE_SLOW_THRESHOLD_MS / 1000,
+        admin_token=ADMIN_TOKEN,
+        interval=PROFILE_INTERVAL_MS / 1000
+    )
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    logger.info(f"Path: {request.url.path} Method: {request.method} Status: {response.status_code} Duration: {process_time:.4f}s")
+    request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    stats, stats_token = db_stats.begin_request(FIRESTORE_N_PLUS_ONE_THRESHOLD)
+    http_requests_in_flight.inc()
+    start_time = time.perf_counter()
+    try:
+        response = await call_next(request)
+        process_time = time.perf_counter() - start_time
+        route = route_template(request.scope)
+        span = current_span.get()
+        http_request_duration.observe(process_time, (route, request.method, str(response.status_code)))
+        logger.info(
+            "Path: %s Method: %s Status: %s Duration: %.4fs",
+            request.url.path, request.method, response.status_code, process_time,
+            extra={
+                'sample': True,
+                'path': request.url.path,
+                'route': route,
+                'method': request.method,
+                'status': response.status_code,
+                'duration': round(process_time, 6),
+                'trace_id': span.trace_id if span is not None else None,
+                **stats.as_log_fields()
+            }
+        )
+        if stats.suspects:
+            db_stats.firestore_n_plus_one.inc((route,))
+    finally:
+        http_requests_in_flight.dec()
+        db_stats.end_request(stats_token)
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    response.headers.update(stats.as_headers())
     
     # Ensure CORS headers are always present
     origin = request.headers.get("origin")
@@ -63,23 +189,78 @@ async def log_requests(request: Request, call_next):
         response.headers["Access-Control-Allow-Headers"] = "*"
     
     return response
+
+# Outside log_requests, so a rejected request costs no more than the rejection itself
+rate_limit_store = None
+if RATE_LIMITS or CONCURRENCY_LIMITS:
+    rate_limit_store = create_bucket_store(RATE_LIMIT_STORE)
+    app.add_middleware(
+        RateLimitMiddleware,
+        rates=parse_limits(RATE_LIMITS, parse_rate),
+        concurrency=parse_limits(CONCURRENCY_LIMITS, int),
+        store=rate_limit_store,
+        target_delay=SHED_TARGET_DELAY_MS / 1000,
+        interval=SHED_INTERVAL_MS / 1000,
+        max_wait=SHED_MAX_WAIT_MS / 1000,
+        trust_forwarded=RATE_LIMIT_TRUST_FORWARDED
+    )
+
+# Outside log_requests, so request logs carry the trace id
+if TRACE_FILE or TRACE_OTLP_ENDPOINT:
+    configure_tracing(TRACE_SERVICE_NAME, path=TRACE_FILE or None, endpoint=TRACE_OTLP_ENDPOINT or None)
+    app.add_middleware(TracingMiddleware, sample_rate=TRACE_SAMPLE_RATE)
+
+# Outermost, so captured durations cover the whole middleware stack
+if CAPTURE_FILE:
+    open_capture_log(CAPTURE_FILE)
+    app.add_middleware(CaptureMiddleware, sample_rate=CAPTURE_SAMPLE_RATE, max_body_bytes=CAPTURE_MAX_BODY_BYTES)
+
 app.include_router(products_router)
 app.include_router(cart_router)
 app.include_router(orders_router)
 app.include_router(messages_router)
 app.include_router(offers_router)
 app.include_router(admin_router)
+app.include_router(diagnostics_router)
+app.include_router(images_router)
 
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), '..', 'frontend', 'public', 'images', 'products')
 if os.path.exists(UPLOAD_DIR):
     app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
 
-@app.on_event("startup")
-async def startup_event():
+if IMAGE_STORE == 'local':
+    os.makedirs(IMAGE_DIR, exist_ok=True)
+    app.mount(IMAGE_BASE_URL, StaticFiles(directory=IMAGE_DIR), name="media")
+
+async def warm_up():
+    """Build the storage client and apply seed data without holding up startup"""
+    started = time.perf_counter()
     try:
-        init_firestore_data()
+        # The seed marker read is also the first round trip that opens the client's connection
+        await run_in_threadpool(init_firestore_data)
     except Exception as e:
-        print(f"Error initializing Firestore: {e}")
+        logger.error("Error initializing Firestore: %s", e)
+    logger.info("Storage warm-up finished in %.0fms", (time.perf_counter() - started) * 1000)
+    # Recovery queries storage, so it waits for the client warm-up builds instead of blocking startup
+    image_pipeline.start_recovery()
+
+@app.on_event("startup")
+async def startup_event():
+    if LOOP_MONITOR_INTERVAL_MS > 0:
+        app.state.loop_monitor.start()
+    await image_pipeline.start()
+    app.state.warm_up = asyncio.create_task(warm_up())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.warm_up.cancel()
+    await image_pipeline.stop()
+    if rate_limit_store is not None:
+        await rate_limit_store.close()
+    shutdown_image_resizers()
+    password_hasher.shutdown()
+    if LOOP_MONITOR_INTERVAL_MS > 0:
+        app.state.loop_monitor.stop()
 
 @app.get("/")
 async def root():
@@ -93,6 +274,18 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/api/health/ready")
+async def readiness_check():
+    """503 until the startup warm-up has built the storage client, for load balancer readiness probes"""
+    warm_up_task = getattr(app.state, 'warm_up', None)
+    if not db.ready or warm_up_task is None or not warm_up_task.done():
+        return Response(content='{"status": "starting"}', status_code=503, media_type="application/json")
+    return {"status": "ready"}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
 @app.options("/{full_path:path}")
 async def options_handler(full_path: str, request: Request):
     """Handle OPTIONS preflight requests"""
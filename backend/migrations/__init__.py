@@ -0,0 +1 @@
+# One-off data migrations, each runnable as python -m backend.migrations.<name>
@@ -0,0 +1,69 @@
+"""Write oversight feed events for items that predate the feed.
+
+Verifications and high-value orders created before oversight_events existed
+only show up in GET /api/admin/oversight-items. This records an event for
+every pending verification and every active order above
+HIGH_VALUE_ORDER_THRESHOLD that has none yet, dated when the item was
+created, and adds them to the summary counts:
+
+    python -m backend.migrations.oversight_events --dry-run
+    python -m backend.migrations.oversight_events
+
+It is safe to re-run; events already present are left alone.
+"""
+import argparse
+import sys
+from collections import Counter
+from datetime import datetime, timezone
+
+# Firestore caps a WriteBatch at 500 operations; one is kept for the summary update
+BATCH_LIMIT = 499
+
+
+def candidates(db, threshold):
+    """(event type, subject id, data, created_at) for every item the feed should contain"""
+    for doc in db.collection('business_verifications').where('status', '==', 'pending').stream():
+        data = doc.to_dict()
+        yield 'seller_verification', doc.id, {'user_id': data.get('user_id')}, data.get('created_at')
+    for doc in db.collection('orders').where('total_amount', '>', threshold).stream():
+        data = doc.to_dict()
+        if data.get('status') in ('completed', 'cancelled'):
+            continue
+        yield 'high_value_order', doc.id, {
+            'user_id': data.get('user_id'),
+            'total_amount': data.get('total_amount')
+        }, data.get('order_date')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report what would be written without writing')
+    args = parser.parse_args(argv)
+
+    from ..config import db, HIGH_VALUE_ORDER_THRESHOLD
+    from ..models.oversight import OversightEventModel
+
+    items = list(candidates(db, HIGH_VALUE_ORDER_THRESHOLD))
+    refs = [OversightEventModel.get_collection().document(OversightEventModel.event_id(t, s)) for t, s, _, _ in items]
+    present = {doc.id for doc in (db.get_all(refs) if refs else []) if doc.exists}
+    missing = [item for item in items if OversightEventModel.event_id(item[0], item[1]) not in present]
+
+    print(f"{len(items)} items needing oversight, {len(present)} events present, {len(missing)} missing")
+    if args.dry_run or not missing:
+        return 0
+
+    for start in range(0, len(missing), BATCH_LIMIT):
+        chunk = missing[start:start + BATCH_LIMIT]
+        batch = db.batch()
+        for event_type, subject_id, data, created_at in chunk:
+            if not isinstance(created_at, datetime):
+                created_at = datetime.now(timezone.utc)
+            OversightEventModel.record(batch, event_type, subject_id, data, created_at=created_at, count=False)
+        OversightEventModel.add_to_totals(batch, Counter(event_type for event_type, _, _, _ in chunk))
+        batch.commit()
+    print(f"wrote {len(missing)} events")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
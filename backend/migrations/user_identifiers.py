@@ -0,0 +1,85 @@
+"""Create email and username reservation documents for existing users.
+
+Users registered before the user_emails / usernames collections existed are
+only found by login through the legacy queries (USER_INDEX_LEGACY_LOOKUP).
+This writes the missing reservations in batches and reports identifiers
+shared by more than one account, which it leaves for a human to resolve; the
+oldest account keeps a contested identifier:
+
+    python -m backend.migrations.user_identifiers --dry-run
+    python -m backend.migrations.user_identifiers
+
+It is safe to re-run. Once it reports no missing reservations, set
+USER_INDEX_LEGACY_LOOKUP=0 so failed logins stop costing two queries.
+"""
+import argparse
+import sys
+from datetime import datetime, timezone
+
+# Firestore caps a WriteBatch at 500 operations
+BATCH_LIMIT = 500
+
+
+def _created(user):
+    created = user.get('created_at')
+    return created if isinstance(created, datetime) else datetime.max.replace(tzinfo=timezone.utc)
+
+
+def plan(users, existing):
+    """(writes, conflicts): writes are (collection, key, user_id) for reservations not yet present"""
+    from ..models.user import IDENTIFIER_COLLECTIONS, identifier_key
+
+    writes, conflicts = [], []
+    claimed = {}  # (collection, key) -> user id, oldest account first
+    for user in sorted(users, key=_created):
+        for kind, collection in IDENTIFIER_COLLECTIONS.items():
+            value = user.get(kind) or ''
+            if not value.strip():
+                continue
+            slot = (collection, identifier_key(value))
+            owner = existing.get(slot) or claimed.get(slot)
+            if owner is None:
+                claimed[slot] = user['id']
+                writes.append((collection, slot[1], user['id']))
+            elif owner != user['id']:
+                conflicts.append((kind, value, owner, user['id']))
+    return writes, conflicts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--dry-run', action='store_true', help='report what would be written without writing')
+    args = parser.parse_args(argv)
+
+    from ..config import db
+    from ..models.user import IDENTIFIER_COLLECTIONS
+
+    users = [{'id': doc.id, **doc.to_dict()} for doc in db.collection('users').stream()]
+    existing = {}
+    for collection in IDENTIFIER_COLLECTIONS.values():
+        for doc in db.collection(collection).stream():
+            existing[(collection, doc.id)] = doc.to_dict().get('user_id')
+    writes, conflicts = plan(users, existing)
+
+    for kind, value, owner, other in conflicts:
+        print(f"conflict: {kind} {value!r} is held by {owner}, also used by {other}")
+    print(f"{len(users)} users, {len(existing)} reservations present, {len(writes)} missing, "
+          f"{len(conflicts)} conflicts")
+    if args.dry_run or not writes:
+        return 1 if conflicts else 0
+
+    batch, pending = db.batch(), 0
+    for collection, key, user_id in writes:
+        batch.set(db.collection(collection).document(key), {'user_id': user_id, 'created_at': datetime.now(timezone.utc)})
+        pending += 1
+        if pending == BATCH_LIMIT:
+            batch.commit()
+            batch, pending = db.batch(), 0
+    if pending:
+        batch.commit()
+    print(f"wrote {len(writes)} reservations")
+    return 1 if conflicts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,39 @@
 # Firestore Data Models
 from .user import UserModel
-from .product import ProductModel, CategoryModel, ConditionModel
+from .product import ProductModel, CategoryModel, ConditionModel, ImageModel
 from .order import OrderModel, OrderItemModel
 from .cart import CartModel
 from .message import MessageModel
 from .offer import OfferModel
 from .verification import BusinessVerificationModel
+from .oversight import OversightEventModel
+from ..config import db
+from ..storage import SERVER_TIMESTAMP
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when the default data changes so running deployments apply it once more
+SEED_VERSION = 1
+SEED_MARKER = ('_meta', 'seed')
 
 def init_firestore_data():
-    CategoryModel.initialize_categories()
-    ConditionModel.initialize_conditions()
-    print("Firestore initialized with default categories and conditions")
+    """Write the default categories and conditions in one batch, once per SEED_VERSION.
+
+    A marker document records the version applied, so an already-seeded
+    database costs a single read on startup. Returns True if seeding ran.
+    """
+    marker = db.collection(SEED_MARKER[0]).document(SEED_MARKER[1])
+    snapshot = marker.get()
+    if snapshot.exists and snapshot.to_dict().get('version', 0) >= SEED_VERSION:
+        logger.info("Seed data version %s already applied", SEED_VERSION)
+        return False
+    batch = db.batch()
+    written = CategoryModel.seed_defaults(batch) + ConditionModel.seed_defaults(batch)
+    batch.set(marker, {'version': SEED_VERSION, 'applied_at': SERVER_TIMESTAMP})
+    batch.commit()
+    # Only now: a request reloading the caches before the commit would keep them without the defaults
+    CategoryModel.clear_cache()
+    ConditionModel.clear_cache()
+    logger.info("Seed data version %s applied (%d documents written)", SEED_VERSION, written)
+    return True
@@ -1,6 +1,8 @@
 # Cart Model for Firestore
 from ..config import db
+from ..utils.metrics import instrument_model
 
+@instrument_model
 class CartModel:
     COLLECTION = 'carts'
     
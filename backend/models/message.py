@@ -1,8 +1,10 @@
 # Message Model for Firestore
 from datetime import datetime
-from firebase_admin import firestore
+from ..storage import SERVER_TIMESTAMP
 from ..config import db
+from ..utils.metrics import instrument_model
 
+@instrument_model
 class MessageModel:
     COLLECTION = 'messages'
     
@@ -66,7 +68,7 @@ class MessageModel:
             'content': content,
             'product_id': str(product_id) if product_id else None,
             'read': False,
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         }
         doc_ref = cls.get_collection().document()
         doc_ref.set(message_data)
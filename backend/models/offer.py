@@ -1,7 +1,9 @@
 # Offer Model for Firestore
-from firebase_admin import firestore
+from ..storage import SERVER_TIMESTAMP, DESCENDING
 from ..config import db
+from ..utils.metrics import instrument_model
 
+@instrument_model
 class OfferModel:
     COLLECTION = 'offers'
     
@@ -30,7 +32,7 @@ class OfferModel:
     
     @classmethod
     def get_by_buyer(cls, buyer_id):
-        docs = cls.get_collection().where('buyer_id', '==', str(buyer_id)).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
+        docs = cls.get_collection().where('buyer_id', '==', str(buyer_id)).order_by('created_at', direction=DESCENDING).stream()
         return [{'id': doc.id, **doc.to_dict()} for doc in docs]
     
     @classmethod
@@ -51,7 +53,7 @@ class OfferModel:
             'seller_id': str(seller_id),
             'offer_price': float(offer_price),
             'status': 'pending',
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         }
         doc_ref = cls.get_collection().document()
         doc_ref.set(offer_data)
@@ -1,9 +1,12 @@
 # Order Models for Firestore
 from datetime import datetime, timedelta
-from firebase_admin import firestore
-from ..config import db
+from ..storage import SERVER_TIMESTAMP, DESCENDING
+from ..config import db, HIGH_VALUE_ORDER_THRESHOLD
+from ..utils.metrics import instrument_model
+from .oversight import OversightEventModel
 import random
 
+@instrument_model
 class OrderModel:
     COLLECTION = 'orders'
     
@@ -23,7 +26,7 @@ class OrderModel:
         tracking_id = f"TM{datetime.utcnow().strftime('%Y%m%d')}{random.randint(1000, 9999)}"
         order_data = {
             'user_id': str(user_id),
-            'order_date': firestore.SERVER_TIMESTAMP,
+            'order_date': SERVER_TIMESTAMP,
             'status': 'pending',
             'tracking_status': 'order_placed',
             'tracking_id': tracking_id,
@@ -38,12 +41,21 @@ class OrderModel:
             'total_amount': float(total_amount)
         }
         doc_ref = cls.get_collection().document()
-        doc_ref.set(order_data)
+        if float(total_amount) <= HIGH_VALUE_ORDER_THRESHOLD:
+            doc_ref.set(order_data)
+            return doc_ref.id
+        batch = db.batch()
+        batch.set(doc_ref, order_data)
+        OversightEventModel.record(batch, 'high_value_order', doc_ref.id, {
+            'user_id': str(user_id),
+            'total_amount': float(total_amount)
+        })
+        batch.commit()
         return doc_ref.id
     
     @classmethod
     def get_by_user(cls, user_id):
-        docs = cls.get_collection().where('user_id', '==', str(user_id)).order_by('order_date', direction=firestore.Query.DESCENDING).stream()
+        docs = cls.get_collection().where('user_id', '==', str(user_id)).order_by('order_date', direction=DESCENDING).stream()
         return [{'id': doc.id, **doc.to_dict()} for doc in docs]
     
     @classmethod
@@ -57,6 +69,7 @@ class OrderModel:
     def update(cls, doc_id, data):
         cls.get_collection().document(str(doc_id)).update(data)
 
+@instrument_model
 class OrderItemModel:
     COLLECTION = 'order_items'
     
@@ -0,0 +1,78 @@
+# Oversight Event Model for Firestore
+from ..storage import SERVER_TIMESTAMP, Increment
+from ..config import db
+from ..utils.metrics import instrument_model
+
+# Event type -> label the government dashboard shows
+EVENT_TYPES = {
+    'seller_verification': 'Seller Verification',
+    'high_value_order': 'High Value Transaction',
+}
+
+
+@instrument_model
+class OversightEventModel:
+    """Append-only feed of items government staff should look at.
+
+    Events are written in the same batch as the verification or order they
+    describe, keyed '<type>:<subject id>' so writing one twice is harmless,
+    and a single summary document counts them by type. The dashboard reads
+    only the events after its last cursor instead of rescanning history.
+    """
+    COLLECTION = 'oversight_events'
+    SUMMARY = ('_meta', 'oversight_summary')
+
+    @classmethod
+    def get_collection(cls):
+        return db.collection(cls.COLLECTION)
+
+    @classmethod
+    def _summary_ref(cls):
+        return db.collection(cls.SUMMARY[0]).document(cls.SUMMARY[1])
+
+    @classmethod
+    def event_id(cls, event_type, subject_id):
+        return f'{event_type}:{subject_id}'
+
+    @classmethod
+    def record(cls, batch, event_type, subject_id, data, created_at=SERVER_TIMESTAMP, count=True):
+        """Add the event, and unless `count` is false its summary count, to `batch`; the caller commits"""
+        if event_type not in EVENT_TYPES:
+            raise ValueError(f'Unknown oversight event type: {event_type}')
+        batch.set(cls.get_collection().document(cls.event_id(event_type, subject_id)), {
+            'type': event_type,
+            'subject_id': str(subject_id),
+            **data,
+            'created_at': created_at
+        })
+        if count:
+            cls.add_to_totals(batch, {event_type: 1})
+
+    @classmethod
+    def add_to_totals(cls, batch, counts):
+        """Add {event type: n} to the summary document in `batch`"""
+        batch.set(cls._summary_ref(), {key: Increment(n) for key, n in counts.items() if n}, merge=True)
+
+    @classmethod
+    def get_since(cls, cursor=None, limit=100):
+        """(events, has_more): events after the `cursor` event id, oldest first.
+
+        Raises ValueError for a cursor that names no event.
+        """
+        query = cls.get_collection().order_by('created_at')
+        if cursor:
+            after = cls.get_collection().document(str(cursor)).get()
+            if not after.exists:
+                raise ValueError('Unknown cursor')
+            query = query.start_after(after)
+        docs = query.limit(limit).get()
+        return [{'id': doc.id, **doc.to_dict()} for doc in docs], len(docs) == limit
+
+    @classmethod
+    def get_totals(cls):
+        """Events ever recorded, by type"""
+        snapshot = cls._summary_ref().get()
+        totals = dict.fromkeys(EVENT_TYPES, 0)
+        if snapshot.exists:
+            totals.update({key: value for key, value in snapshot.to_dict().items() if key in EVENT_TYPES})
+        return totals
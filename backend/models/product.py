@@ -1,7 +1,10 @@
-from datetime import datetime
+import contextvars
+from datetime import datetime, timedelta, timezone
 from functools import lru_cache
-from firebase_admin import firestore
-from ..config import db
+from concurrent.futures import ThreadPoolExecutor
+from ..storage import SERVER_TIMESTAMP, MAX_BATCH_WRITES
+from ..config import db, BULK_COMMIT_PARALLELISM
+from ..utils.metrics import instrument_model, record_cache_lookup
 
 # In-memory cache for categories and conditions (small, static data)
 _categories_cache = None
@@ -9,14 +12,20 @@ _conditions_cache = None
 _cache_timestamp = None
 CACHE_TTL = 300  # 5 minutes
 
+# Shared by every bulk moderation request; its threads start on first use
+_bulk_pool = ThreadPoolExecutor(max_workers=max(1, BULK_COMMIT_PARALLELISM), thread_name_prefix='bulk-moderation')
+
 def _get_categories_cached():
     global _categories_cache, _cache_timestamp
     import time
     now = time.time()
     if _categories_cache is None or _cache_timestamp is None or (now - _cache_timestamp) > CACHE_TTL:
+        record_cache_lookup('categories', hit=False)
         docs = db.collection('categories').stream()
         _categories_cache = {doc.id: {'id': doc.id, **doc.to_dict()} for doc in docs}
         _cache_timestamp = now
+    else:
+        record_cache_lookup('categories', hit=True)
     return _categories_cache
 
 def _get_conditions_cached():
@@ -24,14 +33,19 @@ def _get_conditions_cached():
     import time
     now = time.time()
     if _conditions_cache is None or _cache_timestamp is None or (now - _cache_timestamp) > CACHE_TTL:
+        record_cache_lookup('conditions', hit=False)
         docs = db.collection('conditions').stream()
         _conditions_cache = {doc.id: {'id': doc.id, **doc.to_dict()} for doc in docs}
         _cache_timestamp = now
+    else:
+        record_cache_lookup('conditions', hit=True)
     return _conditions_cache
 
 
+@instrument_model
 class CategoryModel:
     COLLECTION = 'categories'
+    DEFAULTS = ['Electronics', 'Books', 'Furniture', 'Tools', 'Vehicles', 'Toys', 'Clothing', 'Home & Garden']
     
     @classmethod
     def get_collection(cls):
@@ -56,19 +70,25 @@ class CategoryModel:
         return None
     
     @classmethod
-    def initialize_categories(cls):
+    def seed_defaults(cls, batch):
+        """Queue the default categories that are missing onto `batch`; returns how many"""
+        existing = {doc.to_dict().get('name') for doc in cls.get_collection().stream()}
+        missing = [(i, name) for i, name in enumerate(cls.DEFAULTS, 1) if name not in existing]
+        for i, name in missing:
+            batch.set(cls.get_collection().document(str(i)), {'name': name})
+        return len(missing)
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop the cached categories; call once a write to them has committed"""
         global _categories_cache
-        _categories_cache = None  # Clear cache
-        categories = ['Electronics', 'Books', 'Furniture', 'Tools', 'Vehicles', 'Toys', 'Clothing', 'Home & Garden']
-        for i, name in enumerate(categories, 1):
-            existing = cls.get_by_name(name)
-            if not existing:
-                cls.get_collection().document(str(i)).set({'name': name})
-        _categories_cache = None  # Clear cache again after init
+        _categories_cache = None
 
 
+@instrument_model
 class ConditionModel:
     COLLECTION = 'conditions'
+    DEFAULTS = ['New', 'Like New', 'Good', 'Fair', 'Poor']
     
     @classmethod
     def get_collection(cls):
@@ -93,16 +113,31 @@ class ConditionModel:
         return None
     
     @classmethod
-    def initialize_conditions(cls):
+    def seed_defaults(cls, batch):
+        """Queue the default conditions that are missing onto `batch`; returns how many"""
+        existing = {doc.to_dict().get('name') for doc in cls.get_collection().stream()}
+        missing = [(i, name) for i, name in enumerate(cls.DEFAULTS, 1) if name not in existing]
+        for i, name in missing:
+            batch.set(cls.get_collection().document(str(i)), {'name': name})
+        return len(missing)
+    
+    @classmethod
+    def clear_cache(cls):
+        """Drop the cached conditions; call once a write to them has committed"""
         global _conditions_cache
-        _conditions_cache = None  # Clear cache
-        conditions = ['New', 'Like New', 'Good', 'Fair', 'Poor']
-        for i, name in enumerate(conditions, 1):
-            existing = cls.get_by_name(name)
-            if not existing:
-                cls.get_collection().document(str(i)).set({'name': name})
-        _conditions_cache = None  # Clear cache again after init
+        _conditions_cache = None
 
+def _lease_holder(product, now):
+    """Reviewer holding an unexpired moderation lease on the product, if any"""
+    expires = product.get('lease_expires_at')
+    if not product.get('lease_owner') or not isinstance(expires, datetime):
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return product['lease_owner'] if expires > now else None
+
+
+@instrument_model
 class ProductModel:
     COLLECTION = 'products'
     
@@ -183,7 +218,7 @@ class ProductModel:
             'approved_by': None,
             'approved_at': None,
             'rejection_reason': None,
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         }
         doc_ref = cls.get_collection().document()
         doc_ref.set(product_data)
@@ -212,33 +247,313 @@ class ProductModel:
             docs = cls.get_collection().stream()
         return [{'id': doc.id, **doc.to_dict()} for doc in docs]
     
+    @staticmethod
+    def _moderation_fields(action, gov_employee_id, reason=None):
+        """Fields a government 'approve', 'reject' or 'delete' writes to a product"""
+        released = {'lease_owner': None, 'lease_expires_at': None}
+        if action == 'delete':
+            return {
+                'status': 'deleted',
+                'deleted_by_govt': True,
+                'deleted_by': str(gov_employee_id),
+                'deleted_at': SERVER_TIMESTAMP,
+                'deletion_reason': reason,
+                **released
+            }
+        return {
+            'approval_status': 'approved' if action == 'approve' else 'rejected',
+            'approved_by': str(gov_employee_id),
+            'approved_at': SERVER_TIMESTAMP,
+            'rejection_reason': reason if action == 'reject' else None,
+            **released
+        }
+    
+    @staticmethod
+    def lease_holder(product):
+        """_lease_holder as of now"""
+        return _lease_holder(product, datetime.now(timezone.utc))
+    
     @classmethod
     def approve_product(cls, product_id, gov_employee_id):
         """Approve a product"""
-        cls.get_collection().document(str(product_id)).update({
-            'approval_status': 'approved',
-            'approved_by': str(gov_employee_id),
-            'approved_at': firestore.SERVER_TIMESTAMP,
-            'rejection_reason': None
-        })
+        cls.get_collection().document(str(product_id)).update(
+            cls._moderation_fields('approve', gov_employee_id))
     
     @classmethod
     def reject_product(cls, product_id: str, gov_employee_id: str, reason: str):
         """Reject a product"""
-        cls.get_collection().document(str(product_id)).update({
-            'approval_status': 'rejected',
-            'approved_by': str(gov_employee_id),
-            'approved_at': firestore.SERVER_TIMESTAMP,
-            'rejection_reason': reason
-        })
+        cls.get_collection().document(str(product_id)).update(
+            cls._moderation_fields('reject', gov_employee_id, reason))
     
     @classmethod
     def delete_by_government(cls, product_id: str, gov_employee_id: str, reason: str):
         """Delete a product by government employee"""
-        cls.get_collection().document(str(product_id)).update({
-            'status': 'deleted',
-            'deleted_by_govt': True,
-            'deleted_by': str(gov_employee_id),
-            'deleted_at': firestore.SERVER_TIMESTAMP,
-            'deletion_reason': reason
+        cls.get_collection().document(str(product_id)).update(
+            cls._moderation_fields('delete', gov_employee_id, reason))
+    
+    @classmethod
+    def bulk_moderate(cls, action, product_ids, gov_employee_id, reason=None):
+        """Approve, reject or delete many products: [{'id', 'result', 'detail'?}] in request order.
+
+        Products are handled in chunks of MAX_BATCH_WRITES, each read,
+        checked the way the single-product routes check it ('not_found',
+        'already_approved', 'leased' to another reviewer) and written in one
+        transaction, so a product claimed, moderated or deleted meanwhile is
+        reported as such rather than overwritten. Up to BULK_COMMIT_PARALLELISM
+        chunks run at once; a chunk whose transaction fails marks only its own
+        products 'failed'.
+        """
+        product_ids = list(dict.fromkeys(str(pid) for pid in product_ids if pid))
+        fields = cls._moderation_fields(action, gov_employee_id, reason)
+        done = {'approve': 'approved', 'reject': 'rejected', 'delete': 'deleted'}[action]
+        
+        def moderate(chunk):
+            refs = [cls.get_collection().document(pid) for pid in chunk]
+            
+            def moderate_in(transaction):
+                results = []
+                now = datetime.now(timezone.utc)
+                for ref, doc in zip(refs, transaction.get_all(refs)):
+                    product = doc.to_dict() if doc.exists else None
+                    holder = _lease_holder(product, now) if product is not None else None
+                    if product is None:
+                        results.append({'id': ref.id, 'result': 'not_found'})
+                    elif action != 'delete' and product.get('approval_status') == 'approved':
+                        results.append({'id': ref.id, 'result': 'already_approved'})
+                    elif holder is not None and holder != str(gov_employee_id):
+                        results.append({'id': ref.id, 'result': 'leased', 'detail': f'Claimed by {holder}'})
+                    else:
+                        transaction.update(ref, fields)
+                        results.append({'id': ref.id, 'result': done})
+                return results
+            
+            return db.run_transaction(moderate_in)
+        
+        chunks = [product_ids[i:i + MAX_BATCH_WRITES] for i in range(0, len(product_ids), MAX_BATCH_WRITES)]
+        # Each chunk runs in a copy of the caller's context so request stats and trace spans see it
+        futures = [(chunk, _bulk_pool.submit(contextvars.copy_context().run, moderate, chunk)) for chunk in chunks]
+        results = []
+        for chunk, future in futures:
+            error = future.exception()
+            results.extend([{'id': pid, 'result': 'failed', 'detail': str(error)} for pid in chunk]
+                           if error else future.result())
+        return results
+    
+    @classmethod
+    def _moderation_query(cls, approval_status, category_id=None, seller_id=None):
+        # Firestore needs a composite index on (approval_status, [category_id | seller_id,] created_at)
+        query = cls.get_collection().where('approval_status', '==', approval_status)
+        if category_id:
+            query = query.where('category_id', '==', str(category_id))
+        if seller_id:
+            query = query.where('seller_id', '==', str(seller_id))
+        return query.order_by('created_at')
+    
+    @classmethod
+    def get_moderation_page(cls, approval_status='pending', category_id=None, seller_id=None, limit=50, cursor=None):
+        """(products, next_cursor): oldest first, government-deleted products left out.
+
+        `cursor` is the next_cursor of the previous page (a product id); the
+        page resumes after that product even if it has been moderated since.
+        next_cursor is None once the queue is exhausted. Raises ValueError for
+        a cursor that names no product.
+        """
+        query = cls._moderation_query(approval_status, category_id, seller_id)
+        if cursor:
+            after = cls.get_collection().document(str(cursor)).get()
+            if not after.exists:
+                raise ValueError('Unknown cursor')
+            query = query.start_after(after)
+        docs = query.limit(limit).get()
+        next_cursor = docs[-1].id if len(docs) == limit else None
+        products = [{'id': doc.id, **doc.to_dict()} for doc in docs if doc.get('status') != 'deleted']
+        return products, next_cursor
+    
+    @classmethod
+    def claim_for_review(cls, gov_employee_id, count, lease_seconds, category_id=None, seller_id=None):
+        """Lease up to `count` of the oldest pending products to one reviewer: (products, expires_at).
+
+        Products leased to someone else are skipped, so reviewers claiming at
+        the same time get disjoint sets; each claim is checked again and
+        written inside a transaction. Claiming again extends the reviewer's
+        own unexpired leases. Leases end when the product is moderated, is
+        released, or expires.
+        """
+        gov_employee_id = str(gov_employee_id)
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)
+        page_size = max(count * 2, 20)
+        claimed, after, scanned = [], None, 0
+        
+        def claim(transaction, candidates):
+            now = datetime.now(timezone.utc)
+            won = []
+            for doc in transaction.get_all([c.reference for c in candidates]):
+                product = doc.to_dict() if doc.exists else None
+                if (not product or product.get('approval_status') != 'pending'
+                        or product.get('status') == 'deleted'
+                        or _lease_holder(product, now) not in (None, gov_employee_id)):
+                    continue
+                lease = {'lease_owner': gov_employee_id, 'lease_expires_at': expires_at}
+                transaction.update(doc.reference, lease)
+                won.append({'id': doc.id, **product, **lease})
+            return won
+        
+        # Leased products are passed over in created_at order; stop after a bounded scan
+        while len(claimed) < count and scanned < count * 10 + page_size:
+            query = cls._moderation_query('pending', category_id, seller_id).limit(page_size)
+            docs = (query.start_after(after) if after is not None else query).get()
+            if not docs:
+                break
+            scanned += len(docs)
+            after = docs[-1]
+            now = datetime.now(timezone.utc)
+            free = [doc for doc in docs if doc.get('status') != 'deleted'
+                    and _lease_holder(doc.to_dict(), now) in (None, gov_employee_id)]
+            if free:
+                wanted = free[:count - len(claimed)]
+                claimed += db.run_transaction(lambda transaction: claim(transaction, wanted))
+            if len(docs) < page_size:
+                break
+        return claimed, expires_at
+    
+    @classmethod
+    def release_leases(cls, gov_employee_id, product_ids):
+        """End the reviewer's own leases on these products; returns the ids released"""
+        gov_employee_id = str(gov_employee_id)
+        refs = [cls.get_collection().document(str(pid)) for pid in dict.fromkeys(product_ids) if pid]
+        if not refs:
+            return []
+        
+        def release(transaction):
+            released = []
+            for doc in transaction.get_all(refs):
+                if doc.exists and doc.get('lease_owner') == gov_employee_id:
+                    transaction.update(doc.reference, {'lease_owner': None, 'lease_expires_at': None})
+                    released.append(doc.id)
+            return released
+        
+        return db.run_transaction(release)
+
+
+@instrument_model
+class ImageModel:
+    """Processed upload variants, keyed by the sha256 of the uploaded file so identical uploads share them"""
+    COLLECTION = 'images'
+
+    @classmethod
+    def get_collection(cls):
+        return db.collection(cls.COLLECTION)
+
+    @classmethod
+    def get_by_hash(cls, sha256):
+        doc = cls.get_collection().document(sha256).get()
+        if doc.exists:
+            return {'id': doc.id, **doc.to_dict()}
+        return None
+
+    @classmethod
+    def claim(cls, sha256, product_id, owner=None):
+        """Register product_id as waiting for this image.
+
+        Returns (image, needs_processing): a ready image is returned as is for
+        the caller to attach; otherwise the product is queued on the image and
+        needs_processing says whether this caller must schedule the work, in
+        which case the image is leased to `owner`.
+        """
+        ref = cls.get_collection().document(sha256)
+
+        def claim_in(transaction):
+            snapshot = transaction.get(ref)
+            image = snapshot.to_dict() if snapshot.exists else None
+            if image and image.get('status') == 'ready':
+                return image, False
+            if image and image.get('status') == 'processing':
+                pending = list(image.get('pending_products', []))
+                if str(product_id) not in pending:
+                    pending.append(str(product_id))
+                transaction.update(ref, {'pending_products': pending})
+                return None, False
+            transaction.set(ref, {
+                'status': 'processing',
+                'pending_products': [str(product_id)],
+                'variants': {},
+                'error': None,
+                'processing_owner': owner,
+                'processing_started': SERVER_TIMESTAMP,
+                'created_at': SERVER_TIMESTAMP
+            })
+            return None, True
+
+        return db.run_transaction(claim_in)
+
+    @classmethod
+    def _finish(cls, sha256, data):
+        ref = cls.get_collection().document(sha256)
+
+        def finish_in(transaction):
+            snapshot = transaction.get(ref)
+            pending = snapshot.to_dict().get('pending_products', []) if snapshot.exists else []
+            transaction.set(ref, {**data, 'pending_products': [], 'processed_at': SERVER_TIMESTAMP}, merge=True)
+            return pending
+
+        return db.run_transaction(finish_in)
+
+    @classmethod
+    def mark_ready(cls, sha256, variants, width=None, height=None, size=None):
+        """Store the variant URLs; returns the product ids that were waiting for them"""
+        return cls._finish(sha256, {
+            'status': 'ready',
+            'variants': variants,
+            'width': width,
+            'height': height,
+            'bytes': size,
+            'error': None
         })
+
+    @classmethod
+    def mark_failed(cls, sha256, error):
+        """Returns the product ids that were waiting for the image"""
+        return cls._finish(sha256, {'status': 'failed', 'error': str(error)[:500]})
+
+    @classmethod
+    def claim_leftover(cls, sha256, owner, lease_seconds):
+        """Take over a 'processing' image whose lease is older than lease_seconds; True if this owner now holds it"""
+        ref = cls.get_collection().document(sha256)
+        
+        def claim_in(transaction):
+            snapshot = transaction.get(ref)
+            image = snapshot.to_dict() if snapshot.exists else None
+            if not image or image.get('status') != 'processing':
+                return False
+            started = image.get('processing_started')
+            if isinstance(started, datetime) and image.get('processing_owner') not in (None, owner):
+                if started.tzinfo is None:
+                    started = started.replace(tzinfo=timezone.utc)
+                if datetime.now(timezone.utc) - started < timedelta(seconds=lease_seconds):
+                    return False
+            transaction.update(ref, {'processing_owner': owner, 'processing_started': SERVER_TIMESTAMP})
+            return True
+        
+        return db.run_transaction(claim_in)
+    
+    @classmethod
+    def renew_leases(cls, sha256s, owner):
+        """Restart the lease on the 'processing' images `owner` still holds; returns the ones renewed"""
+        refs = [cls.get_collection().document(sha256) for sha256 in sha256s]
+        
+        def renew_in(transaction):
+            renewed = []
+            for snapshot in transaction.get_all(refs):
+                image = snapshot.to_dict() if snapshot.exists else None
+                if image and image.get('status') == 'processing' and image.get('processing_owner') == owner:
+                    transaction.update(snapshot.reference, {'processing_started': SERVER_TIMESTAMP})
+                    renewed.append(snapshot.id)
+            return renewed
+        
+        return db.run_transaction(renew_in) if refs else []
+    
+    @classmethod
+    def get_processing(cls):
+        """Images some worker is rendering or left mid-flight"""
+        docs = cls.get_collection().where('status', '==', 'processing').stream()
+        return [doc.id for doc in docs]
@@ -1,10 +1,40 @@
 # User Model for Firestore
 from datetime import datetime, timedelta
-from firebase_admin import firestore
-from ..config import db
-import hashlib
+from urllib.parse import quote
+from ..storage import SERVER_TIMESTAMP
+from ..config import db, USER_INDEX_LEGACY_LOOKUP, USER_STATUS_CACHE_TTL
+from ..utils.metrics import instrument_model
+from ..utils.tokens import TTLCache
+from ..utils import passwords
 import random
 
+# Reservation documents that make emails and usernames unique: {'user_id': ...} keyed by identifier_key()
+IDENTIFIER_COLLECTIONS = {'email': 'user_emails', 'username': 'usernames'}
+
+
+def identifier_key(value):
+    """Document id for an email or username: the exact value, as the user queries match it, percent-encoded.
+
+    '.' and '_' are encoded too, so no value can produce one of Firestore's
+    reserved ids ('.', '..', '__name__'); empty values have no id.
+    """
+    if not value:
+        raise ValueError('Empty identifiers cannot be reserved')
+    return quote(value, safe="@+-!$&'()*,;=:~").replace('.', '%2E').replace('_', '%5F')
+
+
+# Fields authorization checks need on every request, per user id; UserModel.update drops the entry
+STATUS_FIELDS = ('username', 'user_type', 'is_suspended')
+user_status_cache = TTLCache('user_status', USER_STATUS_CACHE_TTL)
+
+
+class IdentifierTaken(Exception):
+    def __init__(self, kind):
+        super().__init__(f'{kind} already in use')
+        self.kind = kind
+
+
+@instrument_model
 class UserModel:
     COLLECTION = 'users'
     
@@ -51,6 +81,48 @@ class UserModel:
             return {'id': doc.id, **doc.to_dict()}
         return None
     
+    @classmethod
+    def _identifier_ref(cls, kind, value):
+        return db.collection(IDENTIFIER_COLLECTIONS[kind]).document(identifier_key(value))
+    
+    @classmethod
+    def get_by_identifier(cls, kind, value):
+        """User holding an email or username reservation: two document gets, no query"""
+        if not value.strip():
+            return None
+        reservation = cls._identifier_ref(kind, value).get()
+        if reservation.exists:
+            return cls.get_by_id(reservation.to_dict()['user_id'])
+        if USER_INDEX_LEGACY_LOOKUP:
+            # Accounts created before the reservation collections, until the migration has run
+            return cls.get_by_email(value) if kind == 'email' else cls.get_by_username(value)
+        return None
+    
+    @classmethod
+    def get_by_login(cls, identifier):
+        """User whose email or username is `identifier`; only values containing '@' can be emails"""
+        if '@' in identifier:
+            return cls.get_by_identifier('email', identifier) or cls.get_by_identifier('username', identifier)
+        return cls.get_by_identifier('username', identifier)
+    
+    @classmethod
+    def _legacy_holders(cls, wanted):
+        """{kind: user id} for values in {kind: value} used by accounts found through the legacy queries"""
+        if not USER_INDEX_LEGACY_LOOKUP:
+            return {}
+        lookups = {'email': cls.get_by_email, 'username': cls.get_by_username}
+        holders = {kind: lookups[kind](value) for kind, value in wanted.items() if value}
+        return {kind: user['id'] for kind, user in holders.items() if user}
+    
+    @classmethod
+    def identifiers_taken(cls, email, username):
+        """Which of 'email' / 'username' are already reserved, in one batched read (plus the legacy queries)"""
+        wanted = {'email': email, 'username': username}
+        kinds = [kind for kind, value in wanted.items() if value]
+        snapshots = db.get_all([cls._identifier_ref(kind, wanted[kind]) for kind in kinds])
+        reserved = [kind for kind, snapshot in zip(kinds, snapshots) if snapshot.exists]
+        return reserved + [kind for kind in cls._legacy_holders(wanted) if kind not in reserved]
+    
     @classmethod
     def create_user(cls, uid, username, email, phone, address, user_type, password_hash=None):
         verification_code = ''.join([str(random.randint(0, 9)) for _ in range(6)])
@@ -72,15 +144,46 @@ class UserModel:
             'suspend_reason': None,
             'suspended_at': None,
             'suspended_by': None,
-            'created_at': firestore.SERVER_TIMESTAMP,
+            'created_at': SERVER_TIMESTAMP,
             'password_hash': password_hash
         }
-        cls.get_collection().document(uid).set(user_data)
+        reservations = {'username': cls._identifier_ref('username', username)}
+        if email:
+            reservations['email'] = cls._identifier_ref('email', email)
+        
+        def create(transaction):
+            # One read of both reservations; the commit fails if another registration wrote either meanwhile
+            snapshots = transaction.get_all(list(reservations.values()))
+            for kind, snapshot in zip(reservations, snapshots):
+                if snapshot.exists and snapshot.to_dict().get('user_id') != uid:
+                    raise IdentifierTaken(kind)
+            # Accounts without reservations are never created any more, so a plain query is race-free here
+            for kind, holder in cls._legacy_holders({kind: user_data[kind] for kind in reservations}).items():
+                if holder != uid:
+                    raise IdentifierTaken(kind)
+            transaction.set(cls.get_collection().document(uid), user_data)
+            for ref in reservations.values():
+                transaction.set(ref, {'user_id': uid, 'created_at': SERVER_TIMESTAMP})
+        
+        db.run_transaction(create)
         return {'id': uid, **user_data, 'verification_code': verification_code}
     
     @classmethod
     def update(cls, doc_id, data):
         cls.get_collection().document(str(doc_id)).update(data)
+        user_status_cache.invalidate(str(doc_id))
+    
+    @classmethod
+    def load_status(cls, doc_id):
+        """{'id', 'username', 'user_type', 'is_suspended'} read from the user and stored in user_status_cache"""
+        user = cls.get_by_id(doc_id)
+        if not user:
+            return None
+        status = {field: user.get(field) for field in STATUS_FIELDS}
+        status.update(id=str(doc_id), is_suspended=bool(status['is_suspended']))
+        if USER_STATUS_CACHE_TTL > 0:
+            user_status_cache.set(str(doc_id), status)
+        return status
     
     @classmethod
     def get_verified_sellers(cls):
@@ -94,11 +197,12 @@ class UserModel:
     
     @staticmethod
     def hash_password(password):
-        return hashlib.sha256(password.encode()).hexdigest()
+        """Blocking scrypt; request handlers use routes.auth.password_hasher instead"""
+        return passwords.hash_password(password)
     
     @staticmethod
     def verify_password(password, password_hash):
-        return hashlib.sha256(password.encode()).hexdigest() == password_hash
+        return passwords.verify_password(password, password_hash)[0]
     
     @classmethod
     def get_government_employees(cls):
@@ -1,7 +1,10 @@
 # Business Verification Model for Firestore
-from firebase_admin import firestore
+from ..storage import SERVER_TIMESTAMP, DESCENDING
 from ..config import db
+from ..utils.metrics import instrument_model
+from .oversight import OversightEventModel
 
+@instrument_model
 class BusinessVerificationModel:
     COLLECTION = 'business_verifications'
     
@@ -34,16 +37,20 @@ class BusinessVerificationModel:
             'user_id': str(user_id),
             'documents': documents,
             'status': 'pending',
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         }
         doc_ref = cls.get_collection().document()
-        doc_ref.set(data)
+        batch = db.batch()
+        batch.set(doc_ref, data)
+        OversightEventModel.record(batch, 'seller_verification', doc_ref.id, {'user_id': str(user_id)})
+        batch.commit()
         return doc_ref.id
     
     @classmethod
     def update(cls, doc_id, data):
         cls.get_collection().document(str(doc_id)).update(data)
 
+@instrument_model
 class ReviewModel:
     COLLECTION = 'reviews'
     
@@ -53,7 +60,7 @@ class ReviewModel:
     
     @classmethod
     def get_by_seller(cls, seller_id):
-        docs = cls.get_collection().where('seller_id', '==', str(seller_id)).order_by('created_at', direction=firestore.Query.DESCENDING).stream()
+        docs = cls.get_collection().where('seller_id', '==', str(seller_id)).order_by('created_at', direction=DESCENDING).stream()
         return [{'id': doc.id, **doc.to_dict()} for doc in docs]
     
     @classmethod
@@ -71,7 +78,7 @@ class ReviewModel:
             'seller_id': str(seller_id),
             'rating': int(rating),
             'comment': comment,
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         }
         doc_ref = cls.get_collection().document()
         doc_ref.set(review_data)
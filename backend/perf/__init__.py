@@ -0,0 +1,8 @@
+# Performance tooling: seeded datasets, read budgets and benchmarks
+import os
+import tempfile
+
+# The runners import the app, whose default LOG_FILE is the tracked backend.log; runs log here unless LOG_FILE is set.
+# Package level, so it applies before any runner imports backend.config.
+DEFAULT_LOG_FILE = os.path.join(tempfile.gettempdir(), 'trademart-perf.log')
+os.environ.setdefault('LOG_FILE', DEFAULT_LOG_FILE)
@@ -0,0 +1,271 @@
+"""Per-route latency, throughput and read benchmarks.
+
+Seeds a synthetic marketplace at one of the seed.SCALES sizes, drives every
+route in backend/routes through the ASGI app and records p50/p95/p99
+latency, requests per second and document reads (from the X-Firestore-*
+headers) per route. Results are written as JSON so runs on different
+commits can be compared:
+
+    STORAGE_BACKEND=memory python -m backend.perf.bench --scale 1k
+    python -m backend.perf.bench --compare before.json after.json
+
+Use STORAGE_BACKEND=memory or sqlite for an offline run, or the default
+firestore backend with FIRESTORE_EMULATOR_HOST (and
+FIREBASE_AUTH_EMULATOR_HOST for /register) set; never point it at a real
+project. The 100k and 1m scales need several GB of RAM on the memory
+backend, and --routes / --time-limit keep the list endpoints bounded there.
+POST /api/auth/google-login is skipped because it needs a Firebase ID token.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from .budget import REPORTED, endpoint_scenarios
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+
+# path and body may be callables of the iteration number; setup(client, i) runs untimed before each request
+Scenario = namedtuple('Scenario', 'method template path body setup form', defaults=(None, None, False))
+
+
+def bench_scenarios(ids, iterations):
+    """Every benchmarked route: read-only ones first, then writes, destructive ones last"""
+    buyers, sellers = ids['buyer_ids'], ids['seller_ids']
+    listed, pending_products = ids['listed_product_ids'], ids['pending_product_ids']
+    negotiable = ids['negotiable_product_ids']
+    carts, offers, orders = ids['cart_ids'], ids['pending_offer_ids'], ids['order_ids']
+    verifications = ids['verification_ids']
+    govt = ids['government_id']
+
+    def nth(items, i, offset=0):
+        return items[(offset + i) % len(items)]
+
+    def fill_cart(client, i):
+        client.post('/api/cart/add', json={'user_id': nth(buyers, i), 'product_id': nth(listed, -1 - i)})
+
+    scenarios = [Scenario(method, template, path, body)
+                 for method, template, path, body in endpoint_scenarios(ids) if method == 'GET']
+    scenarios += [
+        Scenario('POST', '/api/auth/login', '/api/auth/login',
+                 lambda i: {'email': f'{nth(buyers, i)}@example.com', 'password': 'password123'}),
+        Scenario('POST', '/api/auth/register', '/api/auth/register',
+                 lambda i: {'username': f'bench{i}', 'email': f'bench{i}@example.com', 'password': 'password123'}),
+        Scenario('POST', '/api/auth/verify', '/api/auth/verify',
+                 lambda i: {'user_id': nth(buyers, i), 'verification_code': '000000'}),
+        Scenario('POST', '/api/messages/send', '/api/messages/send',
+                 lambda i: {'sender_id': nth(buyers, i), 'receiver_id': nth(sellers, i), 'content': 'Still available?'}),
+        Scenario('POST', '/api/messages/mark-read/{user_id}/{sender_id}',
+                 lambda i: f'/api/messages/mark-read/{nth(sellers, i)}/{nth(buyers, i)}'),
+        Scenario('POST', '/api/cart/add', '/api/cart/add',
+                 lambda i: {'user_id': nth(buyers, i, 1), 'product_id': nth(listed, i)}),
+        Scenario('PUT', '/api/cart/{cart_id}', lambda i: f'/api/cart/{nth(carts, i)}', {'quantity': 2}),
+        Scenario('POST', '/api/offers/', '/api/offers/',
+                 lambda i: {'product_id': nth(negotiable, i), 'buyer_id': nth(buyers, i, 2), 'offer_price': 10.0}),
+        Scenario('POST', '/api/offers/{offer_id}/respond', lambda i: f'/api/offers/{nth(offers, i)}/respond',
+                 lambda i: {'action': 'accept' if i % 2 else 'reject'}),
+        # Multipart form without an image, so nothing is uploaded
+        Scenario('POST', '/api/products', '/api/products', lambda i: {
+            'name': f'Bench item {i}', 'description': 'Benchmark listing', 'price': '100',
+            'condition_id': '1', 'category_id': '1', 'seller_id': nth(sellers, i),
+        }, form=True),
+        Scenario('PUT', '/api/products/{product_id}', lambda i: f'/api/products/{nth(listed, i)}',
+                 {'description': 'Updated description'}),
+        Scenario('PUT', '/api/orders/{order_id}/status', lambda i: f'/api/orders/{nth(orders, i)}/status',
+                 {'status': 'shipped', 'tracking_status': 'shipped'}),
+        Scenario('POST', '/api/admin/verification/{verification_id}/respond',
+                 lambda i: f'/api/admin/verification/{nth(verifications, i)}/respond', {'action': 'approve'}),
+        Scenario('POST', '/api/admin/seller/{seller_id}/suspend',
+                 lambda i: f'/api/admin/seller/{nth(sellers, -1 - i)}/suspend', {'reason': 'Benchmark'}),
+        Scenario('POST', '/api/admin/seller/{seller_id}/unsuspend',
+                 lambda i: f'/api/admin/seller/{nth(sellers, -1 - i)}/unsuspend'),
+        Scenario('POST', '/api/admin/seller/{seller_id}/verify', lambda i: f'/api/admin/seller/{nth(sellers, i)}/verify'),
+        Scenario('POST', '/api/admin/product/{product_id}/approve',
+                 lambda i: f'/api/admin/product/{nth(pending_products, i)}/approve', {'gov_employee_id': govt}),
+        Scenario('POST', '/api/admin/product/{product_id}/reject',
+                 lambda i: f'/api/admin/product/{nth(pending_products, -1 - i)}/reject',
+                 {'gov_employee_id': govt, 'reason': 'Benchmark'}),
+        Scenario('POST', '/api/admin/products/bulk-approve', '/api/admin/products/bulk-approve',
+                 lambda i: {'product_ids': [nth(pending_products, i * 50 + k) for k in range(50)],
+                            'gov_employee_id': govt}),
+        Scenario('DELETE', '/api/cart/{cart_id}', lambda i: f'/api/cart/{nth(carts, -1 - i)}'),
+        Scenario('DELETE', '/api/cart/clear/{user_id}', lambda i: f'/api/cart/clear/{nth(buyers, i, 1)}'),
+        Scenario('POST', '/api/orders/checkout', '/api/orders/checkout', lambda i: {
+            'user_id': nth(buyers, i), 'first_name': 'Bench', 'last_name': 'Buyer', 'address': '1 Road',
+            'city': 'City', 'state': 'State', 'zip_code': '00000',
+        }, fill_cart),
+        Scenario('POST', '/api/admin/product/{product_id}/delete',
+                 lambda i: f'/api/admin/product/{nth(listed, -1 - iterations - i)}/delete',
+                 {'gov_employee_id': govt, 'reason': 'Benchmark'}),
+        Scenario('DELETE', '/api/products/{product_id}',
+                 lambda i: f'/api/products/{nth(listed, -1 - 2 * iterations - i)}'),
+    ]
+    return scenarios
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = -(-q * len(sorted_values) // 100)
+    return sorted_values[max(int(rank), 1) - 1]
+
+
+def _send(client, scenario, i):
+    path = scenario.path(i) if callable(scenario.path) else scenario.path
+    body = scenario.body(i) if callable(scenario.body) else scenario.body
+    if scenario.form:
+        return client.request(scenario.method, path, data=body)
+    return client.request(scenario.method, path, json=body)
+
+
+def run_scenario(client, scenario, iterations, warmup=1, time_limit=None):
+    """Time `iterations` requests (after `warmup` untimed ones) and summarise them"""
+    for i in range(iterations, iterations + warmup):
+        if scenario.setup:
+            scenario.setup(client, i)
+        _send(client, scenario, i)
+
+    latencies, totals, errors, max_reads = [], dict.fromkeys(REPORTED, 0), 0, 0
+    for i in range(iterations):
+        if scenario.setup:
+            scenario.setup(client, i)
+        started = time.perf_counter()
+        response = _send(client, scenario, i)
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+        for key in REPORTED:
+            totals[key] += int(response.headers.get(f'x-firestore-{key}', 0))
+        max_reads = max(max_reads, int(response.headers.get('x-firestore-reads', 0)))
+        if time_limit and sum(latencies) > time_limit:
+            break
+
+    elapsed = sum(latencies)
+    n = len(latencies)
+    latencies.sort()
+    result = {
+        'requests': n,
+        'errors': errors,
+        'requests_per_second': round(n / elapsed, 1) if elapsed else None,
+        'max_reads': max_reads,
+    }
+    for q in (50, 95, 99):
+        result[f'p{q}_ms'] = round(percentile(latencies, q) * 1000, 3)
+    result['max_ms'] = round(latencies[-1] * 1000, 3)
+    for key in REPORTED:
+        result[f'{key}_per_request'] = round(totals[key] / n, 2)
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(scale='1k', iterations=50, warmup=1, routes=None, time_limit=None, skew=1.1, seed=7):
+    from fastapi.testclient import TestClient
+    from ..config import STORAGE_BACKEND, db
+    from ..main import app
+    from .seed import SCALES, generate_marketplace
+
+    # One INFO line per request from the test client would dominate the timings
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    started = time.perf_counter()
+    ids = generate_marketplace(db, skew=skew, seed=seed, **SCALES[scale])
+    seed_seconds = time.perf_counter() - started
+
+    results = {}
+    with TestClient(app) as client:
+        for scenario in bench_scenarios(ids, iterations):
+            name = f'{scenario.method} {scenario.template}'
+            if routes and not any(pattern in name for pattern in routes):
+                continue
+            results[name] = run_scenario(client, scenario, iterations, warmup, time_limit)
+            print(f"{name:<60} p50 {results[name]['p50_ms']:>9.2f}ms  p95 {results[name]['p95_ms']:>9.2f}ms  "
+                  f"reads {results[name]['reads_per_request']:>8}", file=sys.stderr)
+
+    return {
+        'meta': {
+            'commit': _git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'backend': STORAGE_BACKEND,
+            'scale': scale,
+            'dataset': SCALES[scale],
+            'documents_written': ids['documents_written'],
+            'seed_seconds': round(seed_seconds, 2),
+            'skew': skew,
+            'seed': seed,
+            'iterations': iterations,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'routes': results,
+    }
+
+
+def compare(before, after, threshold=0.1):
+    """Print per-route changes; return the routes whose p95 or reads grew by more than `threshold`"""
+    regressions = []
+    for name in sorted(set(before['routes']) | set(after['routes'])):
+        old, new = before['routes'].get(name), after['routes'].get(name)
+        if old is None or new is None:
+            print(f"{name:<60} {'added' if old is None else 'removed'}")
+            continue
+        p95_change = (new['p95_ms'] - old['p95_ms']) / old['p95_ms'] if old['p95_ms'] else 0.0
+        reads_change = new['reads_per_request'] - old['reads_per_request']
+        flag = ''
+        if p95_change > threshold or reads_change > 0:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f"{name:<60} p95 {old['p95_ms']:>9.2f} -> {new['p95_ms']:>9.2f}ms ({p95_change:+.0%})  "
+              f"reads {old['reads_per_request']} -> {new['reads_per_request']}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    from .seed import SCALES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--iterations', type=int, default=50, help='timed requests per route')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed requests per route')
+    parser.add_argument('--routes', nargs='*', help='only routes whose "METHOD /template" contains one of these')
+    parser.add_argument('--time-limit', type=float, help='stop timing a route after this many seconds')
+    parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for sellers, buyers and products')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help=f'result file (default {RESULTS_DIR}/<scale>-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.1, help='p95 growth counted as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        return 1 if compare(before, after, args.threshold) else 0
+
+    result = run_benchmark(args.scale, args.iterations, args.warmup, args.routes, args.time_limit,
+                           args.skew, args.seed)
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.scale}-{result['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write('\n')
+    print(f"Wrote {len(result['routes'])} routes to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""Firestore read budgets per endpoint.
+
+Seeds a deterministic dataset, drives every endpoint once through the ASGI
+app and compares the reads, writes and round trips it reports (via the
+X-Firestore-* headers) against the checked-in read_budgets.json. Exits
+non-zero when any endpoint goes over budget, so it can gate CI:
+
+    python -m backend.perf.budget            # check
+    python -m backend.perf.budget --update   # re-record after an intended change
+
+The checked-in budgets are recorded with STORAGE_BACKEND=memory, which counts
+reads and round trips exactly as Firestore would. To measure against Firestore
+itself, point it at the emulator (FIRESTORE_EMULATOR_HOST) so the seed data
+never touches a real project.
+"""
+import argparse
+import json
+import os
+import sys
+
+BUDGET_FILE = os.path.join(os.path.dirname(__file__), 'read_budgets.json')
+TRACKED = ('reads', 'rpcs')
+REPORTED = ('reads', 'writes', 'deletes', 'rpcs')
+
+
+def endpoint_scenarios(ids):
+    """(method, route template, concrete path, json body) for every route, read-only ones first"""
+    buyer, seller, govt = ids['buyer_id'], ids['seller_id'], ids['government_id']
+    partner = ids['seller_ids'][0]
+    return [
+        ('GET', '/api/products', '/api/products', None),
+        ('GET', '/api/products?q', '/api/products?q=item', None),
+        ('GET', '/api/products/featured', '/api/products/featured', None),
+        ('GET', '/api/products/categories', '/api/products/categories', None),
+        ('GET', '/api/products/conditions', '/api/products/conditions', None),
+        ('GET', '/api/products/{product_id}', f"/api/products/{ids['product_id']}", None),
+        ('GET', '/api/products/seller/{seller_id}', f'/api/products/seller/{seller}', None),
+        ('GET', '/api/cart/{user_id}', f'/api/cart/{buyer}', None),
+        ('GET', '/api/orders/user/{user_id}', f'/api/orders/user/{buyer}', None),
+        ('GET', '/api/orders/{order_id}', f"/api/orders/{ids['order_id']}", None),
+        ('GET', '/api/orders/track/{tracking_id}', f"/api/orders/track/{ids['tracking_id']}", None),
+        ('GET', '/api/orders/seller/{seller_id}', f'/api/orders/seller/{seller}', None),
+        ('GET', '/api/messages/conversations/{user_id}', f'/api/messages/conversations/{buyer}', None),
+        ('GET', '/api/messages/unread/{user_id}', f'/api/messages/unread/{buyer}', None),
+        ('GET', '/api/offers/buyer/{buyer_id}', f'/api/offers/buyer/{buyer}', None),
+        ('GET', '/api/offers/seller/{seller_id}', f'/api/offers/seller/{seller}', None),
+        ('GET', '/api/offers/seller/{seller_id}/pending-count', f'/api/offers/seller/{seller}/pending-count', None),
+        ('GET', '/api/auth/user/{user_id}', f'/api/auth/user/{buyer}', None),
+        ('GET', '/api/admin/pending-verifications', '/api/admin/pending-verifications', None),
+        ('GET', '/api/admin/oversight-items', '/api/admin/oversight-items', None),
+        ('GET', '/api/admin/oversight-feed', '/api/admin/oversight-feed', None),
+        ('GET', '/api/admin/sellers', '/api/admin/sellers', None),
+        ('GET', '/api/admin/seller/{seller_id}', f'/api/admin/seller/{seller}', None),
+        ('GET', '/api/admin/pending-products', '/api/admin/pending-products', None),
+        ('GET', '/api/admin/product-approval-stats', '/api/admin/product-approval-stats', None),
+        ('GET', '/api/admin/moderation-queue', '/api/admin/moderation-queue?limit=20', None),
+        ('POST', '/api/auth/login', '/api/auth/login', {'email': f'{buyer}@example.com', 'password': 'password123'}),
+        ('GET', '/api/messages/conversation/{user_id}/{partner_id}', f'/api/messages/conversation/{buyer}/{partner}', None),
+        ('POST', '/api/messages/send', '/api/messages/send',
+         {'sender_id': buyer, 'receiver_id': partner, 'content': 'Is this still available?'}),
+        ('POST', '/api/cart/add', '/api/cart/add', {'user_id': buyer, 'product_id': ids['product_ids'][5]}),
+        ('POST', '/api/offers/', '/api/offers/',
+         {'product_id': ids['product_ids'][2], 'buyer_id': ids['buyer_ids'][1], 'offer_price': 10.0}),
+        ('POST', '/api/admin/product/{product_id}/approve', f"/api/admin/product/{ids['pending_product_id']}/approve",
+         {'gov_employee_id': govt}),
+        ('POST', '/api/orders/checkout', '/api/orders/checkout', {
+            'user_id': buyer, 'first_name': 'Test', 'last_name': 'Buyer', 'address': '1 Road',
+            'city': 'City', 'state': 'State', 'zip_code': '00000',
+        }),
+    ]
+
+
+def measure(client, ids):
+    results = {}
+    for method, template, path, body in endpoint_scenarios(ids):
+        response = client.request(method, path, json=body)
+        if response.status_code >= 500:
+            raise RuntimeError(f'{method} {path} failed with {response.status_code}: {response.text}')
+        results[f'{method} {template}'] = {
+            key: int(response.headers.get(f'x-firestore-{key}', 0)) for key in REPORTED
+        }
+    return results
+
+
+def run_measurement():
+    from fastapi.testclient import TestClient
+    from ..config import db
+    from ..main import app
+    from .seed import seed_marketplace
+
+    ids = seed_marketplace(db)
+    with TestClient(app) as client:
+        return measure(client, ids)
+
+
+def compare(measured, budgets):
+    """Return (regressions, improvements) as lists of human-readable lines"""
+    regressions, improvements = [], []
+    for endpoint, counts in sorted(measured.items()):
+        budget = budgets.get(endpoint)
+        if budget is None:
+            regressions.append(f'{endpoint}: no budget recorded (run with --update)')
+            continue
+        for key in TRACKED:
+            if counts[key] > budget[key]:
+                regressions.append(f'{endpoint}: {key} {counts[key]} > budget {budget[key]}')
+            elif counts[key] < budget[key]:
+                improvements.append(f'{endpoint}: {key} {counts[key]} < budget {budget[key]}')
+    return regressions, improvements
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--update', action='store_true', help='overwrite the budget file with the measured counts')
+    parser.add_argument('--budget-file', default=BUDGET_FILE)
+    args = parser.parse_args(argv)
+
+    measured = run_measurement()
+    if args.update:
+        with open(args.budget_file, 'w') as f:
+            json.dump(measured, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f'Recorded budgets for {len(measured)} endpoints in {args.budget_file}')
+        return 0
+
+    if not os.path.exists(args.budget_file):
+        print(f'No budget file at {args.budget_file}; record one with --update')
+        return 1
+    with open(args.budget_file) as f:
+        budgets = json.load(f)
+    regressions, improvements = compare(measured, budgets)
+    for line in improvements:
+        print(f'below budget (consider --update): {line}')
+    for line in regressions:
+        print(f'OVER BUDGET: {line}')
+    if regressions:
+        return 1
+    print(f'{len(measured)} endpoints within read budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
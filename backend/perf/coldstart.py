@@ -0,0 +1,142 @@
+"""Cold-start budget: how long a fresh worker takes to import the app and become ready.
+
+Each run starts a new interpreter that imports backend.main, runs the startup
+handlers, answers GET /api/health and then polls /api/health/ready until the
+storage warm-up has finished. The median of each phase is compared with its
+budget and the command exits non-zero when one is exceeded, so it can gate CI
+the way backend/perf/budget.py does for reads:
+
+    STORAGE_BACKEND=memory python -m backend.perf.coldstart
+    python -m backend.perf.coldstart --runs 10 --import-budget-ms 600
+    python -m backend.perf.coldstart --top 20    # where import time goes (python -X importtime)
+
+Phases: 'import' is importing backend.main, 'first_response' runs from the
+start of the startup handlers to the first /api/health response, 'ready'
+from the same point to a 200 from /api/health/ready, and 'process' from
+spawning the interpreter to ready (the test client's own import included).
+For the firestore backend, set FIRESTORE_EMULATOR_HOST so warm-up never
+touches a real project.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from . import DEFAULT_LOG_FILE
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+PHASES = ('import', 'first_response', 'ready', 'process')
+
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+from backend.main import app
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+harness = time.perf_counter()
+with TestClient(app) as client:
+    client.get('/api/health')
+    first = time.perf_counter()
+    deadline = first + float(sys.argv[1])
+    while client.get('/api/health/ready').status_code != 200:
+        if time.perf_counter() > deadline:
+            sys.exit('not ready after %ss' % sys.argv[1])
+        time.sleep(0.002)
+    ready = time.perf_counter()
+    ready_at = time.time()
+print(json.dumps({'import': imported - started, 'first_response': first - harness,
+                  'ready': ready - harness, 'ready_at': ready_at}))
+'''
+
+
+def _child_env(log_file):
+    env = dict(os.environ)
+    if env.get('LOG_FILE') == DEFAULT_LOG_FILE:
+        # Each measurement starts from an empty log, as a freshly deployed process would
+        env['LOG_FILE'] = log_file
+    return env
+
+
+def run_once(env, timeout):
+    spawned = time.time()
+    proc = subprocess.run([sys.executable, '-c', CHILD, str(timeout)], cwd=PROJECT_ROOT, env=env,
+                          capture_output=True, text=True, timeout=timeout + 60)
+    if proc.returncode != 0:
+        raise RuntimeError(f'cold start failed:\n{proc.stderr.strip()[-2000:]}')
+    timings = json.loads(proc.stdout.strip().splitlines()[-1])
+    timings['process'] = timings.pop('ready_at') - spawned
+    return {phase: seconds * 1000 for phase, seconds in timings.items()}
+
+
+def import_profile(env, top):
+    """(package, self ms) for the packages that account for most of the import time of backend.main"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import backend.main'], cwd=PROJECT_ROOT,
+                          env=env, capture_output=True, text=True)
+    totals = defaultdict(float)
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        parts = name.strip().split('.')
+        # Our own modules are worth seeing one level down, third-party ones by package
+        package = '.'.join(parts[:2]) if parts[0] == 'backend' else parts[0]
+        totals[package] += int(self_us) / 1000
+    return sorted(totals.items(), key=lambda item: -item[1])[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--import-budget-ms', type=float, default=800)
+    parser.add_argument('--first-response-budget-ms', type=float, default=250)
+    parser.add_argument('--ready-budget-ms', type=float, default=1000)
+    parser.add_argument('--process-budget-ms', type=float, default=2000)
+    parser.add_argument('--timeout', type=float, default=60, help='seconds to wait for readiness per run')
+    parser.add_argument('--top', type=int, default=0, help='also list the N packages slowest to import')
+    args = parser.parse_args(argv)
+
+    budgets = {
+        'import': args.import_budget_ms,
+        'first_response': args.first_response_budget_ms,
+        'ready': args.ready_budget_ms,
+        'process': args.process_budget_ms,
+    }
+    with tempfile.TemporaryDirectory() as scratch:
+        env = _child_env(os.path.join(scratch, 'backend.log'))
+        try:
+            runs = [run_once(env, args.timeout) for _ in range(args.runs)]
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            print(e, file=sys.stderr)
+            return 2
+        profile = import_profile(env, args.top) if args.top else []
+
+    print(f"storage backend: {os.environ.get('STORAGE_BACKEND', 'firestore')}, {args.runs} runs")
+    print(f"{'phase':<16} {'median ms':>10} {'max ms':>10} {'budget ms':>10}")
+    over = []
+    for phase in PHASES:
+        values = [run[phase] for run in runs]
+        median = statistics.median(values)
+        flag = '  OVER' if median > budgets[phase] else ''
+        print(f"{phase:<16} {median:>10.1f} {max(values):>10.1f} {budgets[phase]:>10.0f}{flag}")
+        if flag:
+            over.append(phase)
+
+    if profile:
+        print('\nSlowest imports (self time by package):')
+        for package, ms in profile:
+            print(f'  {ms:>8.1f}ms  {package}')
+
+    if over:
+        print(f"\n{len(over)} phase(s) over budget: {', '.join(over)}", file=sys.stderr)
+        return 1
+    print('\nAll phases within budget')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
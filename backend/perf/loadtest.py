@@ -0,0 +1,307 @@
+"""User-journey load test with a concurrency ramp.
+
+Workers repeatedly run multi-step journeys picked from a weighted mix:
+
+    buyer       browse -> product detail -> add to cart -> view cart -> checkout -> track order
+    seller      dashboard polling: listings, orders, pending offer count, unread messages
+    negotiation buyer offers -> seller reviews and responds -> buyer checks offers, sends a message
+    moderation  government sweep over pending products and verifications, approving or rejecting
+
+The worker count is ramped through --workers (one stage per count, each
+--stage-seconds long). Each stage reports throughput, latency percentiles
+and error rate, and the run reports the worker count where throughput stops
+scaling or errors appear (the saturation point).
+
+By default the app from backend/main.py runs in-process over
+httpx.ASGITransport with a freshly seeded synthetic marketplace:
+
+    STORAGE_BACKEND=memory python -m backend.perf.loadtest --workers 1 2 4 8 16
+
+--url targets a running server instead. Add --seed when this process shares
+the server's datastore (a SQLite file or the Firestore emulator); otherwise
+the server must already hold a dataset seeded with the same --scale and
+--random-seed.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from .bench import percentile
+
+JOURNEY_WEIGHTS = {'buyer': 60, 'seller': 20, 'negotiation': 15, 'moderation': 5}
+
+# Throughput must grow by at least this much per ramp stage to count as still scaling
+SCALING_GAIN = 0.1
+
+
+class _StageOver(Exception):
+    pass
+
+
+class Recorder:
+    """Collects (journey, step, latency, status) samples for one ramp stage"""
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+        self.samples = []
+        self.journeys = 0
+
+
+class Session:
+    """One worker's view of the app: issues journey steps and records their timings"""
+
+    def __init__(self, client, recorder, ids, rng, think_time):
+        self.client = client
+        self.recorder = recorder
+        self.ids = ids
+        self.rng = rng
+        self.think_time = think_time
+        self.journey = None
+
+    async def call(self, step, method, path, **kwargs):
+        """Issue one request; returns the parsed JSON body, or None when the step failed"""
+        if time.perf_counter() >= self.recorder.deadline:
+            raise _StageOver
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = response.status_code
+        except Exception:
+            response, status = None, 0
+        self.recorder.samples.append((self.journey, f'{method} {step}', time.perf_counter() - started, status))
+        if self.think_time:
+            await asyncio.sleep(self.rng.expovariate(1 / self.think_time))
+        if response is None or status >= 400:
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            return None
+
+    def pick(self, key):
+        return self.rng.choice(self.ids[key])
+
+
+async def buyer_journey(s):
+    buyer = s.pick('buyer_ids')
+    page = await s.call('/api/products', 'GET', '/api/products',
+                        params={'page': s.rng.randint(1, 5), 'sort': s.rng.choice(['newest', 'price_low'])})
+    products = (page or {}).get('products') or []
+    product_id = s.rng.choice(products)['id'] if products else s.pick('listed_product_ids')
+    if await s.call('/api/products/{product_id}', 'GET', f'/api/products/{product_id}') is None:
+        return
+    if await s.call('/api/cart/add', 'POST', '/api/cart/add', json={'user_id': buyer, 'product_id': product_id}) is None:
+        return
+    await s.call('/api/cart/{user_id}', 'GET', f'/api/cart/{buyer}')
+    order = await s.call('/api/orders/checkout', 'POST', '/api/orders/checkout', json={
+        'user_id': buyer, 'first_name': 'Load', 'last_name': 'Test', 'address': '1 Road',
+        'city': 'City', 'state': 'State', 'zip_code': '00000',
+    })
+    if order and order.get('tracking_id'):
+        await s.call('/api/orders/track/{tracking_id}', 'GET', f"/api/orders/track/{order['tracking_id']}")
+
+
+async def seller_journey(s):
+    seller = s.pick('seller_ids')
+    for _ in range(3):
+        await s.call('/api/products/seller/{seller_id}', 'GET', f'/api/products/seller/{seller}')
+        await s.call('/api/orders/seller/{seller_id}', 'GET', f'/api/orders/seller/{seller}')
+        await s.call('/api/offers/seller/{seller_id}/pending-count', 'GET', f'/api/offers/seller/{seller}/pending-count')
+        await s.call('/api/messages/unread/{user_id}', 'GET', f'/api/messages/unread/{seller}')
+
+
+async def negotiation_journey(s):
+    buyer, product_id = s.pick('buyer_ids'), s.pick('negotiable_product_ids')
+    product = await s.call('/api/products/{product_id}', 'GET', f'/api/products/{product_id}')
+    if not product:
+        return
+    price = round(product.get('price', 100) * s.rng.uniform(0.6, 0.9), 2)
+    offer = await s.call('/api/offers/', 'POST', '/api/offers/',
+                         json={'product_id': product_id, 'buyer_id': buyer, 'offer_price': max(price, 1.0)})
+    if not offer:
+        return
+    seller = product.get('seller_id')
+    await s.call('/api/offers/seller/{seller_id}', 'GET', f'/api/offers/seller/{seller}')
+    await s.call('/api/offers/{offer_id}/respond', 'POST', f"/api/offers/{offer['offer_id']}/respond",
+                 json={'action': s.rng.choice(['accept', 'reject'])})
+    await s.call('/api/offers/buyer/{buyer_id}', 'GET', f'/api/offers/buyer/{buyer}')
+    await s.call('/api/messages/send', 'POST', '/api/messages/send',
+                 json={'sender_id': buyer, 'receiver_id': seller, 'content': 'Thanks!', 'product_id': product_id})
+
+
+async def moderation_journey(s):
+    govt = s.ids['government_id']
+    products = await s.call('/api/admin/pending-products', 'GET', '/api/admin/pending-products') or []
+    pending = [p['id'] for p in products if p.get('approval_status') == 'pending']
+    for product_id in s.rng.sample(pending, min(len(pending), 3)):
+        if s.rng.random() < 0.8:
+            await s.call('/api/admin/product/{product_id}/approve', 'POST', f'/api/admin/product/{product_id}/approve',
+                         json={'gov_employee_id': govt})
+        else:
+            await s.call('/api/admin/product/{product_id}/reject', 'POST', f'/api/admin/product/{product_id}/reject',
+                         json={'gov_employee_id': govt, 'reason': 'Incomplete listing'})
+    verifications = await s.call('/api/admin/pending-verifications', 'GET', '/api/admin/pending-verifications') or []
+    if verifications:
+        await s.call('/api/admin/verification/{verification_id}/respond', 'POST',
+                     f"/api/admin/verification/{verifications[0]['id']}/respond", json={'action': 'approve'})
+    await s.call('/api/admin/oversight-items', 'GET', '/api/admin/oversight-items')
+    await s.call('/api/admin/product-approval-stats', 'GET', '/api/admin/product-approval-stats')
+
+
+JOURNEYS = {
+    'buyer': buyer_journey,
+    'seller': seller_journey,
+    'negotiation': negotiation_journey,
+    'moderation': moderation_journey,
+}
+
+
+async def _worker(session, weights):
+    names, values = list(weights), list(weights.values())
+    while True:
+        session.journey = session.rng.choices(names, weights=values)[0]
+        try:
+            await JOURNEYS[session.journey](session)
+        except _StageOver:
+            return
+        session.recorder.journeys += 1
+
+
+def summarise(samples, elapsed):
+    latencies = sorted(sample[2] for sample in samples)
+    errors = sum(1 for sample in samples if sample[3] == 0 or sample[3] >= 500)
+    rejected = sum(1 for sample in samples if 400 <= sample[3] < 500)
+    n = len(latencies)
+    return {
+        'requests': n,
+        'throughput': round(n / elapsed, 1) if elapsed else 0.0,
+        'errors': errors,
+        'rejected': rejected,
+        'error_rate': round(errors / n, 4) if n else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2) if n else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2) if n else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2) if n else None,
+    }
+
+
+async def run_stage(client, ids, workers, seconds, weights, think_time, seed):
+    started = time.perf_counter()
+    recorder = Recorder(started + seconds)
+    sessions = [Session(client, recorder, ids, random.Random(seed * 1000 + i), think_time) for i in range(workers)]
+    await asyncio.gather(*(_worker(session, weights) for session in sessions))
+    elapsed = time.perf_counter() - started
+
+    stage = {'workers': workers, 'seconds': round(elapsed, 2), 'journeys': recorder.journeys}
+    stage.update(summarise(recorder.samples, elapsed))
+    by_step = {}
+    for sample in recorder.samples:
+        by_step.setdefault(sample[1], []).append(sample)
+    stage['steps'] = {step: summarise(samples, elapsed) for step, samples in sorted(by_step.items())}
+    by_journey = {}
+    for sample in recorder.samples:
+        by_journey.setdefault(sample[0], []).append(sample)
+    stage['requests_by_journey'] = {name: len(samples) for name, samples in sorted(by_journey.items())}
+    return stage
+
+
+def find_saturation(stages, max_error_rate=0.01):
+    """(workers, reason) for the last stage before throughput plateaued or errors appeared, else None"""
+    previous = None
+    for stage in stages:
+        if stage['error_rate'] > max_error_rate:
+            return (previous or stage)['workers'], f"error rate {stage['error_rate']:.1%} at {stage['workers']} workers"
+        if previous and stage['throughput'] < previous['throughput'] * (1 + SCALING_GAIN):
+            return previous['workers'], (f"throughput {previous['throughput']} -> {stage['throughput']} req/s "
+                                         f"going to {stage['workers']} workers")
+        previous = stage
+    return None
+
+
+async def run_loadtest(workers, seconds, weights, think_time=0.0, url=None, seed_data=True, scale='1k', seed=7):
+    import httpx
+    from ..storage import create_storage
+    from .seed import SCALES, generate_marketplace
+
+    if seed_data:
+        from ..config import db
+        ids = generate_marketplace(db, seed=seed, **SCALES[scale])
+    else:
+        # The generator is deterministic, so a throwaway run recovers the ids of an existing dataset
+        ids = generate_marketplace(create_storage('memory'), seed=seed, **SCALES[scale])
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=30.0,
+                                   limits=httpx.Limits(max_connections=max(workers), max_keepalive_connections=max(workers)))
+    else:
+        from ..main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://loadtest', timeout=30.0)
+
+    stages = []
+    async with client:
+        for count in workers:
+            stage = await run_stage(client, ids, count, seconds, weights, think_time, seed)
+            stages.append(stage)
+            print(f"{count:>4} workers  {stage['throughput']:>8} req/s  p50 {stage['p50_ms']:>8}ms  "
+                  f"p95 {stage['p95_ms']:>8}ms  p99 {stage['p99_ms']:>8}ms  errors {stage['error_rate']:.2%}  "
+                  f"4xx {stage['rejected']}", file=sys.stderr)
+    return stages
+
+
+def _parse_mix(text):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name not in JOURNEYS:
+            raise argparse.ArgumentTypeError(f'unknown journey {name!r} (choose from {", ".join(JOURNEYS)})')
+        weights[name] = float(weight or 1)
+    return weights
+
+
+def main(argv=None):
+    from .seed import SCALES
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32], help='ramp stages')
+    parser.add_argument('--stage-seconds', type=float, default=10.0)
+    parser.add_argument('--mix', type=_parse_mix, default=dict(JOURNEY_WEIGHTS),
+                        help='journey weights, e.g. buyer=60,seller=20,negotiation=15,moderation=5')
+    parser.add_argument('--think-time', type=float, default=0.0, help='mean pause between steps, in seconds')
+    parser.add_argument('--url', help='target a running server instead of the in-process app')
+    parser.add_argument('--seed', dest='seed_data', action='store_true', default=None,
+                        help='seed the synthetic marketplace (default unless --url is given)')
+    parser.add_argument('--scale', choices=sorted(SCALES), default='1k')
+    parser.add_argument('--random-seed', type=int, default=7)
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--output', help='write the per-stage results as JSON')
+    args = parser.parse_args(argv)
+
+    import logging
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    seed_data = args.seed_data if args.seed_data is not None else args.url is None
+    stages = asyncio.run(run_loadtest(args.workers, args.stage_seconds, args.mix, args.think_time, args.url,
+                                      seed_data, args.scale, args.random_seed))
+    saturation = find_saturation(stages, args.max_error_rate)
+    if saturation:
+        print(f'Saturation at {saturation[0]} workers: {saturation[1]}')
+    else:
+        print(f'No saturation up to {stages[-1]["workers"]} workers')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'workers': args.workers,
+                'stage_seconds': args.stage_seconds,
+                'mix': args.mix,
+                'scale': args.scale,
+                'saturation': {'workers': saturation[0], 'reason': saturation[1]} if saturation else None,
+                'stages': stages,
+            }, f, indent=2)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
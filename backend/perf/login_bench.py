@@ -0,0 +1,134 @@
+"""Login throughput per core with scrypt running in the password process pool.
+
+First times scrypt verification on one core in this process, which is the
+ceiling for logins per second per core. Then seeds users and drives POST
+/api/auth/login through the ASGI app at a fixed concurrency, reporting
+logins per second overall and per pool worker, latency percentiles, 503s
+from a full hash queue, and the worst event-loop lag seen meanwhile (it
+stays low because hashing happens in other processes):
+
+    STORAGE_BACKEND=memory python -m backend.perf.login_bench
+    STORAGE_BACKEND=memory python -m backend.perf.login_bench --workers 2 --concurrency 32 --logins 2000
+    STORAGE_BACKEND=memory python -m backend.perf.login_bench --legacy   # SHA-256 hashes, upgraded on first login
+
+With --legacy each login's latency includes the background re-hash, since
+the in-process transport returns only after background tasks finish.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import statistics
+import sys
+import time
+
+
+def verify_rate(seconds, n, r, p):
+    """scrypt verifications per second on one core"""
+    from ..utils.passwords import hash_password, verify_password
+
+    stored = hash_password('password123', n, r, p)
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        verify_password('password123', stored, n, r, p)
+        count += 1
+    return count / (time.perf_counter() - started)
+
+
+def seed_users(db, count, password_hash):
+    from .seed import _BatchWriter
+
+    writer = _BatchWriter(db)
+    for i in range(count):
+        writer.user(f'loginbench{i}', {
+            'username': f'loginbench{i}',
+            'email': f'loginbench{i}@example.com',
+            'user_type': 'buyer',
+            'is_verified': True,
+            'created_at': None,
+            'password_hash': password_hash,
+        })
+    writer.flush()
+
+
+async def _probe_lag(stop, worst):
+    while not stop.is_set():
+        due = time.perf_counter() + 0.01
+        await asyncio.sleep(0.01)
+        worst[0] = max(worst[0], time.perf_counter() - due)
+
+
+async def drive(app, users, logins, concurrency):
+    import httpx
+
+    latencies, statuses = [], {}
+    counter = iter(range(logins))
+    stop, worst_lag = asyncio.Event(), [0.0]
+
+    async def client_loop(client):
+        for i in counter:
+            body = {'email': f'loginbench{i % users}@example.com', 'password': 'password123'}
+            started = time.perf_counter()
+            response = await client.post('/api/auth/login', json=body)
+            latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url='http://bench') as client:
+        probe = asyncio.create_task(_probe_lag(stop, worst_lag))
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await probe
+    return elapsed, latencies, statuses, worst_lag[0]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, help='password pool processes (default PASSWORD_HASH_WORKERS)')
+    parser.add_argument('--concurrency', type=int, default=16, help='logins in flight at once')
+    parser.add_argument('--logins', type=int, default=500)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--legacy', action='store_true', help='seed unsalted SHA-256 hashes instead of scrypt')
+    parser.add_argument('--calibrate-seconds', type=float, default=2.0)
+    args = parser.parse_args(argv)
+
+    from ..config import PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P, db
+    from ..main import app
+    from ..routes.auth import password_hasher
+    from ..utils.passwords import hash_password
+
+    params = (PASSWORD_SCRYPT_N, PASSWORD_SCRYPT_R, PASSWORD_SCRYPT_P)
+    if args.workers:
+        password_hasher.workers = args.workers
+    per_core = verify_rate(args.calibrate_seconds, *params)
+    print(f"scrypt n={params[0]} r={params[1]} p={params[2]}: {per_core:.1f} verifies/s on one core "
+          f"({1000 / per_core:.1f}ms each)")
+
+    stored = hashlib.sha256(b'password123').hexdigest() if args.legacy else hash_password('password123', *params)
+    seed_users(db, args.users, stored)
+    elapsed, latencies, statuses, worst_lag = asyncio.run(drive(app, args.users, args.logins, args.concurrency))
+    password_hasher.shutdown()
+
+    ok = statuses.get(200, 0)
+    cores = min(password_hasher.workers, os.cpu_count() or 1)
+    print(f"{args.logins} logins, concurrency {args.concurrency}, {password_hasher.workers} pool workers "
+          f"on {os.cpu_count()} CPUs{' (legacy hashes)' if args.legacy else ''}")
+    print(f"  throughput   {ok / elapsed:8.1f} logins/s  ({ok / elapsed / cores:.1f} per core, "
+          f"{ok / elapsed / cores / per_core * 100:.0f}% of the single-core ceiling)")
+    print(f"  latency ms   p50 {statistics.median(latencies) * 1000:.1f}  p95 {_percentile(latencies, 0.95) * 1000:.1f}"
+          f"  p99 {_percentile(latencies, 0.99) * 1000:.1f}")
+    print(f"  statuses     {dict(sorted(statuses.items()))}")
+    print(f"  worst event-loop lag {worst_lag * 1000:.1f}ms")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
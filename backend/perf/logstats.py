@@ -0,0 +1,388 @@
+"""Latency percentiles and slow-path reports from backend.log.
+
+Streams any number of log files (plain or .gz, '-' for stdin) in constant
+memory and reads the request lines that log_requests writes, in either the
+JSON or the text format:
+
+    ... - backend.main - INFO - Path: /api/products/abc Method: GET Status: 200 Duration: 0.0123s
+
+Concrete paths are folded into the route templates declared in
+backend/routes (/api/products/{product_id}). Per-route latency is kept in
+log-spaced histograms (about 2.5% relative error), so the output is the
+same for a 1 MB or a 10 GB file:
+
+    python -m backend.perf.logstats backend.log
+    python -m backend.perf.logstats backend.log.*.gz --format csv --top 0
+    python -m backend.perf.logstats backend.log --heatmap --bucket 5m --route /api/products
+
+When LOG_SUCCESS_SAMPLE_RATE < 1, successful requests are under-counted by
+that factor; pass the same value as --sample-rate to scale counts back up.
+"""
+import argparse
+import csv
+import glob
+import gzip
+import heapq
+import json
+import math
+import os
+import re
+import sys
+from datetime import datetime, timedelta
+
+ROUTES_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'routes')
+
+TEXT_LINE = re.compile(
+    r'^(?P<ts>\d{4}-\d\d-\d\d \d\d:\d\d:\d\d(?:,\d+)?)\b.*?'
+    r'Path: (?P<path>\S+) Method: (?P<method>[A-Z]+) Status: (?P<status>\d+) Duration: (?P<duration>[\d.]+)s'
+)
+_PREFIX = re.compile(r'APIRouter\([^)]*prefix\s*=\s*["\']([^"\']*)["\']')
+_DECORATOR = re.compile(r'@router\.(get|post|put|delete|patch)\(\s*["\']([^"\']*)["\']')
+_APP_DECORATOR = re.compile(r'@app\.(get|post|put|delete|patch)\(\s*["\']([^"\']*)["\']')
+_PARAM = re.compile(r'\{(\w+)(?::(\w+))?\}')
+# Segments that look like generated ids, for paths no declared route matches
+_ID_SEGMENT = re.compile(r'^(?:\d+|[0-9a-f]{8}-[0-9a-f-]{27}|[A-Za-z0-9]{20,}|[0-9a-f]{16,}|TM\d{8,})$')
+
+# Columns of the heatmap: upper latency bounds in seconds
+HEATMAP_BANDS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float('inf'))
+_SHADES = ' .:-=+*#%@'
+
+
+class LogHistogram:
+    """Counts in log-spaced buckets: fixed memory, bounded relative error for any percentile"""
+
+    __slots__ = ('counts', 'total', 'sum', 'max')
+    RATIO = 1.05
+    MINIMUM = 0.0001
+    _LOG_RATIO = math.log(RATIO)
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value, weight=1):
+        index = 0 if value <= self.MINIMUM else int(math.log(value / self.MINIMUM) / self._LOG_RATIO) + 1
+        self.counts[index] = self.counts.get(index, 0) + weight
+        self.total += weight
+        self.sum += value * weight
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        if not self.total:
+            return None
+        target = q / 100 * self.total
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                if index == 0:
+                    return self.MINIMUM
+                # Geometric middle of the bucket, capped by the largest value seen
+                return min(self.MINIMUM * self.RATIO ** (index - 0.5), self.max)
+        return self.max
+
+
+class RouteStats:
+    __slots__ = ('latency', 'server_errors', 'client_errors')
+
+    def __init__(self):
+        self.latency = LogHistogram()
+        self.server_errors = 0
+        self.client_errors = 0
+
+
+def load_route_templates(routes_dir=ROUTES_DIR):
+    """[(method, template, regex)] declared in backend/routes and main.py, in registration order"""
+    templates = []
+    sources = sorted(glob.glob(os.path.join(routes_dir, '*.py')))
+    main_py = os.path.join(os.path.dirname(routes_dir), 'main.py')
+    for path in sources + ([main_py] if os.path.exists(main_py) else []):
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        prefix_match = _PREFIX.search(source)
+        prefix = prefix_match.group(1) if prefix_match else ''
+        decorator = _APP_DECORATOR if path == main_py else _DECORATOR
+        for method, route in decorator.findall(source):
+            template = (prefix + route) or '/'
+            templates.append((method.upper(), template, _template_regex(template)))
+    return templates
+
+
+def _template_regex(template):
+    pattern, last = '', 0
+    for match in _PARAM.finditer(template):
+        pattern += re.escape(template[last:match.start()])
+        pattern += '.+' if match.group(2) == 'path' else '[^/]+'
+        last = match.end()
+    pattern += re.escape(template[last:])
+    return re.compile(f'^{pattern}/?$')
+
+
+class RouteNormalizer:
+    def __init__(self, templates):
+        self.templates = templates
+        self.cache = {}
+
+    def __call__(self, method, path):
+        key = (method, path)
+        template = self.cache.get(key)
+        if template is None:
+            template = self._match(method, path)
+            # Concrete paths are unbounded; only the templates they resolve to are worth keeping
+            if len(self.cache) < 100_000:
+                self.cache[key] = template
+        return template
+
+    def _match(self, method, path):
+        path = path.split('?', 1)[0]
+        # CORS preflights hit the catch-all OPTIONS route; attribute them to the route they precede
+        for wanted in ((method,) if method != 'OPTIONS' else ('GET', 'POST', 'PUT', 'DELETE', 'PATCH')):
+            for route_method, template, regex in self.templates:
+                if route_method == wanted and regex.match(path):
+                    return template
+        return '/'.join('{id}' if _ID_SEGMENT.match(segment) else segment for segment in path.split('/'))
+
+
+def _open(path):
+    if path == '-':
+        return sys.stdin
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, encoding='utf-8', errors='replace')
+
+
+def _parse_ts(text):
+    if 'T' in text:
+        parsed = datetime.fromisoformat(text)
+        return parsed.replace(tzinfo=None) if parsed.tzinfo is None else parsed.astimezone().replace(tzinfo=None)
+    return datetime.strptime(text.replace(',', '.'), '%Y-%m-%d %H:%M:%S.%f' if ',' in text else '%Y-%m-%d %H:%M:%S')
+
+
+def parse_line(line):
+    """(timestamp, method, path, route or None, status, duration) for a request line, else None"""
+    if 'Duration' not in line:
+        return None
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            return None
+        if 'duration' not in entry or 'path' not in entry:
+            return None
+        route = entry.get('route')
+        return (_parse_ts(entry['ts']), entry.get('method', ''), entry['path'],
+                route if route and route != 'unmatched' and '{full_path' not in route else None,
+                int(entry.get('status', 0)), float(entry['duration']))
+    match = TEXT_LINE.search(line)
+    if match is None:
+        return None
+    return (_parse_ts(match.group('ts')), match.group('method'), match.group('path'), None,
+            int(match.group('status')), float(match.group('duration')))
+
+
+def parse_bucket(text):
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    if text[-1] in units:
+        return timedelta(seconds=float(text[:-1]) * units[text[-1]])
+    return timedelta(seconds=float(text))
+
+
+def _bucket_start(ts, bucket):
+    seconds = bucket.total_seconds()
+    epoch = datetime(1970, 1, 1)
+    return epoch + timedelta(seconds=(ts - epoch).total_seconds() // seconds * seconds)
+
+
+class Analysis:
+    def __init__(self, normalizer, top=10, bucket=None, route_filter=None, sample_rate=1.0,
+                 since=None, until=None):
+        self.normalizer = normalizer
+        self.routes = {}
+        self.top = top
+        self.slowest = []  # min-heap of (duration, seq, record)
+        self.bucket = bucket
+        self.heatmap = {}  # bucket start -> (band counts, LogHistogram)
+        self.route_filter = route_filter
+        self.success_weight = 1 / sample_rate if sample_rate < 1.0 else 1
+        self.since, self.until = since, until
+        self.lines = self.matched = 0
+        self.first = self.last = None
+
+    def feed(self, line):
+        self.lines += 1
+        parsed = parse_line(line)
+        if parsed is None:
+            return
+        ts, method, path, route, status, duration = parsed
+        if (self.since and ts < self.since) or (self.until and ts >= self.until):
+            return
+        route = f'{method} {route or self.normalizer(method, path)}'
+        if self.route_filter and not any(pattern in route for pattern in self.route_filter):
+            return
+        self.matched += 1
+        self.first = ts if self.first is None or ts < self.first else self.first
+        self.last = ts if self.last is None or ts > self.last else self.last
+
+        weight = self.success_weight if status < 400 else 1
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = RouteStats()
+        stats.latency.add(duration, weight)
+        if status >= 500:
+            stats.server_errors += 1
+        elif status >= 400:
+            stats.client_errors += 1
+
+        if self.top:
+            entry = (duration, self.matched, (ts.isoformat(sep=' '), method, path, status))
+            if len(self.slowest) < self.top:
+                heapq.heappush(self.slowest, entry)
+            elif duration > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, entry)
+
+        if self.bucket:
+            start = _bucket_start(ts, self.bucket)
+            cell = self.heatmap.get(start)
+            if cell is None:
+                cell = self.heatmap[start] = ([0] * len(HEATMAP_BANDS), LogHistogram())
+            for i, bound in enumerate(HEATMAP_BANDS):
+                if duration < bound:
+                    cell[0][i] += weight
+                    break
+            cell[1].add(duration, weight)
+
+    def route_rows(self):
+        rows = []
+        for route, stats in self.routes.items():
+            hist = stats.latency
+            total = hist.total
+            rows.append({
+                'route': route,
+                'count': round(total),
+                'p50_ms': _ms(hist.percentile(50)),
+                'p95_ms': _ms(hist.percentile(95)),
+                'p99_ms': _ms(hist.percentile(99)),
+                'max_ms': _ms(hist.max),
+                'mean_ms': _ms(hist.sum / total) if total else None,
+                'error_rate': round(stats.server_errors / total, 4) if total else 0.0,
+                'client_error_rate': round(stats.client_errors / total, 4) if total else 0.0,
+                'total_seconds': round(hist.sum, 3),
+            })
+        return rows
+
+    def slowest_rows(self):
+        return [{'ts': record[0], 'method': record[1], 'path': record[2], 'status': record[3],
+                 'duration_ms': _ms(duration)}
+                for duration, _, record in sorted(self.slowest, reverse=True)]
+
+    def heatmap_rows(self):
+        rows = []
+        for start in sorted(self.heatmap):
+            bands, hist = self.heatmap[start]
+            rows.append({
+                'bucket': start.isoformat(sep=' '),
+                'count': round(hist.total),
+                'p95_ms': _ms(hist.percentile(95)),
+                'bands': {_band_label(i): round(count) for i, count in enumerate(bands)},
+            })
+        return rows
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 2)
+
+
+def _band_label(i):
+    bound = HEATMAP_BANDS[i]
+    return f'>={HEATMAP_BANDS[i - 1] * 1000:g}ms' if bound == float('inf') else f'<{bound * 1000:g}ms'
+
+
+SORT_KEYS = ('p95_ms', 'p99_ms', 'p50_ms', 'max_ms', 'count', 'total_seconds', 'error_rate')
+
+
+def render_table(analysis, rows, out):
+    header = f"{'route':<58} {'count':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'5xx':>7} {'4xx':>7}"
+    print(f'{analysis.matched} requests from {analysis.lines} lines, {analysis.first} .. {analysis.last}', file=out)
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for row in rows:
+        print(f"{row['route'][:58]:<58} {row['count']:>8} {row['p50_ms']:>9.1f} {row['p95_ms']:>9.1f} "
+              f"{row['p99_ms']:>9.1f} {row['max_ms']:>9.1f} {row['error_rate']:>7.2%} {row['client_error_rate']:>7.2%}",
+              file=out)
+    if analysis.slowest:
+        print(f'\nTop {len(analysis.slowest)} slowest requests', file=out)
+        for row in analysis.slowest_rows():
+            print(f"{row['duration_ms']:>10.1f}ms  {row['ts']}  {row['status']}  {row['method']} {row['path']}", file=out)
+    if analysis.heatmap:
+        labels = [_band_label(i) for i in range(len(HEATMAP_BANDS))]
+        print(f"\nLatency heatmap ({analysis.bucket} buckets; columns {' '.join(labels)})", file=out)
+        for row in analysis.heatmap_rows():
+            counts = list(row['bands'].values())
+            peak = max(counts) or 1
+            cells = ''.join(
+                _SHADES[0] if not count else _SHADES[max(1, round(count / peak * (len(_SHADES) - 1)))]
+                for count in counts
+            )
+            print(f"{row['bucket']}  |{cells}|  n {row['count']:>7}  p95 {row['p95_ms']:>9.1f}ms", file=out)
+
+
+def render_csv(analysis, rows, out):
+    writer = csv.DictWriter(out, fieldnames=list(rows[0]) if rows else ['route'])
+    writer.writeheader()
+    writer.writerows(rows)
+
+
+def render_json(analysis, rows, out):
+    json.dump({
+        'lines': analysis.lines,
+        'requests': analysis.matched,
+        'first': analysis.first.isoformat() if analysis.first else None,
+        'last': analysis.last.isoformat() if analysis.last else None,
+        'routes': rows,
+        'slowest': analysis.slowest_rows(),
+        'heatmap': analysis.heatmap_rows(),
+    }, out, indent=2)
+    out.write('\n')
+
+
+RENDERERS = {'table': render_table, 'csv': render_csv, 'json': render_json}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+', help="log files (.gz allowed), or '-' for stdin")
+    parser.add_argument('--format', choices=sorted(RENDERERS), default='table')
+    parser.add_argument('--sort', choices=SORT_KEYS, default='p95_ms')
+    parser.add_argument('--top', type=int, default=10, help='slowest individual requests to list (0 to skip)')
+    parser.add_argument('--heatmap', action='store_true', help='add a time-bucketed latency heatmap')
+    parser.add_argument('--bucket', type=parse_bucket, default=timedelta(hours=1), help='heatmap bucket, e.g. 5m, 1h')
+    parser.add_argument('--route', action='append', help='only routes containing this text (repeatable)')
+    parser.add_argument('--since', type=datetime.fromisoformat, help='ignore requests before this local time')
+    parser.add_argument('--until', type=datetime.fromisoformat, help='ignore requests at or after this local time')
+    parser.add_argument('--sample-rate', type=float, default=1.0, help='LOG_SUCCESS_SAMPLE_RATE the log was written with')
+    parser.add_argument('--min-count', type=int, default=1, help='hide routes with fewer requests')
+    args = parser.parse_args(argv)
+
+    analysis = Analysis(RouteNormalizer(load_route_templates()), top=args.top,
+                        bucket=args.bucket if args.heatmap else None, route_filter=args.route,
+                        sample_rate=args.sample_rate, since=args.since, until=args.until)
+    for path in args.files:
+        handle = _open(path)
+        try:
+            for line in handle:
+                analysis.feed(line)
+        finally:
+            if handle is not sys.stdin:
+                handle.close()
+
+    rows = [row for row in analysis.route_rows() if row['count'] >= args.min_count]
+    rows.sort(key=lambda row: (row[args.sort] is None, -(row[args.sort] or 0)))
+    RENDERERS[args.format](analysis, rows, sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
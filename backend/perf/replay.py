@@ -0,0 +1,322 @@
+"""Replay captured traffic and compare latency distributions between builds.
+
+Requests recorded by the capture middleware (CAPTURE_FILE, see
+backend/utils/capture.py) are re-issued in their original order and spacing
+at --speed 1, 10 or any other multiplier, or with --speed max as fast as
+--concurrency allows:
+
+    python -m backend.perf.replay capture.jsonl --speed 10 -o before.json
+    (switch builds)
+    python -m backend.perf.replay capture.jsonl --speed 10 -o after.json
+    python -m backend.perf.replay --compare before.json after.json
+
+--recorded summarises the durations stored in the capture itself (production
+latencies) in the same format, so a local replay can be compared with what
+production saw. Without --url the app runs in-process over
+httpx.ASGITransport against the configured STORAGE_BACKEND; restore a
+dataset matching the captured ids first, or use --seed for captures taken
+from loadtest runs. Redacted secrets are replaced by
+--secret, and multipart or truncated bodies are skipped.
+
+Requests captured with a bearer token are replayed with a token signed for
+the same user id, by SECRET_KEY or --signing-key (which must match the
+server's), so authenticated routes do real work. 401 and 403 responses are
+counted but kept out of the latency distributions, and routes that mostly
+failed authentication are reported.
+"""
+import argparse
+import asyncio
+import json
+import math
+import sys
+import time
+from bisect import bisect_right
+from datetime import datetime, timedelta
+
+from ..utils.capture import REDACTED
+from .bench import percentile
+
+SKIPPED_BODY_KINDS = ('omitted', 'truncated', 'invalid')
+AUTH_FAILURES = (401, 403)
+
+
+def iter_capture(paths):
+    """Stream capture records from one or more files (rotated files in order), oldest first"""
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def _unredact(value, secret):
+    if value == REDACTED:
+        return secret
+    if isinstance(value, dict):
+        return {k: _unredact(v, secret) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_unredact(v, secret) for v in value]
+    return value
+
+
+class TokenSigner:
+    """Access tokens for captured user ids, signed like the app's and reused for the whole replay"""
+
+    def __init__(self, key, algorithm='HS256', lifetime=timedelta(days=1)):
+        self.key = key
+        self.algorithm = algorithm
+        self.lifetime = lifetime
+        self._tokens = {}
+
+    def __call__(self, user_id):
+        token = self._tokens.get(user_id)
+        if token is None:
+            from jose import jwt
+            claims = {'sub': user_id, 'exp': datetime.utcnow() + self.lifetime}
+            token = self._tokens[user_id] = jwt.encode(claims, self.key, algorithm=self.algorithm)
+        return token
+
+
+def build_request(record, secret, sign=None):
+    """httpx request arguments for a capture record, or None if it cannot be replayed"""
+    kind = record.get('bk')
+    if kind in SKIPPED_BODY_KINDS:
+        return None
+    kwargs = {}
+    if record.get('u') and sign is not None:
+        kwargs['headers'] = {'Authorization': f"Bearer {sign(record['u'])}"}
+    if record.get('q'):
+        kwargs['params'] = [tuple(pair) for pair in _unredact(record['q'], secret)]
+    if kind == 'json':
+        kwargs['json'] = _unredact(record.get('b'), secret)
+    elif kind == 'form':
+        kwargs['data'] = dict(_unredact(record.get('b') or [], secret))
+    return record['m'], record['p'], kwargs
+
+
+class Replay:
+    def __init__(self, client, secret, concurrency, sign=None):
+        self.client = client
+        self.secret = secret
+        self.sign = sign
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.samples = {}  # route -> [(latency, status)]
+        self.skipped = 0
+        self.max_lag = 0.0
+
+    async def _issue(self, record, request):
+        # The slot was acquired by run(), which is what bounds the requests in flight
+        method, path, kwargs = request
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, **kwargs)
+            status = response.status_code
+        except Exception:
+            status = 0
+        finally:
+            self.semaphore.release()
+        latency = time.perf_counter() - started
+        route = f"{method} {record.get('r') or path}"
+        self.samples.setdefault(route, []).append((latency, status))
+
+    async def run(self, records, speed):
+        """speed is a multiplier of the captured pacing, or None for as fast as possible"""
+        tasks = []
+        origin = started = None
+        for record in records:
+            request = build_request(record, self.secret, self.sign)
+            if request is None:
+                self.skipped += 1
+                continue
+            if speed is not None:
+                if origin is None:
+                    origin, started = record['ts'], time.perf_counter()
+                delay = (record['ts'] - origin) / speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                else:
+                    self.max_lag = max(self.max_lag, -delay)
+            await self.semaphore.acquire()
+            tasks.append(asyncio.ensure_future(self._issue(record, request)))
+            if len(tasks) >= 1024:
+                tasks = [task for task in tasks if not task.done()]
+        await asyncio.gather(*tasks)
+
+
+def summarise(samples):
+    """Per-route latency distribution; raw latencies are kept so distributions can be diffed.
+
+    401 and 403 responses are counted in auth_failures but left out of the
+    latencies: they return before the route does any work.
+    """
+    routes = {}
+    for route, entries in sorted(samples.items()):
+        latencies = sorted(latency for latency, status in entries if status not in AUTH_FAILURES)
+        routes[route] = {
+            'count': len(entries),
+            'errors': sum(1 for _, status in entries if status == 0 or status >= 500),
+            'client_errors': sum(1 for _, status in entries if 400 <= status < 500),
+            'auth_failures': sum(1 for _, status in entries if status in AUTH_FAILURES),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+            'max_ms': round(latencies[-1] * 1000, 3) if latencies else None,
+            'latencies_ms': [round(latency * 1000, 3) for latency in latencies],
+        }
+    return routes
+
+
+def warn_auth_failures(routes, file=sys.stderr):
+    """Report routes where most requests failed authentication, whose timings say little"""
+    for route, stats in routes.items():
+        if stats.get('auth_failures', 0) * 2 > stats['count']:
+            print(f"warning: {route}: {stats['auth_failures']} of {stats['count']} requests got 401/403",
+                  file=file)
+
+
+def recorded_samples(records):
+    samples = {}
+    for record in records:
+        samples.setdefault(f"{record['m']} {record.get('r') or record['p']}", []).append((record['d'], record['s']))
+    return samples
+
+
+def ks_statistic(a, b):
+    """Two-sample Kolmogorov-Smirnov D for two sorted lists"""
+    d = 0.0
+    for x in a + b:
+        d = max(d, abs(bisect_right(a, x) / len(a) - bisect_right(b, x) / len(b)))
+    return d
+
+
+def compare(before, after, alpha_coefficient=1.36):
+    """Print per-route percentile changes; return routes whose distribution shifted slower"""
+    shifted = []
+    for route in sorted(set(before['routes']) | set(after['routes'])):
+        old, new = before['routes'].get(route), after['routes'].get(route)
+        if old is None or new is None:
+            print(f"{route:<60} only in {'after' if old is None else 'before'}")
+            continue
+        a, b = old['latencies_ms'], new['latencies_ms']
+        if not a or not b:
+            print(f"{route:<60} no successfully authenticated samples {'before' if not a else 'after'}")
+            continue
+        d = ks_statistic(a, b)
+        # Critical D at alpha = 0.05 for samples of these sizes
+        critical = alpha_coefficient * math.sqrt((len(a) + len(b)) / (len(a) * len(b)))
+        verdict = ''
+        if d > critical and new['p50_ms'] > old['p50_ms']:
+            verdict = '  SLOWER'
+            shifted.append(route)
+        elif d > critical:
+            verdict = '  faster'
+        print(f"{route:<60} n {old['count']:>6}/{new['count']:<6} "
+              + '  '.join(f"p{q} {old[f'p{q}_ms']:>8.2f}->{new[f'p{q}_ms']:<8.2f}" for q in (50, 95, 99))
+              + f"  KS {d:.3f}{verdict}")
+    return shifted
+
+
+async def run_replay(paths, speed, concurrency, secret, url=None, seed_scale=None, sign=None):
+    import httpx
+
+    if seed_scale:
+        from ..config import db
+        from .seed import SCALES, generate_marketplace
+        generate_marketplace(db, **SCALES[seed_scale])
+
+    if url:
+        client = httpx.AsyncClient(base_url=url, timeout=30.0,
+                                   limits=httpx.Limits(max_connections=concurrency))
+    else:
+        from ..main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://replay', timeout=30.0)
+    replay = Replay(client, secret, concurrency, sign)
+    started = time.perf_counter()
+    async with client:
+        await replay.run(iter_capture(paths), speed)
+    return replay, time.perf_counter() - started
+
+
+def _parse_speed(text):
+    if text == 'max':
+        return None
+    speed = float(text)
+    if speed <= 0:
+        raise argparse.ArgumentTypeError('speed must be positive or "max"')
+    return speed
+
+
+def main(argv=None):
+    from .seed import SCALES, SEED_PASSWORD
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('captures', nargs='*', help='capture files, oldest first')
+    parser.add_argument('--speed', type=_parse_speed, default=1.0, help='pacing multiplier (1, 10, ...) or "max"')
+    parser.add_argument('--concurrency', type=int, default=64, help='maximum requests in flight')
+    parser.add_argument('--url', help='replay against a running server instead of the in-process app')
+    parser.add_argument('--seed', choices=sorted(SCALES), dest='seed_scale',
+                        help='seed the synthetic marketplace first (for captures taken from loadtest runs)')
+    parser.add_argument('--secret', default=SEED_PASSWORD, help='value substituted for redacted fields')
+    parser.add_argument('--signing-key', help="key for the replayed users' tokens (default: SECRET_KEY)")
+    parser.add_argument('--recorded', action='store_true', help='summarise the captured durations instead of replaying')
+    parser.add_argument('-o', '--output', help='write the summary as JSON')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='diff two summaries')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0]) as f:
+            before = json.load(f)
+        with open(args.compare[1]) as f:
+            after = json.load(f)
+        return 1 if compare(before, after) else 0
+    if not args.captures:
+        parser.error('capture files are required unless --compare is given')
+
+    import logging
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+
+    if args.recorded:
+        summary = {'source': 'recorded', 'routes': summarise(recorded_samples(iter_capture(args.captures)))}
+    else:
+        from ..config import SECRET_KEY, ALGORITHM
+        sign = TokenSigner(args.signing_key or SECRET_KEY, ALGORITHM)
+        replay, elapsed = asyncio.run(run_replay(args.captures, args.speed, args.concurrency, args.secret, args.url,
+                                                     args.seed_scale, sign))
+        total = sum(len(entries) for entries in replay.samples.values())
+        summary = {
+            'source': 'replay',
+            'speed': 'max' if args.speed is None else args.speed,
+            'requests': total,
+            'skipped': replay.skipped,
+            'seconds': round(elapsed, 3),
+            'throughput': round(total / elapsed, 1) if elapsed else None,
+            'max_schedule_lag_seconds': round(replay.max_lag, 3),
+            'routes': summarise(replay.samples),
+        }
+        print(f"Replayed {total} requests in {elapsed:.1f}s ({summary['throughput']} req/s), "
+              f"skipped {replay.skipped}, max schedule lag {replay.max_lag:.3f}s", file=sys.stderr)
+        if replay.max_lag > 1.0:
+            print('The replayer fell behind the requested pacing; raise --concurrency or lower --speed',
+                  file=sys.stderr)
+
+    warn_auth_failures(summary['routes'])
+    for route, stats in summary['routes'].items():
+        if not stats['latencies_ms']:
+            print(f"{route:<60} n {stats['count']:>6}  all {stats['auth_failures']} failed authentication")
+            continue
+        print(f"{route:<60} n {stats['count']:>6}  p50 {stats['p50_ms']:>8.2f}  p95 {stats['p95_ms']:>8.2f}  "
+              f"p99 {stats['p99_ms']:>8.2f}ms  errors {stats['errors']}  auth failures {stats['auth_failures']}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f)
+            f.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
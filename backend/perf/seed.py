@@ -0,0 +1,401 @@
+# Deterministic marketplace datasets for budgets and benchmarks
+import bisect
+import hashlib
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+
+CATEGORIES = ['Electronics', 'Books', 'Furniture', 'Tools', 'Vehicles', 'Toys', 'Clothing', 'Home & Garden']
+CONDITIONS = ['New', 'Like New', 'Good', 'Fair', 'Poor']
+SEED_PASSWORD = 'password123'
+
+# Firestore caps a WriteBatch at 500 operations
+BATCH_LIMIT = 500
+
+# Benchmark dataset sizes, keyed by product count
+SCALES = {
+    '1k': dict(products=1_000, buyers=400, sellers=60, orders=500, offers=400, messages=2_000, reviews=300),
+    '100k': dict(products=100_000, buyers=25_000, sellers=2_500, orders=40_000, offers=30_000,
+                 messages=150_000, reviews=20_000),
+    '1m': dict(products=1_000_000, buyers=200_000, sellers=20_000, orders=400_000, offers=300_000,
+               messages=1_500_000, reviews=200_000),
+}
+
+
+class _BatchWriter:
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.batch()
+        self.pending = 0
+        self.written = 0
+
+    def set(self, collection, doc_id, data):
+        ref = self.db.collection(collection).document(doc_id) if doc_id else self.db.collection(collection).document()
+        self.batch.set(ref, data)
+        self.pending += 1
+        if self.pending >= BATCH_LIMIT:
+            self.flush()
+        return ref.id
+
+    def user(self, uid, data):
+        """A user document plus the email and username reservations login looks it up by"""
+        from ..models.user import IDENTIFIER_COLLECTIONS, identifier_key
+
+        self.set('users', uid, data)
+        for kind, collection in IDENTIFIER_COLLECTIONS.items():
+            self.set(collection, identifier_key(data[kind]), {'user_id': uid, 'created_at': data['created_at']})
+        return uid
+
+    def flush(self):
+        if self.pending:
+            self.batch.commit()
+            self.written += self.pending
+            self.batch = self.db.batch()
+            self.pending = 0
+
+
+def _user_doc(uid, user_type, created_at, password_hash):
+    return {
+        'username': uid,
+        'email': f'{uid}@example.com',
+        'phone': '',
+        'address': '',
+        'user_type': user_type,
+        'is_verified': True,
+        'verification_code': '000000',
+        'identity_verified': user_type == 'seller',
+        'avg_rating': 0.0,
+        'total_ratings': 0,
+        'is_suspended': False,
+        'created_at': created_at,
+        'password_hash': password_hash,
+    }
+
+
+def seed_marketplace(db, buyers=12, sellers=4, products=40, orders=12, items_per_order=2,
+                     offers=10, messages=30, reviews=12, seed=42):
+    """Write a small, reproducible marketplace and return handy ids for driving requests"""
+    rng = random.Random(seed)
+    now = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    password_hash = hashlib.sha256(SEED_PASSWORD.encode()).hexdigest()
+    writer = _BatchWriter(db)
+
+    for i, name in enumerate(CATEGORIES, 1):
+        writer.set('categories', str(i), {'name': name})
+    for i, name in enumerate(CONDITIONS, 1):
+        writer.set('conditions', str(i), {'name': name})
+
+    def make_user(uid, user_type):
+        return writer.user(uid, _user_doc(uid, user_type, now, password_hash))
+
+    buyer_ids = [make_user(f'buyer{i}', 'buyer') for i in range(buyers)]
+    seller_ids = [make_user(f'seller{i}', 'seller') for i in range(sellers)]
+    government_id = make_user('govt0', 'government')
+
+    product_ids = []
+    for i in range(products):
+        approval = 'approved' if i % 5 else 'pending'
+        product_ids.append(writer.set('products', f'product{i}', {
+            'name': f'Item {i}',
+            'description': f'Second-hand item number {i} in decent shape',
+            'price': float(rng.randint(100, 80000)),
+            'negotiable': i % 2 == 0,
+            'condition_id': str(rng.randint(1, len(CONDITIONS))),
+            'image': None,
+            'category_id': str(rng.randint(1, len(CATEGORIES))),
+            'seller_id': seller_ids[i % sellers],
+            'status': 'available',
+            'approval_status': approval,
+            'approved_by': government_id if approval == 'approved' else None,
+            'approved_at': None,
+            'rejection_reason': None,
+            'created_at': now + timedelta(minutes=i),
+        }))
+
+    order_ids, tracking_ids = [], []
+    for i in range(orders):
+        buyer_id = buyer_ids[i % buyers]
+        chosen = rng.sample(product_ids, items_per_order)
+        tracking_id = f'TM20250101{1000 + i}'
+        order_id = writer.set('orders', f'order{i}', {
+            'user_id': buyer_id,
+            'order_date': now + timedelta(hours=i),
+            'status': 'pending',
+            'tracking_status': 'order_placed',
+            'tracking_id': tracking_id,
+            'tracking_updates': [],
+            'estimated_delivery': (now + timedelta(days=5)).isoformat(),
+            'delivery_address': 'Somewhere',
+            'payment_method': 'cash_on_delivery',
+            'total_amount': float(rng.randint(100, 90000)),
+        })
+        for product_id in chosen:
+            writer.set('order_items', None, {
+                'order_id': order_id,
+                'product_id': product_id,
+                'quantity': 1,
+                'price': float(rng.randint(100, 80000)),
+            })
+        order_ids.append(order_id)
+        tracking_ids.append(tracking_id)
+
+    for i in range(buyers):
+        writer.set('carts', f'cart{i}', {
+            'user_id': buyer_ids[i],
+            'product_id': product_ids[(i * 3) % products],
+            'quantity': 1,
+        })
+
+    for i in range(offers):
+        product_index = (i * 2) % products
+        writer.set('offers', f'offer{i}', {
+            'product_id': product_ids[product_index],
+            'buyer_id': buyer_ids[i % buyers],
+            'seller_id': seller_ids[product_index % sellers],
+            'offer_price': 50.0,
+            'status': 'pending',
+            'created_at': now + timedelta(minutes=i),
+        })
+
+    for i in range(messages):
+        buyer_id = buyer_ids[i % buyers]
+        seller_id = seller_ids[i % sellers]
+        sender, receiver = (buyer_id, seller_id) if i % 2 == 0 else (seller_id, buyer_id)
+        writer.set('messages', None, {
+            'sender_id': sender,
+            'receiver_id': receiver,
+            'content': f'Message {i}',
+            'product_id': None,
+            'read': i % 3 == 0,
+            'created_at': now + timedelta(minutes=i),
+        })
+
+    for i in range(reviews):
+        writer.set('reviews', None, {
+            'reviewer_id': buyer_ids[i % buyers],
+            'seller_id': seller_ids[i % sellers],
+            'rating': rng.randint(1, 5),
+            'comment': 'Fine',
+            'created_at': now + timedelta(minutes=i),
+        })
+
+    for i in range(min(sellers, 2)):
+        writer.set('business_verifications', f'verification{i}', {
+            'user_id': seller_ids[i],
+            'documents': [],
+            'status': 'pending',
+            'created_at': now,
+        })
+
+    writer.flush()
+    return {
+        'buyer_id': buyer_ids[0],
+        'buyer_ids': buyer_ids,
+        'seller_id': seller_ids[0],
+        'seller_ids': seller_ids,
+        'government_id': government_id,
+        'product_id': product_ids[1],
+        'product_ids': product_ids,
+        'pending_product_id': product_ids[0],
+        'order_id': order_ids[0],
+        'tracking_id': tracking_ids[0],
+        'cart_id': 'cart0',
+        'offer_id': 'offer0',
+        'verification_id': 'verification0',
+        'documents_written': writer.written,
+    }
+
+
+class _Zipf:
+    """Draws items with probability proportional to 1 / rank**exponent (rank 1 is the most popular)"""
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = items
+        self.cumulative = list(itertools.accumulate(1.0 / rank ** exponent for rank in range(1, len(items) + 1)))
+        self.total = self.cumulative[-1]
+
+    def pick(self):
+        index = bisect.bisect_left(self.cumulative, self.rng.random() * self.total)
+        return self.items[min(index, len(self.items) - 1)]
+
+
+def generate_marketplace(db, products=1_000, buyers=400, sellers=60, orders=500, offers=400,
+                         messages=2_000, reviews=300, skew=1.1, seed=7):
+    """Write a synthetic marketplace with realistic skew and return ids for driving requests.
+
+    A few power sellers own most listings, a few buyers place most orders and
+    send most messages, and a small head of products attracts most orders,
+    offers and carts (Zipf with the given exponent). Prices are log-normal and
+    timestamps spread over the year before 2025-01-01.
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    year_minutes = 365 * 24 * 60
+    password_hash = hashlib.sha256(SEED_PASSWORD.encode()).hexdigest()
+    writer = _BatchWriter(db)
+
+    def when():
+        return start + timedelta(minutes=rng.randrange(year_minutes))
+
+    for i, name in enumerate(CATEGORIES, 1):
+        writer.set('categories', str(i), {'name': name})
+    for i, name in enumerate(CONDITIONS, 1):
+        writer.set('conditions', str(i), {'name': name})
+
+    buyer_ids = [f'buyer{i}' for i in range(buyers)]
+    seller_ids = [f'seller{i}' for i in range(sellers)]
+    government_id = 'govt0'
+    for uid in buyer_ids:
+        writer.user(uid, _user_doc(uid, 'buyer', when(), password_hash))
+    for uid in seller_ids:
+        writer.user(uid, _user_doc(uid, 'seller', when(), password_hash))
+    writer.user(government_id, _user_doc(government_id, 'government', start, password_hash))
+
+    seller_pick = _Zipf(rng, seller_ids, skew)
+    buyer_pick = _Zipf(rng, buyer_ids, skew)
+    category_pick = _Zipf(rng, [str(i) for i in range(1, len(CATEGORIES) + 1)], 0.8)
+
+    product_ids, prices, owners = [], [], []
+    listed_ids, pending_ids, negotiable_ids = [], [], []
+    for i in range(products):
+        seller_id = seller_pick.pick()
+        approval = rng.choices(('approved', 'pending', 'rejected'), weights=(85, 10, 5))[0]
+        status = 'available' if rng.random() < 0.9 else 'sold'
+        negotiable = rng.random() < 0.4
+        price = float(round(min(max(rng.lognormvariate(7.5, 1.2), 50), 500_000)))
+        product_id = writer.set('products', f'product{i}', {
+            'name': f'Item {i}',
+            'description': f'Second-hand item number {i} in decent shape',
+            'price': price,
+            'negotiable': negotiable,
+            'condition_id': str(rng.randint(1, len(CONDITIONS))),
+            'image': None,
+            'category_id': category_pick.pick(),
+            'seller_id': seller_id,
+            'status': status,
+            'approval_status': approval,
+            'approved_by': government_id if approval == 'approved' else None,
+            'approved_at': None,
+            'rejection_reason': 'Incomplete listing' if approval == 'rejected' else None,
+            'created_at': when(),
+        })
+        product_ids.append(product_id)
+        prices.append(price)
+        owners.append(seller_id)
+        if approval == 'approved' and status == 'available':
+            listed_ids.append(i)
+            if negotiable:
+                negotiable_ids.append(i)
+        elif approval == 'pending':
+            pending_ids.append(i)
+
+    # Popularity is over live listings only, the ones buyers can actually see
+    popular = _Zipf(rng, listed_ids or list(range(products)), skew)
+
+    order_ids, tracking_ids = [], []
+    for i in range(orders):
+        order_date = when()
+        tracking_id = f"TM{order_date.strftime('%Y%m%d')}{100000 + i}"
+        chosen = {popular.pick() for _ in range(1 + min(int(rng.expovariate(1.0)), 4))}
+        order_id = writer.set('orders', f'order{i}', {
+            'user_id': buyer_pick.pick(),
+            'order_date': order_date,
+            'status': rng.choices(('pending', 'shipped', 'delivered'), weights=(20, 20, 60))[0],
+            'tracking_status': 'order_placed',
+            'tracking_id': tracking_id,
+            'tracking_updates': [],
+            'estimated_delivery': (order_date + timedelta(days=5)).isoformat(),
+            'delivery_address': 'Somewhere',
+            'payment_method': 'cash_on_delivery',
+            'total_amount': sum(prices[index] for index in chosen),
+        })
+        for index in chosen:
+            writer.set('order_items', None, {
+                'order_id': order_id,
+                'product_id': product_ids[index],
+                'quantity': 1,
+                'price': prices[index],
+            })
+        order_ids.append(order_id)
+        tracking_ids.append(tracking_id)
+
+    cart_owners = sorted({buyer_pick.pick() for _ in range(max(buyers // 3, 1))})
+    for i, buyer_id in enumerate(cart_owners):
+        writer.set('carts', f'cart{i}', {
+            'user_id': buyer_id,
+            'product_id': product_ids[popular.pick()],
+            'quantity': 1,
+        })
+
+    pending_offer_ids = []
+    for i in range(offers):
+        index = popular.pick()
+        status = rng.choices(('pending', 'accepted', 'rejected'), weights=(50, 20, 30))[0]
+        offer_id = writer.set('offers', f'offer{i}', {
+            'product_id': product_ids[index],
+            'buyer_id': buyer_pick.pick(),
+            'seller_id': owners[index],
+            'offer_price': round(prices[index] * rng.uniform(0.7, 0.95)),
+            'status': status,
+            'created_at': when(),
+        })
+        if status == 'pending':
+            pending_offer_ids.append(offer_id)
+
+    for i in range(messages):
+        buyer_id = buyer_pick.pick()
+        index = popular.pick()
+        sender, receiver = (buyer_id, owners[index]) if rng.random() < 0.55 else (owners[index], buyer_id)
+        writer.set('messages', None, {
+            'sender_id': sender,
+            'receiver_id': receiver,
+            'content': f'Message {i}',
+            'product_id': product_ids[index],
+            'read': rng.random() < 0.6,
+            'created_at': when(),
+        })
+
+    for i in range(reviews):
+        writer.set('reviews', None, {
+            'reviewer_id': buyer_pick.pick(),
+            'seller_id': seller_pick.pick(),
+            'rating': rng.choices((1, 2, 3, 4, 5), weights=(5, 5, 10, 30, 50))[0],
+            'comment': 'Fine',
+            'created_at': when(),
+        })
+
+    verification_ids = []
+    for i in range(max(sellers // 20, 1)):
+        verification_ids.append(writer.set('business_verifications', f'verification{i}', {
+            'user_id': seller_ids[-1 - i],
+            'documents': [],
+            'status': 'pending',
+            'created_at': when(),
+        }))
+
+    writer.flush()
+    # The head of each distribution is the worst case for per-user endpoints
+    return {
+        'buyer_id': buyer_ids[0],
+        'buyer_ids': buyer_ids,
+        'seller_id': seller_ids[0],
+        'seller_ids': seller_ids,
+        'government_id': government_id,
+        'product_id': product_ids[popular.items[0]],
+        'product_ids': product_ids,
+        'pending_product_id': product_ids[pending_ids[0]] if pending_ids else product_ids[0],
+        'pending_product_ids': [product_ids[index] for index in pending_ids],
+        'listed_product_ids': [product_ids[index] for index in listed_ids],
+        'negotiable_product_ids': [product_ids[index] for index in negotiable_ids],
+        'order_id': order_ids[0],
+        'order_ids': order_ids,
+        'tracking_id': tracking_ids[0],
+        'cart_id': 'cart0',
+        'cart_ids': [f'cart{i}' for i in range(len(cart_owners))],
+        'offer_id': 'offer0',
+        'pending_offer_ids': pending_offer_ids,
+        'verification_id': verification_ids[0],
+        'verification_ids': verification_ids,
+        'documents_written': writer.written,
+    }
@@ -0,0 +1,157 @@
+"""Print request traces exported by backend/utils/tracing.py as waterfalls.
+
+Reads the OTLP/JSON lines written to TRACE_FILE (or by an OpenTelemetry
+Collector's file exporter) and draws one trace as a tree of spans on a
+shared time axis. Spans on the critical path (the chain of work that
+determines when the request finished) are marked with '*', and a summary
+totals the critical-path time by span name, which is where an endpoint
+like GET /api/products/{product_id} spends its time:
+
+    python -m backend.perf.waterfall traces.jsonl --list
+    python -m backend.perf.waterfall traces.jsonl --route '/api/products/{product_id}'
+    python -m backend.perf.waterfall traces.jsonl --trace 4bf92f3577b34da6a3ce929d0e0e4736
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+class TraceSpan:
+    __slots__ = ('span_id', 'parent_id', 'name', 'start', 'end', 'attributes', 'error', 'children')
+
+    def __init__(self, raw):
+        self.span_id = raw['spanId']
+        self.parent_id = raw.get('parentSpanId') or None
+        self.name = raw['name']
+        self.start = int(raw['startTimeUnixNano'])
+        self.end = int(raw['endTimeUnixNano'])
+        self.attributes = {a['key']: next(iter(a['value'].values())) for a in raw.get('attributes', [])}
+        self.error = raw.get('status', {}).get('code') == 2
+        self.children = []
+
+    @property
+    def duration_ms(self):
+        return (self.end - self.start) / 1e6
+
+
+def load_traces(paths):
+    """trace id -> list of TraceSpan, from OTLP/JSON ExportTraceServiceRequest lines"""
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    payload = json.loads(line)
+                except ValueError:
+                    continue
+                for resource in payload.get('resourceSpans', []):
+                    for scope in resource.get('scopeSpans', []):
+                        for raw in scope.get('spans', []):
+                            traces[raw['traceId']].append(TraceSpan(raw))
+    return traces
+
+
+def build_tree(spans):
+    """Link children to parents; returns the root spans (those whose parent is not in this file)"""
+    by_id = {span.span_id: span for span in spans}
+    roots = []
+    for span in spans:
+        parent = by_id.get(span.parent_id)
+        if parent is None:
+            roots.append(span)
+        else:
+            parent.children.append(span)
+    for span in spans:
+        span.children.sort(key=lambda child: child.start)
+    roots.sort(key=lambda root: root.start)
+    return roots
+
+
+def critical_path(span):
+    """Span ids on the critical path: walk back from the end, taking the last child to finish each time"""
+    ids = {span.span_id}
+    cursor = span.end
+    for child in sorted(span.children, key=lambda child: child.end, reverse=True):
+        if child.end <= cursor:
+            ids |= critical_path(child)
+            cursor = child.start
+    return ids
+
+
+def _walk(span, depth=0):
+    yield span, depth
+    for child in span.children:
+        yield from _walk(child, depth + 1)
+
+
+def render(root, out, width=50):
+    critical = critical_path(root)
+    total = max(root.end - root.start, 1)
+    scale = width / total
+    out.write(f"{root.name}  {root.duration_ms:.2f}ms  status {root.attributes.get('http.response.status_code', '-')}\n")
+    out.write(f"{'start':>9} {'dur ms':>9}  {'':<{width}}  span\n")
+    for span, depth in _walk(root):
+        left = int((span.start - root.start) * scale)
+        bar = max(int((span.end - span.start) * scale), 1)
+        track = (' ' * left + '#' * bar).ljust(width)[:width]
+        marker = '*' if span.span_id in critical else ' '
+        error = '  ERROR' if span.error else ''
+        out.write(f"{(span.start - root.start) / 1e6:>9.2f} {span.duration_ms:>9.2f}  {track} {marker}"
+                  f"{'  ' * depth}{span.name}{error}\n")
+
+    # Time on the critical path by span name, minus the part covered by critical children (self time)
+    totals = defaultdict(lambda: [0, 0.0])
+    for span, _ in _walk(root):
+        if span.span_id not in critical:
+            continue
+        covered = sum(child.end - child.start for child in span.children if child.span_id in critical)
+        entry = totals[span.name]
+        entry[0] += 1
+        entry[1] += (span.end - span.start - covered) / 1e6
+    out.write('\nCritical path self time:\n')
+    for name, (count, self_ms) in sorted(totals.items(), key=lambda item: -item[1][1]):
+        out.write(f"  {self_ms:>9.2f}ms  {self_ms / root.duration_ms * 100:>5.1f}%  x{count:<4} {name}\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('files', nargs='+', help='OTLP/JSON lines files (TRACE_FILE)')
+    parser.add_argument('--trace', help='trace id to draw')
+    parser.add_argument('--route', help='only traces whose root span name contains this text')
+    parser.add_argument('--pick', choices=('slowest', 'latest'), default='slowest',
+                        help='which matching trace to draw when --trace is not given')
+    parser.add_argument('--list', action='store_true', help='list matching traces instead of drawing one')
+    parser.add_argument('--width', type=int, default=50, help='width of the time axis in characters')
+    args = parser.parse_args(argv)
+
+    candidates = []
+    for trace_id, spans in load_traces(args.files).items():
+        if args.trace and trace_id != args.trace:
+            continue
+        for root in build_tree(spans):
+            if args.route and args.route not in root.name:
+                continue
+            candidates.append((trace_id, root, len(spans)))
+    if not candidates:
+        print('No matching traces', file=sys.stderr)
+        return 1
+
+    if args.list:
+        candidates.sort(key=lambda item: -item[1].duration_ms)
+        for trace_id, root, count in candidates:
+            print(f"{trace_id}  {root.duration_ms:>9.2f}ms  {count:>4} spans  {root.name}")
+        return 0
+
+    key = (lambda item: item[1].duration_ms) if args.pick == 'slowest' else (lambda item: item[1].start)
+    trace_id, root, _ = max(candidates, key=key)
+    print(f'trace {trace_id}')
+    render(root, sys.stdout, args.width)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,3 +6,5 @@ from .orders import router as orders_router
 from .messages import router as messages_router
 from .offers import router as offers_router
 from .admin import router as admin_router
+from .diagnostics import router as diagnostics_router
+from .images import router as images_router
@@ -1,15 +1,25 @@
 # Admin Routes (Government Portal)
 from fastapi import APIRouter, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List
 
 from ..models.user import UserModel
 from ..models.verification import BusinessVerificationModel, ReviewModel
 from ..models.product import ProductModel, CategoryModel, ConditionModel
-from ..models.order import OrderItemModel
-from ..config import db
+from ..models.order import OrderModel, OrderItemModel
+from ..models.oversight import OversightEventModel, EVENT_TYPES
+from ..config import (
+    db,
+    BULK_MODERATION_MAX_IDS,
+    MODERATION_PAGE_MAX,
+    MODERATION_LEASE_SECONDS,
+    HIGH_VALUE_ORDER_THRESHOLD
+)
+import logging
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
+logger = logging.getLogger(__name__)
 
 class VerificationResponse(BaseModel):
     action: str  # 'approve' or 'reject'
@@ -29,6 +39,21 @@ class ProductDeletionRequest(BaseModel):
     gov_employee_id: str
     reason: str
 
+class ClaimRequest(BaseModel):
+    gov_employee_id: str
+    count: int = 20
+    category_id: Optional[str] = None
+    seller_id: Optional[str] = None
+
+class ReleaseRequest(BaseModel):
+    gov_employee_id: str
+    product_ids: List[str]
+
+class BulkModerationRequest(BaseModel):
+    product_ids: List[str]
+    gov_employee_id: str
+    reason: Optional[str] = None
+
 @router.get("/pending-verifications")
 async def get_pending_verifications():
     verifications = BusinessVerificationModel.get_pending()
@@ -70,7 +95,7 @@ async def get_oversight_items():
     
     # Direct Firestore Query for High Value Orders
     try:
-        high_val_docs = db.collection('orders').where('total_amount', '>', 50000).limit(10).stream()
+        high_val_docs = db.collection('orders').where('total_amount', '>', HIGH_VALUE_ORDER_THRESHOLD).limit(10).stream()
         for doc in high_val_docs:
             data = doc.to_dict()
             if data.get('status') not in ['completed', 'cancelled']: # Only flag active high value orders
@@ -84,10 +109,74 @@ async def get_oversight_items():
                     'raw_data': {'id': doc.id, **data}
                 })
     except Exception as e:
-        print(f"Error fetching high value orders: {e}")
+        logger.error("Error fetching high value orders: %s", e)
 
     return items
 
+# Oversight event type -> collection holding the subject it refers to
+OVERSIGHT_SUBJECTS = {
+    'seller_verification': BusinessVerificationModel.COLLECTION,
+    'high_value_order': OrderModel.COLLECTION,
+}
+
+def iso_date(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+@router.get("/oversight-feed")
+async def get_oversight_feed(cursor: Optional[str] = None, limit: int = 100):
+    """Oversight items recorded after `cursor`, oldest first, with counts by type.
+
+    Poll again with next_cursor; it stays put when nothing new has arrived,
+    so each load reads only the new events plus their subjects and sellers.
+    """
+    if not 0 < limit <= 500:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 500")
+    try:
+        events, has_more = OversightEventModel.get_since(cursor, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    # Current state of each subject and the users behind them: one get_all each
+    refs = [db.collection(OVERSIGHT_SUBJECTS[e['type']]).document(e['subject_id'])
+            for e in events if e.get('type') in OVERSIGHT_SUBJECTS]
+    subjects = {(doc.reference.parent.id, doc.id): {'id': doc.id, **doc.to_dict()}
+                for doc in (db.get_all(refs) if refs else []) if doc.exists}
+    users = {u['id']: u for u in UserModel.get_by_ids([e.get('user_id') for e in events])}
+    
+    items = []
+    counts = dict.fromkeys(EVENT_TYPES, 0)
+    for event in events:
+        event_type = event.get('type')
+        if event_type not in OVERSIGHT_SUBJECTS:
+            continue
+        counts[event_type] += 1
+        subject = subjects.get((OVERSIGHT_SUBJECTS[event_type], event['subject_id']))
+        user = users.get(event.get('user_id'))
+        if event_type == 'seller_verification':
+            details = f"New seller registration: {user.get('username', 'Unknown') if user else 'Unknown'}"
+            action_link = "/govt/sellers"
+        else:
+            details = f"Order Value: ₹{event.get('total_amount', 0):,}"
+            action_link = f"/orders/{event['subject_id']}"
+        items.append({
+            'id': event['subject_id'],
+            'event_id': event['id'],
+            'type': EVENT_TYPES[event_type],
+            'status': (subject or {}).get('status', 'missing'),
+            'date': iso_date(event.get('created_at')),
+            'details': details,
+            'action_link': action_link,
+            'raw_data': subject
+        })
+    
+    return {
+        "items": items,
+        "counts": counts,
+        "totals": OversightEventModel.get_totals(),
+        "next_cursor": events[-1]['id'] if events else cursor,
+        "has_more": has_more
+    }
+
 @router.get("/sellers")
 async def get_all_sellers():
     sellers = UserModel.get_all_sellers()
@@ -206,6 +295,10 @@ async def get_pending_products():
     # Filter out deleted products  
     products = [p for p in products if p.get('status') != 'deleted']
     
+    return with_review_details(products)
+
+def with_review_details(products):
+    """Attach seller, category and condition details reviewers see next to each product"""
     # Enrich with seller and category info
     seller_ids = list(set([p.get('seller_id') for p in products if p.get('seller_id')]))
     sellers = UserModel.get_by_ids(seller_ids)
@@ -231,6 +324,47 @@ async def get_pending_products():
     
     return products
 
+@router.get("/moderation-queue")
+async def get_moderation_queue(approval_status: str = 'pending', category_id: Optional[str] = None,
+                               seller_id: Optional[str] = None, limit: int = 50, cursor: Optional[str] = None):
+    """One page of products awaiting review, oldest first; pass next_cursor back for the next page"""
+    if approval_status not in ('pending', 'approved', 'rejected'):
+        raise HTTPException(status_code=400, detail="Invalid approval status")
+    if not 0 < limit <= MODERATION_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MODERATION_PAGE_MAX}")
+    try:
+        products, next_cursor = ProductModel.get_moderation_page(approval_status, category_id, seller_id,
+                                                                 limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    
+    for product in products:
+        product['claimed_by'] = ProductModel.lease_holder(product)
+    return {"products": with_review_details(products), "next_cursor": next_cursor}
+
+@router.post("/moderation-queue/claim")
+async def claim_moderation_batch(request: ClaimRequest):
+    """Reserve the oldest unclaimed pending products for one reviewer until the lease expires"""
+    if not 0 < request.count <= MODERATION_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"count must be between 1 and {MODERATION_PAGE_MAX}")
+    
+    products, expires_at = await run_in_threadpool(
+        ProductModel.claim_for_review, request.gov_employee_id, request.count, MODERATION_LEASE_SECONDS,
+        request.category_id, request.seller_id)
+    logger.info("Reviewer %s claimed %d products", request.gov_employee_id, len(products))
+    return {"products": with_review_details(products), "lease_expires_at": expires_at.isoformat()}
+
+@router.post("/moderation-queue/release")
+async def release_moderation_batch(request: ReleaseRequest):
+    """Hand claimed products back to the queue before their lease expires"""
+    released = ProductModel.release_leases(request.gov_employee_id, request.product_ids)
+    return {"success": True, "released": released}
+
+def check_lease(product, gov_employee_id):
+    holder = ProductModel.lease_holder(product)
+    if holder is not None and holder != str(gov_employee_id):
+        raise HTTPException(status_code=409, detail="Product is claimed by another reviewer")
+
 @router.post("/product/{product_id}/approve")
 async def approve_product(product_id: str, request: ProductApprovalRequest):
     """Approve a pending product"""
@@ -240,6 +374,7 @@ async def approve_product(product_id: str, request: ProductApprovalRequest):
     
     if product.get('approval_status') == 'approved':
         raise HTTPException(status_code=400, detail="Product already approved")
+    check_lease(product, request.gov_employee_id)
     
     ProductModel.approve_product(product_id, request.gov_employee_id)
     return {"success": True, "message": "Product approved successfully"}
@@ -253,6 +388,7 @@ async def reject_product(product_id: str, request: ProductRejectionRequest):
     
     if product.get('approval_status') == 'approved':
         raise HTTPException(status_code=400, detail="Product already approved")
+    check_lease(product, request.gov_employee_id)
     
     ProductModel.reject_product(product_id, request.gov_employee_id, request.reason)
     return {"success": True, "message": "Product rejected"}
@@ -263,10 +399,44 @@ async def delete_product(product_id: str, request: ProductDeletionRequest):
     product = ProductModel.get_by_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
+    check_lease(product, request.gov_employee_id)
     
     ProductModel.delete_by_government(product_id, request.gov_employee_id, request.reason)
     return {"success": True, "message": "Product deleted successfully"}
 
+async def bulk_moderate(action: str, request: BulkModerationRequest):
+    if not request.product_ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(request.product_ids) > BULK_MODERATION_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BULK_MODERATION_MAX_IDS} products per request")
+    if action != 'approve' and not request.reason:
+        raise HTTPException(status_code=400, detail="A reason is required")
+    
+    # Thousands of reads and several batch commits: keep them off the event loop
+    results = await run_in_threadpool(ProductModel.bulk_moderate, action, request.product_ids,
+                                      request.gov_employee_id, request.reason)
+    summary = {}
+    for item in results:
+        summary[item['result']] = summary.get(item['result'], 0) + 1
+    if summary.get('failed'):
+        logger.warning("Bulk %s: %d of %d products failed to save", action, summary['failed'], len(results))
+    return {"success": not summary.get('failed'), "summary": summary, "results": results}
+
+@router.post("/products/bulk-approve")
+async def bulk_approve_products(request: BulkModerationRequest):
+    """Approve many products; per-product results in request order"""
+    return await bulk_moderate('approve', request)
+
+@router.post("/products/bulk-reject")
+async def bulk_reject_products(request: BulkModerationRequest):
+    """Reject many products; per-product results in request order"""
+    return await bulk_moderate('reject', request)
+
+@router.post("/products/bulk-delete")
+async def bulk_delete_products(request: BulkModerationRequest):
+    """Delete many products; per-product results in request order"""
+    return await bulk_moderate('delete', request)
+
 @router.get("/product-approval-stats")
 async def get_product_approval_stats():
     """Get statistics about product approvals"""
@@ -1,20 +1,49 @@
 # Authentication Routes
-from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel, field_validator
 from typing import Optional
 import uuid
 from datetime import datetime, timedelta
 from jose import jwt
 
-from ..config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, firebase_auth
-from ..models.user import UserModel
-
-from ..models.user import UserModel
+from ..config import (
+    SECRET_KEY,
+    ALGORITHM,
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_MAX_QUEUE,
+    PASSWORD_SCRYPT_N,
+    PASSWORD_SCRYPT_R,
+    PASSWORD_SCRYPT_P,
+    TOKEN_CACHE_MAX_ENTRIES,
+    get_firebase_auth
+)
+from ..models.user import UserModel, IdentifierTaken, user_status_cache
+from ..utils.passwords import PasswordHasher, HasherBusy
+from ..utils.tokens import TokenVerifier, InvalidToken
 import logging
 
 router = APIRouter(prefix="/api/auth", tags=["auth"])
 logger = logging.getLogger(__name__)
 
+password_hasher = PasswordHasher(
+    workers=PASSWORD_HASH_WORKERS or None,
+    max_queue=PASSWORD_HASH_MAX_QUEUE,
+    n=PASSWORD_SCRYPT_N,
+    r=PASSWORD_SCRYPT_R,
+    p=PASSWORD_SCRYPT_P
+)
+
+token_verifier = TokenVerifier(SECRET_KEY, ALGORITHM, max_entries=TOKEN_CACHE_MAX_ENTRIES,
+                               max_ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+bearer = HTTPBearer(auto_error=False)
+
+def busy():
+    return HTTPException(status_code=503, detail="Too many sign-ins in progress, retry shortly",
+                         headers={"Retry-After": "1"})
+
 class LoginRequest(BaseModel):
     email: str
     password: str
@@ -27,6 +56,13 @@ class RegisterRequest(BaseModel):
     address: Optional[str] = ""
     user_type: str = "buyer"
 
+    @field_validator('username')
+    @classmethod
+    def username_not_blank(cls, value):
+        if not value.strip():
+            raise ValueError('Username cannot be empty')
+        return value
+
 class GoogleLoginRequest(BaseModel):
     id_token: str
     user_type: str = "buyer"
@@ -46,21 +82,57 @@ def create_access_token(data: dict):
     to_encode.update({"exp": expire})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
-@router.post("/login")
-async def login(request: LoginRequest):
-    user = UserModel.get_by_email(request.email)
+async def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)):
+    """Dependency: the caller's cached status ({'id', 'username', 'user_type', 'is_suspended'}) from their bearer token"""
+    unauthorized = HTTPException(status_code=401, detail="Not authenticated",
+                                 headers={"WWW-Authenticate": "Bearer"})
+    if credentials is None:
+        raise unauthorized
+    try:
+        claims = token_verifier.verify(credentials.credentials)
+    except InvalidToken:
+        raise unauthorized
+    
+    user_id = claims['sub']
+    # A cache hit answers without leaving the event loop; a miss reads the user in the threadpool
+    user = user_status_cache.get(user_id)
+    if user is None:
+        user = await run_in_threadpool(UserModel.load_status, user_id)
     if not user:
-        user = UserModel.get_by_username(request.email)
+        raise unauthorized
+    if user['is_suspended']:
+        raise HTTPException(status_code=403, detail="Account suspended")
+    return user
+
+def require_user_type(*user_types):
+    """Dependency factory: get_current_user, restricted to the given user types"""
+    async def dependency(user: dict = Depends(get_current_user)):
+        if user.get('user_type') not in user_types:
+            raise HTTPException(status_code=403, detail="Not allowed for this account type")
+        return user
+    return dependency
+
+@router.post("/login")
+async def login(request: LoginRequest, background_tasks: BackgroundTasks):
+    user = await run_in_threadpool(UserModel.get_by_login, request.email)
     
     if not user:
         raise HTTPException(status_code=401, detail="Invalid email/username or password")
     
     stored_hash = user.get('password_hash')
-    if not stored_hash or not UserModel.verify_password(request.password, stored_hash):
-        logger.warning(f"Failed login attempt for email: {request.email}")
+    try:
+        matches, needs_rehash = await password_hasher.verify(request.password, stored_hash) if stored_hash else (False, False)
+    except HasherBusy:
+        raise busy()
+    if not matches:
+        logger.warning("Failed login attempt for email: %s", request.email)
         raise HTTPException(status_code=401, detail="Invalid email/username or password")
+    if needs_rehash:
+        # After the response: the upgrade costs a second scrypt run the user should not wait for
+        background_tasks.add_task(password_hasher.upgrade, request.password, stored_hash,
+                                  lambda new_hash: UserModel.update(user['id'], {'password_hash': new_hash}))
     
-    logger.info(f"User logged in: {user.get('username')} ({user.get('id')})")
+    logger.info("User logged in: %s (%s)", user.get('username'), user.get('id'))
     token = create_access_token({
         "sub": user['id'],
         "username": user.get('username'),
@@ -81,41 +153,64 @@ async def login(request: LoginRequest):
 
 @router.post("/register")
 async def register(request: RegisterRequest):
-    logger.info(f"Registration attempt - username: {request.username}, email: {request.email}, user_type: {request.user_type}")
+    logger.info("Registration attempt - username: %s, email: %s, user_type: %s", request.username, request.email, request.user_type)
     
-    if UserModel.get_by_username(request.username):
-        logger.warning(f"Registration failed: Username {request.username} already exists")
+    # Fails fast before a Firebase account is made; create_user re-checks inside its transaction
+    taken = await run_in_threadpool(UserModel.identifiers_taken, request.email, request.username)
+    if 'username' in taken:
+        logger.warning("Registration failed: Username %s already exists", request.username)
         raise HTTPException(status_code=400, detail="Username already exists")
     
-    if UserModel.get_by_email(request.email):
-        logger.warning(f"Registration failed: Email {request.email} already exists")
+    if 'email' in taken:
+        logger.warning("Registration failed: Email %s already exists", request.email)
         raise HTTPException(status_code=400, detail="Email already exists")
     
     try:
+        # Hashed first: a busy hasher must not leave a Firebase account behind
+        try:
+            password_hash = await password_hasher.hash(request.password)
+        except HasherBusy:
+            raise busy()
+        
+        firebase_user = None
         try:
-            firebase_user = firebase_auth.create_user(
+            firebase_user = get_firebase_auth().create_user(
                 email=request.email,
                 password=request.password,
                 display_name=request.username
             )
             uid = firebase_user.uid
-            logger.info(f"Firebase user created: {uid}")
+            logger.info("Firebase user created: %s", uid)
         except Exception as firebase_error:
-            logger.warning(f"Firebase user creation failed: {str(firebase_error)}. Using UUID instead.")
+            logger.warning("Firebase user creation failed: %s. Using UUID instead.", firebase_error)
             uid = str(uuid.uuid4())
         
-        password_hash = UserModel.hash_password(request.password)
-        user = UserModel.create_user(
-            uid=uid,
-            username=request.username,
-            email=request.email,
-            phone=request.phone,
-            address=request.address,
-            user_type=request.user_type,
-            password_hash=password_hash
-        )
+        try:
+            user = await run_in_threadpool(
+                UserModel.create_user,
+                uid=uid,
+                username=request.username,
+                email=request.email,
+                phone=request.phone,
+                address=request.address,
+                user_type=request.user_type,
+                password_hash=password_hash
+            )
+        except Exception as e:
+            # No user document points at the Firebase account, so a retry would find it orphaned
+            if firebase_user is not None:
+                try:
+                    get_firebase_auth().delete_user(uid)
+                except Exception as cleanup_error:
+                    logger.warning("Could not remove Firebase user %s: %s", uid, cleanup_error)
+            if isinstance(e, IdentifierTaken):
+                # A concurrent registration claimed the same email or username first
+                logger.warning("Registration failed: %s for %s / %s was taken concurrently",
+                               e.kind, request.username, request.email)
+                raise HTTPException(status_code=400, detail=f"{e.kind.capitalize()} already exists")
+            raise
         
-        logger.info(f"User created successfully: {request.username} ({uid})")
+        logger.info("User created successfully: %s (%s)", request.username, uid)
         
         token = create_access_token({
             "sub": uid,
@@ -139,13 +234,13 @@ async def register(request: RegisterRequest):
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Registration error: {str(e)}", exc_info=True)
+        logger.error("Registration error: %s", e, exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/google-login")
 async def google_login(request: GoogleLoginRequest):
     try:
-        decoded_token = firebase_auth.verify_id_token(request.id_token)
+        decoded_token = get_firebase_auth().verify_id_token(request.id_token)
         uid = decoded_token['uid']
         email = decoded_token.get('email', '')
         name = decoded_token.get('name', email.split('@')[0] if email else 'User')
@@ -153,19 +248,21 @@ async def google_login(request: GoogleLoginRequest):
         user = UserModel.get_by_id(uid)
         
         if not user:
-            user = UserModel.get_by_email(email)
+            user = UserModel.get_by_identifier('email', email) if email else None
             if user:
                 uid = user['id']
             else:
-                user = UserModel.create_user(
-                    uid=uid,
-                    username=name.replace(' ', '_').lower(),
-                    email=email,
-                    phone='',
-                    address='',
-                    user_type=request.user_type,
-                    password_hash=''
-                )
+                username = name.replace(' ', '_').lower()
+                try:
+                    user = UserModel.create_user(uid=uid, username=username, email=email, phone='', address='',
+                                                 user_type=request.user_type, password_hash='')
+                except IdentifierTaken as e:
+                    if e.kind != 'username':
+                        raise
+                    # Display names are not unique; fall back to one suffixed with the Firebase uid
+                    user = UserModel.create_user(uid=uid, username=f'{username}_{uid[:6].lower()}', email=email,
+                                                 phone='', address='', user_type=request.user_type,
+                                                 password_hash='')
                 UserModel.update(uid, {'is_verified': True})
                 user['id'] = uid
                 user['is_verified'] = True
@@ -206,6 +303,10 @@ async def verify_account(request: VerifyRequest):
     else:
         raise HTTPException(status_code=400, detail="Invalid verification code")
 
+@router.get("/me")
+async def get_me(user: dict = Depends(get_current_user)):
+    return user
+
 @router.get("/user/{user_id}")
 async def get_user(user_id: str):
     user = UserModel.get_by_id(user_id)
@@ -58,7 +58,7 @@ async def add_to_cart(request: AddToCartRequest):
     
     cart_id = CartModel.add_to_cart(request.user_id, request.product_id, request.quantity)
     
-    logger.info(f"Item added to cart: Product {request.product_id} (Qty: {request.quantity}) for User {request.user_id}")
+    logger.info("Item added to cart: Product %s (Qty: %s) for User %s", request.product_id, request.quantity, request.user_id)
     return {"success": True, "cart_id": cart_id}
 
 @router.put("/{cart_id}")
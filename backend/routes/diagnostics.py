@@ -0,0 +1,121 @@
+# Diagnostics Routes (request profiles, event-loop stalls, heap snapshots); every endpoint requires the X-Admin-Token header
+import hmac
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+
+from ..config import ADMIN_TOKEN, PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_MAX_BYTES, HEAP_MAX_SNAPSHOTS
+from ..utils.profiler import ProfileStore, to_collapsed
+from ..utils.heap import heap_tracker, route_memory, KEY_TYPES
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def require_admin_token(x_admin_token: Optional[str] = Header(None)):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Diagnostics are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((x_admin_token or '').encode('utf-8'), ADMIN_TOKEN.encode('utf-8')):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+
+router = APIRouter(prefix="/api/admin/diagnostics", tags=["diagnostics"], dependencies=[Depends(require_admin_token)])
+
+profile_store = ProfileStore(PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_MAX_BYTES)
+heap_tracker.max_snapshots = HEAP_MAX_SNAPSHOTS
+
+
+@router.get("/profiles")
+async def list_profiles(route: Optional[str] = None, limit: int = 50):
+    """Most recent request profiles first"""
+    profiles = profile_store.list()
+    if route:
+        profiles = [p for p in profiles if route in p.get('route', '')]
+    return profiles[:limit]
+
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str, format: str = "speedscope"):
+    """The stored profile as speedscope JSON, or as collapsed stacks with ?format=collapsed"""
+    document = profile_store.load(profile_id)
+    if document is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if format == "collapsed":
+        return PlainTextResponse(to_collapsed(document))
+    if format != "speedscope":
+        raise HTTPException(status_code=400, detail="format must be 'speedscope' or 'collapsed'")
+    return document
+
+
+@router.get("/loop-stalls")
+async def list_loop_stalls(request: Request, limit: int = 50):
+    """Most recent event-loop stalls first, with the route, call site and stack that blocked"""
+    monitor = getattr(request.app.state, 'loop_monitor', None)
+    if monitor is None:
+        raise HTTPException(status_code=404, detail="Event-loop monitor is disabled")
+    return {
+        'interval_ms': monitor.interval * 1000,
+        'threshold_ms': monitor.threshold * 1000,
+        'stalls': list(reversed(monitor.stalls))[:limit],
+    }
+
+
+def _check_key(key):
+    if key not in KEY_TYPES:
+        raise HTTPException(status_code=400, detail=f"key must be one of {', '.join(KEY_TYPES)}")
+
+
+@router.get("/heap")
+async def heap_status():
+    """tracemalloc state, RSS and the snapshots held by this worker"""
+    return heap_tracker.status()
+
+
+@router.post("/heap/start")
+async def start_heap_tracing(frames: int = 1):
+    """Start tracemalloc; more frames per allocation cost more memory and time"""
+    if not 1 <= frames <= 100:
+        raise HTTPException(status_code=400, detail="frames must be between 1 and 100")
+    return heap_tracker.start(frames)
+
+
+@router.post("/heap/stop")
+async def stop_heap_tracing():
+    return heap_tracker.stop()
+
+
+@router.post("/heap/snapshots")
+async def take_heap_snapshot():
+    try:
+        # Walking every traced block takes a while on a big heap; keep it off the event loop
+        return await run_in_threadpool(heap_tracker.take_snapshot)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/heap/snapshots/{snapshot_id}/top")
+async def heap_top(snapshot_id: str, key: str = "lineno", limit: int = 25):
+    """Largest allocation sites in a snapshot"""
+    _check_key(key)
+    try:
+        return await run_in_threadpool(heap_tracker.top, snapshot_id, key, limit)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@router.get("/heap/diff")
+async def heap_diff(base: str, target: str, key: str = "lineno", limit: int = 25):
+    """Allocation sites that grew the most between two snapshots"""
+    _check_key(key)
+    try:
+        return await run_in_threadpool(heap_tracker.diff, base, target, key, limit)
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail=f"Snapshot not found: {e.args[0]}")
+
+
+@router.get("/memory/routes")
+async def memory_by_route(limit: int = 50):
+    """Routes ordered by the largest RSS growth a single request caused"""
+    return route_memory.summary()[:limit]
@@ -0,0 +1,184 @@
+# Image Delivery Routes: resized variants of stored images, cached on disk with long-lived caching headers
+import asyncio
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from ..config import IMAGE_DIR, IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_MB, IMAGE_RESIZE_WORKERS
+from ..utils import images as image_utils
+from ..utils.images import DiskLRUCache, RESIZE_FORMATS, resize_to_file
+from ..utils.metrics import record_cache_lookup
+import logging
+
+router = APIRouter(prefix="/api/images", tags=["images"])
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'frontend', 'public', 'images', 'products')
+SOURCES = {'uploads': UPLOAD_DIR, 'media': IMAGE_DIR}
+
+# Widths are snapped up to one of these so arbitrary ?w= values cannot fill the cache
+WIDTHS = (64, 128, 160, 240, 320, 480, 640, 800, 1024, 1280, 1600, 1920)
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Legacy uploads are addressed by file name, so they are revalidated by ETag instead
+REVALIDATE = "public, max-age=86400, stale-while-revalidate=604800"
+_RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+_SOURCE_HASHES_MAX = 4096
+
+cache = DiskLRUCache(IMAGE_CACHE_DIR, int(IMAGE_CACHE_MAX_MB * 1024 * 1024))
+_source_hashes = OrderedDict()  # path -> (mtime_ns, size, sha256)
+_source_hashes_lock = threading.Lock()
+_in_flight = {}
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_RESIZE_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _resolve(source: str, path: str):
+    base = SOURCES.get(source)
+    if base is None:
+        return None
+    base = os.path.realpath(base)
+    full = os.path.realpath(os.path.join(base, path))
+    if not full.startswith(base + os.sep) or not os.path.isfile(full):
+        return None
+    return full
+
+
+def _source_hash(path):
+    """sha256 of a source file, remembered until its size or mtime changes"""
+    stat = os.stat(path)
+    with _source_hashes_lock:
+        cached = _source_hashes.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            _source_hashes.move_to_end(path)
+            return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    with _source_hashes_lock:
+        _source_hashes[path] = (stat.st_mtime_ns, stat.st_size, digest.hexdigest())
+        while len(_source_hashes) > _SOURCE_HASHES_MAX:
+            _source_hashes.popitem(last=False)
+    return digest.hexdigest()
+
+
+def _negotiate(fmt: str, accept: str):
+    if fmt == 'auto':
+        return 'webp' if 'image/webp' in accept else 'jpeg'
+    if fmt not in RESIZE_FORMATS:
+        raise HTTPException(status_code=400, detail=f"fmt must be auto or one of {', '.join(RESIZE_FORMATS)}")
+    return fmt
+
+
+async def _render(name, source_path, width, fmt, quality):
+    """Produce a cache entry once, however many requests ask for it at the same time"""
+    task = _in_flight.get(name)
+    if task is None:
+        # Registered before the first await so concurrent requests find it and wait instead
+        task = asyncio.ensure_future(_render_once(name, source_path, width, fmt, quality))
+        _in_flight[name] = task
+        task.add_done_callback(lambda done: _in_flight.pop(name) if _in_flight.get(name) is done else None)
+    # Shielded: a client that disconnects stops waiting without cancelling the render for the others
+    await asyncio.shield(task)
+
+
+async def _render_once(name, source_path, width, fmt, quality):
+    destination = cache.path(name)
+    await run_in_threadpool(os.makedirs, os.path.dirname(destination), exist_ok=True)
+    loop = asyncio.get_running_loop()
+    size = await loop.run_in_executor(_get_pool(), resize_to_file, source_path, destination, width, fmt, quality)
+    cache.add(name, size)
+
+
+def _file_response(f, range_header, headers, media_type):
+    """Serve an open cache file: 206 for a single byte range, 416 if it cannot be satisfied, else all of it.
+
+    Read from the handle, not the path, so a concurrent eviction cannot
+    remove the file between the lookup and the response.
+    """
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        match = _RANGE.match(range_header.strip()) if range_header else None
+        if not match or match.group(1) == match.group(2) == '':
+            return Response(f.read(), media_type=media_type, headers=headers)
+        if match.group(1):
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+        else:
+            start, end = max(size - int(match.group(2)), 0), size - 1
+        if start >= size or start > end:
+            return Response(status_code=416, headers={**headers, 'Content-Range': f'bytes */{size}'})
+        f.seek(start)
+        body = f.read(end - start + 1)
+    return Response(body, status_code=206, media_type=media_type,
+                    headers={**headers, 'Content-Range': f'bytes {start}-{end}/{size}'})
+
+
+@router.get("/{source}/{path:path}")
+async def get_image(request: Request, source: str, path: str, w: int = 640, fmt: str = "auto",
+                    q: int = 75):
+    """Stored image resized to at most w pixels wide (w is rounded up to a standard width)"""
+    if image_utils.Image is None:
+        raise HTTPException(status_code=501, detail="Image resizing needs Pillow")
+    source_path = _resolve(source, path)
+    if source_path is None:
+        raise HTTPException(status_code=404, detail="Image not found")
+    width = next((candidate for candidate in WIDTHS if candidate >= w), WIDTHS[-1])
+    quality = min(max(round(q / 5) * 5, 30), 95)
+    fmt = _negotiate(fmt, request.headers.get('accept', ''))
+
+    source_hash = await run_in_threadpool(_source_hash, source_path)
+    key = hashlib.sha256(f'{source_hash}:{width}:{fmt}:{quality}'.encode()).hexdigest()
+    name = os.path.join(key[:2], key + RESIZE_FORMATS[fmt][2])
+    etag = f'"{key[:32]}"'
+    headers = {
+        'ETag': etag,
+        # Media paths embed the content hash, so a URL can never start pointing at different bytes
+        'Cache-Control': IMMUTABLE if source == 'media' else REVALIDATE,
+        'Accept-Ranges': 'bytes',
+        'Vary': 'Accept',
+    }
+
+    if etag in request.headers.get('if-none-match', ''):
+        return Response(status_code=304, headers=headers)
+
+    cached = await run_in_threadpool(cache.open, name)
+    record_cache_lookup('image_resize', hit=cached is not None)
+    # A second pass covers another worker evicting the fresh render before it is opened
+    for _ in range(2):
+        if cached is not None:
+            break
+        try:
+            await _render(name, source_path, width, fmt, quality)
+        except Exception as e:
+            logger.warning("Resizing %s failed: %s", source_path, e)
+            raise HTTPException(status_code=415, detail="Image could not be decoded")
+        cached = await run_in_threadpool(cache.open, name)
+    if cached is None:
+        raise HTTPException(status_code=503, detail="Image cache is too busy, retry shortly",
+                            headers={'Retry-After': '1'})
+
+    range_header = None
+    if request.headers.get('if-range', etag) == etag:
+        range_header = request.headers.get('range')
+    return await run_in_threadpool(_file_response, cached, range_header, headers, RESIZE_FORMATS[fmt][1])
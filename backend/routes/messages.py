@@ -64,7 +64,7 @@ async def send_message(request: SendMessageRequest):
         product_id=request.product_id
     )
     
-    logger.info(f"Message sent from {request.sender_id} to {request.receiver_id}")
+    logger.info("Message sent from %s to %s", request.sender_id, request.receiver_id)
     return {"success": True, "message_id": msg_id}
 
 @router.get("/unread/{user_id}")
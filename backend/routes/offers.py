@@ -1,7 +1,7 @@
 # Offers Routes
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from firebase_admin import firestore
+from ..storage import SERVER_TIMESTAMP
 
 from ..models.offer import OfferModel
 from ..models.product import ProductModel
@@ -120,7 +120,7 @@ async def create_offer(request: CreateOfferRequest):
     if existing_offer:
         OfferModel.update(existing_offer['id'], {
             'offer_price': request.offer_price,
-            'created_at': firestore.SERVER_TIMESTAMP
+            'created_at': SERVER_TIMESTAMP
         })
         return {"success": True, "message": "Offer updated", "offer_id": existing_offer['id']}
     else:
@@ -130,7 +130,7 @@ async def create_offer(request: CreateOfferRequest):
             seller_id=product.get('seller_id'),
             offer_price=request.offer_price
         )
-        logger.info(f"Offer created: {offer_id} for Product {request.product_id} by Buyer {request.buyer_id}")
+        logger.info("Offer created: %s for Product %s by Buyer %s", offer_id, request.product_id, request.buyer_id)
         return {"success": True, "offer_id": offer_id}
 
 @router.post("/{offer_id}/respond")
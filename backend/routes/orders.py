@@ -113,7 +113,7 @@ async def checkout(request: CheckoutRequest):
     
     order = OrderModel.get_by_id(order_id)
     
-    logger.info(f"Order created: {order_id} by User: {request.user_id} Amount: {total}")
+    logger.info("Order created: %s by User: %s Amount: %s", order_id, request.user_id, total)
     return {
         "success": True,
         "order_id": order_id,
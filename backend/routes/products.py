@@ -6,9 +6,22 @@ import os
 import os
 import shutil
 
-from ..models.product import ProductModel, CategoryModel, ConditionModel
+from ..models.product import ProductModel, CategoryModel, ConditionModel, ImageModel
 from ..models.user import UserModel
 from ..models.verification import ReviewModel
+from ..utils.images import ImagePipeline, UploadRejected, UploadTooLarge, create_image_store
+from ..config import (
+    IMAGE_STORE,
+    IMAGE_DIR,
+    IMAGE_BASE_URL,
+    IMAGE_SPOOL_DIR,
+    IMAGE_MAX_UPLOAD_MB,
+    IMAGE_WORKERS,
+    IMAGE_QUALITY,
+    IMAGE_PROCESSING_LEASE_SECONDS,
+    IMGBB_API_KEY,
+    IMGBB_RETRIES
+)
 import logging
 
 router = APIRouter(prefix="/api/products", tags=["products"])
@@ -16,6 +29,18 @@ logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), '..', 'frontend', 'public', 'images', 'products')
 
+# Started and stopped by main.py's startup/shutdown handlers
+image_pipeline = ImagePipeline(
+    create_image_store(IMAGE_STORE, IMAGE_DIR, IMAGE_BASE_URL, IMGBB_API_KEY, IMGBB_RETRIES),
+    registry=ImageModel,
+    products=ProductModel,
+    spool_dir=IMAGE_SPOOL_DIR,
+    max_bytes=int(IMAGE_MAX_UPLOAD_MB * 1024 * 1024),
+    workers=IMAGE_WORKERS,
+    quality=IMAGE_QUALITY,
+    lease_seconds=IMAGE_PROCESSING_LEASE_SECONDS
+)
+
 class ProductCreate(BaseModel):
     name: str
     description: str
@@ -205,49 +230,31 @@ async def create_product(
     seller_id: str = Form(...),
     image: Optional[UploadFile] = File(None)
 ):
-    image_path = None
-    if image:
-        # ImgBB Upload
-        import requests
-        import base64
-        
-        IMGBB_API_KEY = "a1e67563c8efec2b94d9b605b0aa1db9" # Should be in env vars
-        
-        # Read file content
-        file_content = await image.read()
-        
-        # Prepare payload
-        payload = {
-            "key": IMGBB_API_KEY,
-            "image": base64.b64encode(file_content).decode('utf-8')
-        }
-        
+    spooled = None
+    if image and image.filename:
         try:
-            response = requests.post("https://api.imgbb.com/1/upload", data=payload)
-            response.raise_for_status()
-            result = response.json()
-            if result.get("success"):
-                image_path = result["data"]["url"]
-            else:
-                print(f"ImgBB Error: {result}")
-        except Exception as e:
-            print(f"Image upload failed: {str(e)}")
-            # Fallback or error handling? For now, we continue without image if fail
-            pass
-    
+            spooled = await image_pipeline.spool(image)
+        except UploadTooLarge as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except UploadRejected as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
     product_id = ProductModel.create_product(
         name=name,
         description=description,
         price=price,
         negotiable=negotiable,
         condition_id=condition_id,
-        image=image_path,
+        image=None,
         category_id=category_id,
         seller_id=seller_id
     )
-    
-    logger.info(f"Product created: {name} (ID: {product_id}) by Seller: {seller_id}")
-    return {"success": True, "product_id": product_id}
+
+    # Variants are built by the pipeline's workers; the product picks them up when they are ready
+    image_status = await image_pipeline.attach(spooled, product_id) if spooled else None
+
+    logger.info("Product created: %s (ID: %s) by Seller: %s", name, product_id, seller_id)
+    return {"success": True, "product_id": product_id, "image_status": image_status}
 
 @router.put("/{product_id}")
 async def update_product(product_id: str, data: ProductUpdate):
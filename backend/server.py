@@ -0,0 +1,45 @@
+# Production worker for gunicorn: uvicorn on uvloop/httptools with bounded concurrency and graceful drain
+# Imported by the gunicorn master before the app is preloaded, so it must not import backend.config
+from uvicorn.workers import UvicornWorker
+
+from .utils import workers
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+try:
+    import httptools
+except ImportError:
+    httptools = None
+
+# Time kept back from gunicorn's --graceful-timeout so shutdown handlers can flush
+# logs, traces and the image queue before the arbiter sends SIGKILL
+SHUTDOWN_HANDLER_SECONDS = 5
+
+
+class ProductionWorker(UvicornWorker):
+    """UvicornWorker that takes its limits from the gunicorn command line.
+
+    ``--worker-connections`` caps concurrent connections and tasks per worker
+    (uvicorn answers 503 beyond it), and ``--graceful-timeout`` bounds how long
+    in-flight requests may take to finish after SIGTERM. ``--max-requests``
+    is already honoured by UvicornWorker: the worker exits after that many
+    requests and the arbiter starts a fresh one.
+    """
+
+    CONFIG_KWARGS = {
+        'loop': 'uvloop' if uvloop is not None else 'auto',
+        'http': 'httptools' if httptools is not None else 'auto',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.config.limit_concurrency = self.cfg.worker_connections
+        self.config.timeout_graceful_shutdown = max(self.cfg.graceful_timeout - SHUTDOWN_HANDLER_SECONDS, 1)
+
+    def init_process(self):
+        # Runs in the forked worker: restart the threads and connections the preloaded app left behind
+        workers.worker_started()
+        super().init_process()
@@ -0,0 +1,59 @@
+# Storage backends behind a Firestore-shaped repository interface
+import threading
+
+from .base import (
+    ASCENDING,
+    DESCENDING,
+    SERVER_TIMESTAMP,
+    MAX_BATCH_WRITES,
+    AlreadyExists,
+    Increment,
+    NotFound,
+    Storage,
+)
+
+BACKENDS = ('firestore', 'memory', 'sqlite')
+
+
+def create_storage(kind, client=None, sqlite_path=':memory:'):
+    """Build a storage backend by name; `client` is the Firestore client for kind='firestore'"""
+    if kind == 'firestore':
+        from .firestore import FirestoreStorage
+        return FirestoreStorage(client)
+    if kind == 'memory':
+        from .memory import MemoryStorage
+        return MemoryStorage()
+    if kind == 'sqlite':
+        from .sqlite import SQLiteStorage
+        return SQLiteStorage(sqlite_path)
+    raise ValueError(f"Unknown storage backend '{kind}' (expected one of {', '.join(BACKENDS)})")
+
+
+class LazyStorage:
+    """Stand-in for a storage client that is only built on first use.
+
+    Keeps Firebase initialization and the Firestore client out of import time
+    (and out of a preloading parent process); a startup hook normally builds
+    it in the background before the first request needs it.
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self._client is not None
+
+    def resolve(self):
+        client = self._client
+        if client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._factory()
+                client = self._client
+        return client
+
+    def __getattr__(self, name):
+        return getattr(self.resolve(), name)
@@ -0,0 +1,196 @@
+# Storage repository interface shared by the Firestore, in-memory and SQLite backends
+#
+# The surface deliberately mirrors the subset of the Firestore client the models
+# already use (collection/document/where/order_by/limit/stream, batches, get_all),
+# so model code reads the same whichever backend is configured.
+from datetime import datetime, timezone
+
+ASCENDING = 'ASCENDING'
+DESCENDING = 'DESCENDING'
+
+# Firestore caps batches and transactions at 500 writes; the local backends enforce the same
+MAX_BATCH_WRITES = 500
+
+QUERY_OPERATORS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not-in', 'array_contains', 'array_contains_any')
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return 'SERVER_TIMESTAMP'
+
+
+# Replaced with the commit time when written
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class Increment:
+    """Add `amount` to a numeric field atomically (missing fields count as 0)"""
+
+    def __init__(self, amount):
+        self.amount = amount
+
+    def __repr__(self):
+        return f'Increment({self.amount!r})'
+
+
+class AlreadyExists(Exception):
+    """Raised by create() when the document is already present"""
+
+
+class NotFound(Exception):
+    """Raised by update() when the document does not exist"""
+
+
+def utcnow():
+    return datetime.now(timezone.utc)
+
+
+def resolve_transforms(data, existing=None, now=None):
+    """Apply SERVER_TIMESTAMP / Increment sentinels for backends that store plain values"""
+    now = now or utcnow()
+    resolved = {}
+    for key, value in data.items():
+        if value is SERVER_TIMESTAMP:
+            value = now
+        elif isinstance(value, Increment):
+            current = (existing or {}).get(key)
+            value = (current if isinstance(current, (int, float)) else 0) + value.amount
+        elif isinstance(value, dict):
+            value = resolve_transforms(value, (existing or {}).get(key) if isinstance((existing or {}).get(key), dict) else None, now)
+        resolved[key] = value
+    return resolved
+
+
+def check_operator(op):
+    if op not in QUERY_OPERATORS:
+        raise ValueError(f'Unsupported query operator: {op}')
+
+
+class DocumentSnapshot:
+    __slots__ = ('id', 'reference', '_data')
+
+    def __init__(self, reference, data):
+        self.id = reference.id
+        self.reference = reference
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+    def get(self, field):
+        return self._data.get(field) if self._data is not None else None
+
+
+class Query:
+    """Filters, ordering and limit; executed by stream()"""
+
+    def where(self, field, op, value):
+        raise NotImplementedError
+
+    def order_by(self, field, direction=ASCENDING):
+        raise NotImplementedError
+
+    def limit(self, count):
+        raise NotImplementedError
+
+    def start_after(self, snapshot):
+        """Resume after `snapshot` in this query's order; ties are broken by document id, as in Firestore"""
+        raise NotImplementedError
+
+    def stream(self):
+        raise NotImplementedError
+
+    def get(self):
+        return list(self.stream())
+
+
+class CollectionReference(Query):
+    id = None
+
+    def document(self, document_id=None):
+        raise NotImplementedError
+
+
+class DocumentReference:
+    id = None
+    parent = None
+
+    def get(self):
+        raise NotImplementedError
+
+    def set(self, data, merge=False):
+        raise NotImplementedError
+
+    def create(self, data):
+        raise NotImplementedError
+
+    def update(self, data):
+        raise NotImplementedError
+
+    def delete(self):
+        raise NotImplementedError
+
+
+class WriteBatch:
+    """Buffered writes applied atomically by commit()"""
+
+    def __init__(self):
+        self._writes = []
+
+    def _add(self, op, ref, data=None, merge=False):
+        if len(self._writes) >= MAX_BATCH_WRITES:
+            raise ValueError(f'A batch can hold at most {MAX_BATCH_WRITES} writes')
+        self._writes.append((op, ref, data, merge))
+
+    def set(self, ref, data, merge=False):
+        self._add('set', ref, data, merge)
+
+    def create(self, ref, data):
+        self._add('create', ref, data)
+
+    def update(self, ref, data):
+        self._add('update', ref, data)
+
+    def delete(self, ref):
+        self._add('delete', ref)
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self):
+        raise NotImplementedError
+
+
+class Transaction(WriteBatch):
+    """Reads see committed state; writes are buffered and committed when the callback returns"""
+
+    def get(self, ref):
+        raise NotImplementedError
+
+    def get_all(self, refs):
+        return [self.get(ref) for ref in refs]
+
+
+class Storage:
+    name = None
+
+    def collection(self, name):
+        raise NotImplementedError
+
+    def batch(self):
+        raise NotImplementedError
+
+    def get_all(self, refs):
+        """Snapshots of refs in one round trip, in the order of refs"""
+        raise NotImplementedError
+
+    def run_transaction(self, callback):
+        """Run callback(transaction) atomically and return its result"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
@@ -0,0 +1,185 @@
+# Firestore storage backend: thin adapter over the firebase_admin client
+from firebase_admin import firestore
+from google.api_core import exceptions as google_exceptions
+
+from .base import (
+    AlreadyExists,
+    CollectionReference,
+    DocumentReference,
+    DocumentSnapshot,
+    Increment,
+    NotFound,
+    Query,
+    SERVER_TIMESTAMP,
+    Storage,
+    Transaction,
+    WriteBatch,
+)
+
+
+def _to_firestore(data):
+    """Swap the backend-neutral sentinels for Firestore's own transforms"""
+    converted = {}
+    for key, value in data.items():
+        if value is SERVER_TIMESTAMP:
+            value = firestore.SERVER_TIMESTAMP
+        elif isinstance(value, Increment):
+            value = firestore.Increment(value.amount)
+        elif isinstance(value, dict):
+            value = _to_firestore(value)
+        converted[key] = value
+    return converted
+
+
+def _wrap_snapshot(snapshot):
+    return DocumentSnapshot(
+        FirestoreDocumentReference(snapshot.reference),
+        snapshot.to_dict() if snapshot.exists else None,
+    )
+
+
+def _in_request_order(refs, natives):
+    # get_all() yields in arbitrary order; return snapshots in the order asked for, like the other backends
+    snapshots = {snapshot.reference.path: _wrap_snapshot(snapshot) for snapshot in natives}
+    return [snapshots[ref._native.path] for ref in refs]
+
+
+class _translate_errors:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None and issubclass(exc_type, google_exceptions.Conflict):
+            raise AlreadyExists(str(exc)) from exc
+        if exc_type is not None and issubclass(exc_type, google_exceptions.NotFound):
+            raise NotFound(str(exc)) from exc
+        return False
+
+
+class FirestoreQuery(Query):
+    def __init__(self, query):
+        self._query = query
+
+    def where(self, field, op, value):
+        return FirestoreQuery(self._query.where(field, op, value))
+
+    def order_by(self, field, direction='ASCENDING'):
+        # firestore.Query.ASCENDING/DESCENDING are the same strings as ours
+        return FirestoreQuery(self._query.order_by(field, direction=direction))
+
+    def limit(self, count):
+        return FirestoreQuery(self._query.limit(count))
+
+    def start_after(self, snapshot):
+        # A native snapshot makes the client add the document name to the cursor, breaking ties by id
+        native = firestore.DocumentSnapshot(snapshot.reference._native, snapshot.to_dict(), True, None, None, None)
+        return FirestoreQuery(self._query.start_after(native))
+
+    def stream(self):
+        for snapshot in self._query.stream():
+            yield _wrap_snapshot(snapshot)
+
+
+class FirestoreCollectionReference(FirestoreQuery, CollectionReference):
+    def __init__(self, collection_ref):
+        super().__init__(collection_ref)
+        self.id = collection_ref.id
+
+    def document(self, document_id=None):
+        native = self._query.document(str(document_id)) if document_id is not None else self._query.document()
+        return FirestoreDocumentReference(native)
+
+
+class FirestoreDocumentReference(DocumentReference):
+    def __init__(self, native):
+        self._native = native
+        self.id = native.id
+
+    @property
+    def parent(self):
+        return FirestoreCollectionReference(self._native.parent)
+
+    def get(self):
+        return _wrap_snapshot(self._native.get())
+
+    def set(self, data, merge=False):
+        self._native.set(_to_firestore(data), merge=merge)
+
+    def create(self, data):
+        with _translate_errors():
+            self._native.create(_to_firestore(data))
+
+    def update(self, data):
+        with _translate_errors():
+            self._native.update(_to_firestore(data))
+
+    def delete(self):
+        self._native.delete()
+
+
+def _apply_writes(target, writes):
+    for op, ref, data, merge in writes:
+        if op == 'set':
+            target.set(ref._native, _to_firestore(data), merge=merge)
+        elif op == 'create':
+            target.create(ref._native, _to_firestore(data))
+        elif op == 'update':
+            target.update(ref._native, _to_firestore(data))
+        else:
+            target.delete(ref._native)
+
+
+class FirestoreWriteBatch(WriteBatch):
+    def __init__(self, client):
+        super().__init__()
+        self._client = client
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        native = self._client.batch()
+        _apply_writes(native, writes)
+        with _translate_errors():
+            native.commit()
+
+
+class FirestoreTransaction(Transaction):
+    def __init__(self, client, native):
+        super().__init__()
+        self._client = client
+        self._native = native
+
+    def get(self, ref):
+        return _wrap_snapshot(ref._native.get(transaction=self._native))
+
+    def get_all(self, refs):
+        return _in_request_order(refs, self._client.get_all([ref._native for ref in refs], transaction=self._native))
+
+
+class FirestoreStorage(Storage):
+    name = 'firestore'
+
+    def __init__(self, client):
+        self._client = client
+
+    def collection(self, name):
+        return FirestoreCollectionReference(self._client.collection(name))
+
+    def batch(self):
+        return FirestoreWriteBatch(self._client)
+
+    def get_all(self, refs):
+        return _in_request_order(refs, self._client.get_all([ref._native for ref in refs]))
+
+    def run_transaction(self, callback):
+        @firestore.transactional
+        def body(native_transaction):
+            transaction = FirestoreTransaction(self._client, native_transaction)
+            result = callback(transaction)
+            _apply_writes(native_transaction, transaction._writes)
+            return result
+
+        with _translate_errors():
+            return body(self._client.transaction())
+
+    def close(self):
+        self._client.close()
@@ -0,0 +1,316 @@
+# Pure in-memory storage backend (offline development, load tests, benchmarks)
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from .base import (
+    AlreadyExists,
+    CollectionReference,
+    DESCENDING,
+    DocumentReference,
+    DocumentSnapshot,
+    NotFound,
+    Query,
+    Storage,
+    Transaction,
+    WriteBatch,
+    check_operator,
+    resolve_transforms,
+    utcnow,
+)
+
+_MISSING = object()
+
+
+def new_document_id():
+    # Same length and alphabet class as Firestore auto-ids
+    return uuid.uuid4().hex[:20]
+
+
+def _type_rank(value):
+    if value is None:
+        return 0
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, datetime):
+        return 3
+    if isinstance(value, str):
+        return 4
+    return 5
+
+
+def _normalize(value):
+    if isinstance(value, datetime) and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def sort_key(value):
+    """Firestore-like ordering across types: null < bool < number < timestamp < string < other"""
+    rank = _type_rank(value)
+    if rank == 5:
+        return rank, repr(value)
+    return rank, _normalize(value)
+
+
+def _after(row, cursor, orders):
+    """Whether (doc_id, data) sorts after the cursor snapshot under `orders`, then document id"""
+    doc_id, data = row
+    for field, direction in orders:
+        ours, theirs = sort_key(data[field]), sort_key(cursor.get(field))
+        if ours != theirs:
+            return ours < theirs if direction == DESCENDING else ours > theirs
+    return doc_id > cursor.id
+
+
+def matches(value, op, operand):
+    if value is _MISSING:
+        return False
+    if op == '==':
+        return _type_rank(value) == _type_rank(operand) and _normalize(value) == _normalize(operand)
+    if op == '!=':
+        return value is not None and not (_type_rank(value) == _type_rank(operand) and _normalize(value) == _normalize(operand))
+    if op == 'in':
+        return any(matches(value, '==', candidate) for candidate in operand)
+    if op == 'not-in':
+        return value is not None and not any(matches(value, '==', candidate) for candidate in operand)
+    if op == 'array_contains':
+        return isinstance(value, list) and any(matches(item, '==', operand) for item in value)
+    if op == 'array_contains_any':
+        return isinstance(value, list) and any(matches(item, 'in', operand) for item in value)
+    # Range filters only compare values of the same type
+    if _type_rank(value) != _type_rank(operand) or _type_rank(value) in (0, 5):
+        return False
+    value, operand = _normalize(value), _normalize(operand)
+    if op == '<':
+        return value < operand
+    if op == '<=':
+        return value <= operand
+    if op == '>':
+        return value > operand
+    return value >= operand
+
+
+def _hashable(value):
+    try:
+        hash(value)
+    except TypeError:
+        return False
+    return True
+
+
+class MemoryQuery(Query):
+    def __init__(self, storage, collection, filters=(), orders=(), limit_count=None, cursor=None):
+        self._storage = storage
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def where(self, field, op, value):
+        check_operator(op)
+        return MemoryQuery(self._storage, self._collection, self._filters + ((field, op, value),), self._orders, self._limit, self._cursor)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return MemoryQuery(self._storage, self._collection, self._filters, self._orders + ((field, direction),), self._limit, self._cursor)
+
+    def limit(self, count):
+        return MemoryQuery(self._storage, self._collection, self._filters, self._orders, count, self._cursor)
+
+    def start_after(self, snapshot):
+        return MemoryQuery(self._storage, self._collection, self._filters, self._orders, self._limit, snapshot)
+
+    def stream(self):
+        for doc_id, data in self._storage._run_query(self._collection, self._filters, self._orders, self._limit, self._cursor):
+            yield DocumentSnapshot(MemoryDocumentReference(self._storage, self._collection, doc_id), data)
+
+
+class MemoryCollectionReference(MemoryQuery, CollectionReference):
+    def __init__(self, storage, name):
+        super().__init__(storage, name)
+        self.id = name
+
+    def document(self, document_id=None):
+        return MemoryDocumentReference(self._storage, self._collection, str(document_id) if document_id is not None else new_document_id())
+
+
+class MemoryDocumentReference(DocumentReference):
+    def __init__(self, storage, collection, doc_id):
+        self._storage = storage
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def parent(self):
+        return MemoryCollectionReference(self._storage, self._collection)
+
+    @property
+    def key(self):
+        return self._collection, self.id
+
+    def get(self):
+        return DocumentSnapshot(self, self._storage._read(self._collection, self.id))
+
+    def set(self, data, merge=False):
+        self._storage._apply([('set', self, data, merge)])
+
+    def create(self, data):
+        self._storage._apply([('create', self, data, False)])
+
+    def update(self, data):
+        self._storage._apply([('update', self, data, False)])
+
+    def delete(self):
+        self._storage._apply([('delete', self, None, False)])
+
+    def __eq__(self, other):
+        return isinstance(other, MemoryDocumentReference) and other.key == self.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+
+class MemoryWriteBatch(WriteBatch):
+    def __init__(self, storage):
+        super().__init__()
+        self._storage = storage
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._storage._apply(writes)
+
+
+class MemoryTransaction(Transaction):
+    def __init__(self, storage):
+        super().__init__()
+        self._storage = storage
+
+    def get(self, ref):
+        return ref.get()
+
+
+class MemoryStorage(Storage):
+    """Dict-of-dicts document store with lazily built equality indexes.
+
+    A single re-entrant lock serialises writes and transactions, which gives the
+    same atomicity guarantees as Firestore batches and transactions.
+    """
+
+    name = 'memory'
+
+    def __init__(self):
+        self._collections = {}
+        # (collection, field) -> {value: set(doc ids)}
+        self._indexes = {}
+        self._lock = threading.RLock()
+
+    def collection(self, name):
+        return MemoryCollectionReference(self, name)
+
+    def batch(self):
+        return MemoryWriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def run_transaction(self, callback):
+        with self._lock:
+            transaction = MemoryTransaction(self)
+            result = callback(transaction)
+            self._apply(transaction._writes)
+            return result
+
+    def reset(self):
+        with self._lock:
+            self._collections.clear()
+            self._indexes.clear()
+
+    def _read(self, collection, doc_id):
+        data = self._collections.get(collection, {}).get(doc_id)
+        return dict(data) if data is not None else None
+
+    def _apply(self, writes):
+        now = utcnow()
+        with self._lock:
+            # Validate first so a failing write leaves nothing half-applied
+            for op, ref, data, merge in writes:
+                exists = ref.id in self._collections.get(ref._collection, {})
+                if op == 'create' and exists:
+                    raise AlreadyExists(f'{ref._collection}/{ref.id} already exists')
+                if op == 'update' and not exists:
+                    raise NotFound(f'{ref._collection}/{ref.id} does not exist')
+            for op, ref, data, merge in writes:
+                documents = self._collections.setdefault(ref._collection, {})
+                old = documents.get(ref.id)
+                if op == 'delete':
+                    new = None
+                elif op == 'update' or merge:
+                    new = dict(old or {})
+                    new.update(resolve_transforms(data, old, now))
+                else:
+                    new = resolve_transforms(data, None, now)
+                if new is None:
+                    documents.pop(ref.id, None)
+                else:
+                    documents[ref.id] = new
+                self._reindex(ref._collection, ref.id, old, new)
+
+    def _reindex(self, collection, doc_id, old, new):
+        for (indexed_collection, field), index in self._indexes.items():
+            if indexed_collection != collection:
+                continue
+            old_value = old.get(field, _MISSING) if old else _MISSING
+            new_value = new.get(field, _MISSING) if new else _MISSING
+            if old_value is new_value:
+                continue
+            if old_value is not _MISSING and _hashable(old_value):
+                ids = index.get(old_value)
+                if ids is not None:
+                    ids.discard(doc_id)
+            if new_value is not _MISSING and _hashable(new_value):
+                index.setdefault(new_value, set()).add(doc_id)
+
+    def _index_for(self, collection, field):
+        index = self._indexes.get((collection, field))
+        if index is None:
+            index = {}
+            for doc_id, data in self._collections.get(collection, {}).items():
+                value = data.get(field, _MISSING)
+                if value is not _MISSING and _hashable(value):
+                    index.setdefault(value, set()).add(doc_id)
+            self._indexes[(collection, field)] = index
+        return index
+
+    def _run_query(self, collection, filters, orders, limit, cursor=None):
+        with self._lock:
+            documents = self._collections.get(collection, {})
+            candidates = None
+            for field, op, value in filters:
+                if op == '==' and _hashable(value) and not isinstance(value, datetime):
+                    ids = self._index_for(collection, field).get(value, frozenset())
+                    # Guard against 1 == True style hash collisions with the exact matcher below
+                    candidates = ids if candidates is None else candidates & ids
+            if candidates is None:
+                candidates = documents.keys()
+            results = []
+            for doc_id in candidates:
+                data = documents.get(doc_id)
+                if data is None:
+                    continue
+                if all(matches(data.get(field, _MISSING), op, value) for field, op, value in filters):
+                    results.append((doc_id, data))
+
+        # Document id breaks ties, so equal sort values come back in the same order every time
+        results.sort(key=lambda r: r[0])
+        if orders:
+            results = [r for r in results if all(field in r[1] for field, _ in orders)]
+            for field, direction in reversed(orders):
+                results.sort(key=lambda r: sort_key(r[1][field]), reverse=direction == DESCENDING)
+        if cursor is not None:
+            results = [r for r in results if _after(r, cursor, orders)]
+        if limit is not None:
+            results = results[:limit]
+        return [(doc_id, dict(data)) for doc_id, data in results]
@@ -0,0 +1,386 @@
+# SQLite storage backend: one JSON document per row, expression indexes per queried field
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from .base import (
+    AlreadyExists,
+    CollectionReference,
+    DESCENDING,
+    DocumentReference,
+    DocumentSnapshot,
+    NotFound,
+    Query,
+    Storage,
+    Transaction,
+    WriteBatch,
+    check_operator,
+    resolve_transforms,
+    utcnow,
+)
+from .memory import new_document_id
+from ..utils import workers
+
+# The key leads with id so that, without ANALYZE statistics, the planner prefers the
+# per-field partial indexes over a (collection, ...) prefix scan for filtered queries
+SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        collection TEXT NOT NULL,
+        id TEXT NOT NULL,
+        data TEXT NOT NULL,
+        PRIMARY KEY (id, collection)
+    )
+    """,
+    'CREATE INDEX IF NOT EXISTS ix_documents_collection ON documents(collection)',
+)
+
+# Fields the models filter or sort on; other fields get an index the first time they are queried
+DEFAULT_INDEXES = {
+    'users': ('email', 'username', 'user_type'),
+    'products': ('seller_id', 'status', 'approval_status', 'category_id', 'created_at'),
+    'orders': ('user_id', 'tracking_id', 'order_date', 'total_amount'),
+    'order_items': ('order_id', 'product_id'),
+    'carts': ('user_id', 'product_id'),
+    'offers': ('product_id', 'buyer_id', 'seller_id', 'status', 'created_at'),
+    'messages': ('sender_id', 'receiver_id', 'read'),
+    'reviews': ('seller_id', 'created_at'),
+    'business_verifications': ('user_id', 'status'),
+}
+
+_DATE_KEY = '$date'
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return {_DATE_KEY: value.astimezone(timezone.utc).isoformat()}
+    if isinstance(value, dict):
+        return {k: _encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    return value
+
+
+def _decode_hook(obj):
+    if len(obj) == 1 and _DATE_KEY in obj:
+        return datetime.fromisoformat(obj[_DATE_KEY])
+    return obj
+
+
+def encode_document(data):
+    return json.dumps(_encode_value(data), separators=(',', ':'))
+
+
+def decode_document(text):
+    return json.loads(text, object_hook=_decode_hook)
+
+
+def _sql_param(value):
+    """Bind a filter operand so it compares equal to what json_extract() returns"""
+    if isinstance(value, datetime):
+        # json_extract returns nested objects as minified JSON text
+        return json.dumps(_encode_value(value), separators=(',', ':'))
+    if isinstance(value, bool):
+        return int(value)
+    return value
+
+
+def _field_expr(field):
+    path = '$.' + '.'.join(f'"{part}"' for part in field.split('.'))
+    return f"json_extract(data, '{path}')", f"json_type(data, '{path}')"
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+_RANGE_SQL = {'<': '<', '<=': '<=', '>': '>', '>=': '>='}
+
+
+class SQLiteQuery(Query):
+    def __init__(self, storage, collection, filters=(), orders=(), limit_count=None, cursor=None):
+        self._storage = storage
+        self._collection = collection
+        self._filters = filters
+        self._orders = orders
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def where(self, field, op, value):
+        check_operator(op)
+        return SQLiteQuery(self._storage, self._collection, self._filters + ((field, op, value),), self._orders, self._limit, self._cursor)
+
+    def order_by(self, field, direction='ASCENDING'):
+        return SQLiteQuery(self._storage, self._collection, self._filters, self._orders + ((field, direction),), self._limit, self._cursor)
+
+    def limit(self, count):
+        return SQLiteQuery(self._storage, self._collection, self._filters, self._orders, count, self._cursor)
+
+    def start_after(self, snapshot):
+        return SQLiteQuery(self._storage, self._collection, self._filters, self._orders, self._limit, snapshot)
+
+    def stream(self):
+        rows = self._storage._run_query(self._collection, self._filters, self._orders, self._limit, self._cursor)
+        for doc_id, text in rows:
+            yield DocumentSnapshot(SQLiteDocumentReference(self._storage, self._collection, doc_id), decode_document(text))
+
+
+class SQLiteCollectionReference(SQLiteQuery, CollectionReference):
+    def __init__(self, storage, name):
+        super().__init__(storage, name)
+        self.id = name
+
+    def document(self, document_id=None):
+        return SQLiteDocumentReference(self._storage, self._collection, str(document_id) if document_id is not None else new_document_id())
+
+
+class SQLiteDocumentReference(DocumentReference):
+    def __init__(self, storage, collection, doc_id):
+        self._storage = storage
+        self._collection = collection
+        self.id = doc_id
+
+    @property
+    def parent(self):
+        return SQLiteCollectionReference(self._storage, self._collection)
+
+    def get(self):
+        return DocumentSnapshot(self, self._storage._read(self._collection, self.id))
+
+    def set(self, data, merge=False):
+        self._storage._apply([('set', self, data, merge)])
+
+    def create(self, data):
+        self._storage._apply([('create', self, data, False)])
+
+    def update(self, data):
+        self._storage._apply([('update', self, data, False)])
+
+    def delete(self):
+        self._storage._apply([('delete', self, None, False)])
+
+
+class SQLiteWriteBatch(WriteBatch):
+    def __init__(self, storage):
+        super().__init__()
+        self._storage = storage
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        self._storage._apply(writes)
+
+
+class SQLiteTransaction(Transaction):
+    def __init__(self, storage):
+        super().__init__()
+        self._storage = storage
+
+    def get(self, ref):
+        return ref.get()
+
+
+class SQLiteStorage(Storage):
+    """Document store on a single SQLite table.
+
+    Every filtered or sorted field is served by a partial expression index on
+    json_extract(data, field) per collection, mirroring Firestore's automatic
+    single-field indexes. A lock serialises access to the shared connection.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:'):
+        self._path = path
+        self._connect()
+        self._indexed = set()
+        with self._lock:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            for collection, fields in DEFAULT_INDEXES.items():
+                for field in fields:
+                    self._ensure_index(collection, field)
+        if path != ':memory:':
+            # A connection must not be shared across fork (gunicorn --preload); each worker opens its own
+            workers.after_fork(self._connect)
+
+    def _connect(self):
+        self._conn = sqlite3.connect(self._path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        if self._path != ':memory:':
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+
+    def collection(self, name):
+        return SQLiteCollectionReference(self, name)
+
+    def batch(self):
+        return SQLiteWriteBatch(self)
+
+    def get_all(self, refs):
+        return [ref.get() for ref in refs]
+
+    def run_transaction(self, callback):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                transaction = SQLiteTransaction(self)
+                result = callback(transaction)
+                self._write_rows(transaction._writes)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+            return result
+
+    def close(self):
+        with self._lock:
+            self._conn.execute('PRAGMA optimize')
+            self._conn.close()
+
+    def explain(self, query):
+        """SQLite query plan for a query built from this storage (for comparing query costs)"""
+        sql, params = self._build_query(query._collection, query._filters, query._orders, query._limit)
+        with self._lock:
+            return [row[-1] for row in self._conn.execute('EXPLAIN QUERY PLAN ' + sql, params)]
+
+    def _ensure_index(self, collection, field):
+        if (collection, field) in self._indexed:
+            return
+        expr, _ = _field_expr(field)
+        name = 'ix_' + ''.join(c if c.isalnum() else '_' for c in f'{collection}_{field}')
+        self._conn.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON documents({expr}) WHERE collection = {_literal(collection)}'
+        )
+        self._indexed.add((collection, field))
+
+    def _read(self, collection, doc_id):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM documents WHERE collection = ? AND id = ?', (collection, doc_id)
+            ).fetchone()
+        return decode_document(row[0]) if row else None
+
+    def _apply(self, writes):
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._write_rows(writes)
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+            self._conn.execute('COMMIT')
+
+    def _write_rows(self, writes):
+        now = utcnow()
+        for op, ref, data, merge in writes:
+            collection, doc_id = ref._collection, ref.id
+            if op == 'delete':
+                self._conn.execute('DELETE FROM documents WHERE collection = ? AND id = ?', (collection, doc_id))
+                continue
+            row = self._conn.execute(
+                'SELECT data FROM documents WHERE collection = ? AND id = ?', (collection, doc_id)
+            ).fetchone()
+            old = decode_document(row[0]) if row else None
+            if op == 'create' and old is not None:
+                raise AlreadyExists(f'{collection}/{doc_id} already exists')
+            if op == 'update' and old is None:
+                raise NotFound(f'{collection}/{doc_id} does not exist')
+            if op == 'update' or merge:
+                new = dict(old or {})
+                new.update(resolve_transforms(data, old, now))
+            else:
+                new = resolve_transforms(data, None, now)
+            self._conn.execute(
+                'INSERT OR REPLACE INTO documents (collection, id, data) VALUES (?, ?, ?)',
+                (collection, doc_id, encode_document(new)),
+            )
+
+    def _build_query(self, collection, filters, orders, limit, cursor=None):
+        # The collection is inlined so the planner can match the per-collection partial indexes
+        clauses = [f'collection = {_literal(collection)}']
+        params = []
+        for field, op, value in filters:
+            expr, type_expr = _field_expr(field)
+            if op == '==':
+                if value is None:
+                    clauses.append(f"{type_expr} = 'null'")
+                elif isinstance(value, bool):
+                    # json_extract() maps booleans to 1/0, so match on the JSON type instead
+                    clauses.append(f'{type_expr} = ?')
+                    params.append(_json_type(value))
+                else:
+                    clauses.append(f'{expr} = ?')
+                    params.append(_sql_param(value))
+            elif op == '!=':
+                clauses.append(f"{type_expr} IS NOT NULL AND {type_expr} != 'null' AND {expr} != ?")
+                params.append(_sql_param(value))
+            elif op in ('in', 'not-in'):
+                placeholders = ', '.join('?' for _ in value) or 'NULL'
+                negate = 'NOT ' if op == 'not-in' else ''
+                if op == 'not-in':
+                    clauses.append(f"{type_expr} IS NOT NULL AND {type_expr} != 'null'")
+                clauses.append(f'{expr} {negate}IN ({placeholders})')
+                params.extend(_sql_param(v) for v in value)
+            elif op in ('array_contains', 'array_contains_any'):
+                candidates = value if op == 'array_contains_any' else [value]
+                path = '$.' + '.'.join(f'"{part}"' for part in field.split('.'))
+                placeholders = ', '.join('?' for _ in candidates) or 'NULL'
+                clauses.append(
+                    f"EXISTS (SELECT 1 FROM json_each(data, '{path}') WHERE value IN ({placeholders}))"
+                )
+                params.extend(_sql_param(v) for v in candidates)
+            else:
+                # Range filters only match values of the operand's type (ints and floats compare together)
+                types = _json_type(value)
+                types = (types,) if isinstance(types, str) else types
+                clauses.append(f"{type_expr} IN ({', '.join('?' for _ in types)}) AND {expr} {_RANGE_SQL[op]} ?")
+                params.extend(types)
+                params.append(_sql_param(value))
+
+        order_sql = []
+        for field, direction in orders:
+            expr, type_expr = _field_expr(field)
+            clauses.append(f'{type_expr} IS NOT NULL')
+            order_sql.append(f"{expr} {'DESC' if direction == DESCENDING else 'ASC'}")
+        order_sql.append('id ASC')
+
+        if cursor is not None:
+            # Keyset condition: (a > ?) OR (a = ? AND b > ?) OR ... OR (a = ? AND b = ? AND id > ?)
+            alternatives, equal, equal_params = [], [], []
+            for field, direction in orders:
+                expr, _ = _field_expr(field)
+                value = _sql_param(cursor.get(field))
+                alternatives.append(('(' + ' AND '.join(equal + [f"{expr} {'<' if direction == DESCENDING else '>'} ?"]) + ')',
+                                     equal_params + [value]))
+                equal, equal_params = equal + [f'{expr} = ?'], equal_params + [value]
+            alternatives.append(('(' + ' AND '.join(equal + ['id > ?']) + ')', equal_params + [cursor.id]))
+            clauses.append('(' + ' OR '.join(sql for sql, _ in alternatives) + ')')
+            params.extend(param for _, group in alternatives for param in group)
+
+        sql = f"SELECT id, data FROM documents WHERE {' AND '.join(clauses)} ORDER BY {', '.join(order_sql)}"
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        return sql, params
+
+    def _run_query(self, collection, filters, orders, limit, cursor=None):
+        with self._lock:
+            for field, _, _ in filters:
+                self._ensure_index(collection, field)
+            for field, _ in orders:
+                self._ensure_index(collection, field)
+            sql, params = self._build_query(collection, filters, orders, limit, cursor)
+            return self._conn.execute(sql, params).fetchall()
+
+
+def _json_type(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return ('integer', 'real')
+    if isinstance(value, datetime):
+        return ('object',)
+    return ('text',)
@@ -0,0 +1,181 @@
+# Traffic capture: one sanitized, replayable JSON line per request (see backend/perf/replay.py)
+import atexit
+import hashlib
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import time
+from urllib.parse import parse_qsl
+
+from jose import jwt, JWTError
+
+from . import workers
+from .logconfig import _DeferredQueueHandler, _build_file_handler
+from .metrics import route_template
+
+# Values of these keys never leave the process; replay substitutes its own
+SECRET_FIELDS = frozenset({
+    'password', 'new_password', 'token', 'access_token', 'refresh_token', 'id_token',
+    'verification_code', 'secret', 'api_key', 'key', 'authorization',
+})
+# Personal data: replaced by a stable pseudonym of the same length so payload sizes are preserved
+PII_FIELDS = frozenset({
+    'email', 'phone', 'username', 'first_name', 'last_name', 'address', 'address2',
+    'city', 'state', 'zip_code', 'content', 'reason',
+})
+REDACTED = '<redacted>'
+
+CAPTURE_FORMAT_VERSION = 2  # 2 adds 'u', the caller's user id
+
+capture_logger = logging.getLogger('trademart.capture')
+
+
+def _pseudonym(value):
+    digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).hexdigest()
+    if '@' in value:
+        return f'{digest[:12]}@example.invalid'
+    return (digest * (len(value) // len(digest) + 1))[:len(value)]
+
+
+def sanitize(value, key=None):
+    """Redact secrets and pseudonymise personal fields, recursively"""
+    if key is not None:
+        lowered = key.lower()
+        if lowered in SECRET_FIELDS:
+            return REDACTED
+        if lowered in PII_FIELDS and isinstance(value, str):
+            return _pseudonym(value)
+    if isinstance(value, dict):
+        return {k: sanitize(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [sanitize(v, key) for v in value]
+    return value
+
+
+def _caller(authorization):
+    """User id ('sub') of a bearer token, so replay can sign a token for the same user.
+
+    Read without verifying the signature: the app has already verified it,
+    and the id is recorded as an opaque account id like those in paths.
+    """
+    scheme, _, token = authorization.partition(' ')
+    if scheme.lower() != 'bearer' or not token:
+        return None
+    try:
+        sub = jwt.get_unverified_claims(token.strip()).get('sub')
+    except JWTError:
+        return None
+    return str(sub) if sub else None
+
+
+def _decode_body(content_type, body):
+    """(kind, payload) for the capture record; bodies that cannot be replayed are dropped"""
+    if not body:
+        return None, None
+    if content_type.startswith('application/json'):
+        try:
+            return 'json', sanitize(json.loads(body))
+        except ValueError:
+            return 'invalid', None
+    if content_type.startswith('application/x-www-form-urlencoded'):
+        pairs = parse_qsl(body.decode('latin-1'), keep_blank_values=True)
+        return 'form', [[k, sanitize(v, k)] for k, v in pairs]
+    # Multipart uploads and other binary bodies would mean storing user files
+    return 'omitted', None
+
+
+def open_capture_log(path, max_bytes=100 * 1024 * 1024, backup_count=5):
+    """Point the capture logger at its own rotating file, written by a background thread"""
+    handler = _build_file_handler(path, max_bytes, '', backup_count)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    capture_queue = queue.SimpleQueue()
+    capture_logger.handlers[:] = [_DeferredQueueHandler(capture_queue)]
+    capture_logger.setLevel(logging.INFO)
+    # Capture lines are data, not diagnostics: keep them out of backend.log and the console
+    capture_logger.propagate = False
+    listener = logging.handlers.QueueListener(capture_queue, handler)
+    listener.start()
+    atexit.register(listener.stop)
+    workers.after_fork(listener.start)
+    return listener
+
+
+class CaptureMiddleware:
+    """Record method, path, caller, sanitized query and body, status and duration of sampled requests.
+
+    The request body is observed as the app reads it, so nothing is buffered
+    beyond ``max_body_bytes``; larger bodies are recorded as truncated and are
+    skipped on replay.
+    """
+
+    def __init__(self, app, sample_rate=1.0, max_body_bytes=64 * 1024, exclude_prefixes=('/metrics',)):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.max_body_bytes = max_body_bytes
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if (scope['type'] != 'http' or scope['path'].startswith(self.exclude_prefixes)
+                or (self.sample_rate < 1.0 and random.random() >= self.sample_rate)):
+            await self.app(scope, receive, send)
+            return
+
+        chunks, size, truncated = [], 0, False
+        status = 500
+
+        async def receive_wrapper():
+            nonlocal size, truncated
+            message = await receive()
+            if message['type'] == 'http.request' and not truncated:
+                body = message.get('body', b'')
+                size += len(body)
+                if size > self.max_body_bytes:
+                    truncated, chunks[:] = True, []
+                else:
+                    chunks.append(body)
+            return message
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        started_at = time.time()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            content_type = ''
+            caller = None
+            for name, value in scope['headers']:
+                if name == b'content-type':
+                    content_type = value.decode('latin-1').lower()
+                elif name == b'authorization':
+                    caller = _caller(value.decode('latin-1'))
+            record = {
+                'v': CAPTURE_FORMAT_VERSION,
+                'ts': round(started_at, 6),
+                'm': scope['method'],
+                'p': scope['path'],
+                'r': route_template(scope),
+                's': status,
+                'd': round(duration, 6),
+            }
+            if caller:
+                record['u'] = caller
+            query = scope.get('query_string', b'')
+            if query:
+                record['q'] = [[k, sanitize(v, k)] for k, v in parse_qsl(query.decode('latin-1'), keep_blank_values=True)]
+            if truncated:
+                record['bk'] = 'truncated'
+            else:
+                kind, payload = _decode_body(content_type, b''.join(chunks))
+                if kind:
+                    record['bk'] = kind
+                    if payload is not None:
+                        record['b'] = payload
+            capture_logger.info(json.dumps(record, separators=(',', ':'), ensure_ascii=False, default=str))
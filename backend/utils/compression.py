@@ -0,0 +1,221 @@
+# Response compression middleware (gzip / brotli / zstd) with content negotiation
+import gzip
+import time
+
+from .metrics import REGISTRY, RATIO_BUCKETS, route_template
+
+# brotli and zstandard are optional: without them only gzip is negotiated
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content types that are already compressed and gain nothing from another pass
+INCOMPRESSIBLE_PREFIXES = ('image/', 'video/', 'audio/', 'font/woff')
+INCOMPRESSIBLE_TYPES = {
+    'application/zip',
+    'application/gzip',
+    'application/x-gzip',
+    'application/zstd',
+    'application/octet-stream',
+    'application/pdf',
+    'text/event-stream',
+}
+
+compression_input_bytes = REGISTRY.counter(
+    'http_compression_input_bytes_total',
+    'Response bytes before compression',
+    ('route', 'encoding'),
+)
+compression_output_bytes = REGISTRY.counter(
+    'http_compression_output_bytes_total',
+    'Response bytes after compression',
+    ('route', 'encoding'),
+)
+compression_cpu_seconds = REGISTRY.counter(
+    'http_compression_cpu_seconds_total',
+    'CPU time spent compressing responses',
+    ('route', 'encoding'),
+)
+compression_ratio = REGISTRY.histogram(
+    'http_compression_ratio',
+    'Compressed size divided by original size',
+    ('route', 'encoding'),
+    buckets=RATIO_BUCKETS,
+)
+compression_skipped = REGISTRY.counter(
+    'http_compression_skipped_total',
+    'Responses sent uncompressed, by reason',
+    ('route', 'reason'),
+)
+
+
+def available_encodings():
+    """Encodings this process can produce, in server preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append('zstd')
+    if brotli is not None:
+        encodings.append('br')
+    encodings.append('gzip')
+    return encodings
+
+
+def negotiate_encoding(accept_encoding, supported):
+    """Pick the best encoding from an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[token] = q
+
+    best, best_q = None, 0.0
+    for encoding in supported:
+        q = weights.get(encoding, weights.get('*', 0.0))
+        # Ties keep the earlier (server-preferred) encoding
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def _is_compressible(content_type):
+    content_type = content_type.split(';', 1)[0].strip().lower()
+    if not content_type:
+        return False
+    if content_type in INCOMPRESSIBLE_TYPES:
+        return False
+    return not content_type.startswith(INCOMPRESSIBLE_PREFIXES)
+
+
+def _encoded_etag(etag, encoding):
+    """ETag for the encoded representation: '"abc"' -> '"abc-gzip"', so it never validates the identity bytes"""
+    if not etag.endswith(b'"'):
+        return etag
+    return etag[:-1] + b'-' + encoding.encode('latin-1') + b'"'
+
+
+class CompressionMiddleware:
+    """Compress buffered HTTP responses above a minimum size.
+
+    Streaming responses (more than one body message) and responses that already
+    carry a Content-Encoding or an incompressible content type pass through untouched.
+    """
+
+    def __init__(self, app, minimum_size=1024, gzip_level=6, brotli_quality=4, zstd_level=3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.encodings = available_encodings()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = ''
+        for name, value in scope['headers']:
+            if name == b'accept-encoding':
+                accept_encoding = value.decode('latin-1')
+                break
+        encoding = negotiate_encoding(accept_encoding, self.encodings)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+
+            if message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            route = route_template(scope)
+            reason = self._skip_reason(start_message, body, message.get('more_body', False))
+            if reason:
+                passthrough = True
+                compression_skipped.inc((route, reason))
+                await send(start_message)
+                await send(message)
+                return
+
+            cpu_start = time.thread_time()
+            compressed = self._compress(encoding, body)
+            cpu_time = time.thread_time() - cpu_start
+
+            labels = (route, encoding)
+            compression_input_bytes.inc(labels, len(body))
+            compression_output_bytes.inc(labels, len(compressed))
+            compression_cpu_seconds.inc(labels, cpu_time)
+            compression_ratio.observe(len(compressed) / len(body), labels)
+
+            headers = [
+                (name, _encoded_etag(value, encoding) if name == b'etag' else value)
+                for name, value in start_message['headers']
+                if name not in (b'content-length', b'vary')
+            ]
+            vary = b', '.join(value for name, value in start_message['headers'] if name == b'vary')
+            if b'accept-encoding' not in vary.lower():
+                vary = vary + b', Accept-Encoding' if vary else b'Accept-Encoding'
+            headers.append((b'content-encoding', encoding.encode('latin-1')))
+            headers.append((b'content-length', str(len(compressed)).encode('latin-1')))
+            headers.append((b'vary', vary))
+            start_message['headers'] = headers
+
+            passthrough = True
+            await send(start_message)
+            await send({'type': 'http.response.body', 'body': compressed})
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _skip_reason(self, start_message, body, more_body):
+        if more_body:
+            return 'streaming'
+        if start_message['status'] < 200 or start_message['status'] in (204, 304):
+            return 'status'
+        if len(body) < self.minimum_size:
+            return 'too_small'
+        content_type = ''
+        for name, value in start_message['headers']:
+            if name == b'content-encoding':
+                return 'already_encoded'
+            if name == b'content-type':
+                content_type = value.decode('latin-1')
+        if not _is_compressible(content_type):
+            return 'content_type'
+        return None
+
+    def _compress(self, encoding, body):
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=self.zstd_level).compress(body)
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
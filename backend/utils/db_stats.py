@@ -0,0 +1,337 @@
+# Per-request Firestore read/write accounting and N+1 query detection
+import contextvars
+import logging
+import os
+import sys
+import threading
+
+from .metrics import REGISTRY
+from .tracing import start_span
+
+logger = logging.getLogger(__name__)
+
+firestore_documents = REGISTRY.counter(
+    'firestore_documents_total',
+    'Documents read, written or deleted',
+    ('collection', 'op'),
+)
+firestore_rpcs = REGISTRY.counter(
+    'firestore_rpcs_total',
+    'Firestore round trips',
+    ('collection', 'kind'),
+)
+firestore_n_plus_one = REGISTRY.counter(
+    'firestore_n_plus_one_total',
+    'Requests flagged for repeating the same query shape',
+    ('route',),
+)
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_ROUTES_DIR = os.path.join(_PACKAGE_DIR, 'routes')
+_INTERNAL_DIRS = (os.path.dirname(os.path.abspath(__file__)), os.path.join(_PACKAGE_DIR, 'models'))
+
+
+class RequestStats:
+    """Firestore usage accumulated while serving a single request.
+
+    Work the request fans out to other threads (bulk moderation) records
+    into the same object, so updates take ``lock``.
+    """
+
+    __slots__ = ('reads', 'writes', 'deletes', 'rpcs', 'shapes', 'suspects', 'threshold', 'lock')
+
+    def __init__(self, threshold=10):
+        self.reads = 0
+        self.writes = 0
+        self.deletes = 0
+        self.rpcs = 0
+        self.shapes = {}
+        self.suspects = {}
+        self.threshold = threshold
+        self.lock = threading.Lock()
+
+    def as_headers(self):
+        headers = {
+            'X-Firestore-Reads': str(self.reads),
+            'X-Firestore-Writes': str(self.writes),
+            'X-Firestore-Deletes': str(self.deletes),
+            'X-Firestore-RPCs': str(self.rpcs),
+        }
+        if self.suspects:
+            headers['X-Firestore-N-Plus-One'] = '; '.join(
+                f"{s['shape']} x{s['count']} at {s['call_site']}" for s in self.suspects.values()
+            )
+        return headers
+
+    def as_log_fields(self):
+        fields = {
+            'firestore_reads': self.reads,
+            'firestore_writes': self.writes,
+            'firestore_deletes': self.deletes,
+            'firestore_rpcs': self.rpcs,
+        }
+        if self.suspects:
+            fields['n_plus_one'] = list(self.suspects.values())
+        return fields
+
+
+current_stats = contextvars.ContextVar('firestore_stats', default=None)
+
+
+def begin_request(threshold=10):
+    """Start accounting for the current request; returns (stats, reset token)"""
+    stats = RequestStats(threshold)
+    return stats, current_stats.set(stats)
+
+
+def end_request(token):
+    current_stats.reset(token)
+
+
+def _call_site():
+    # Prefer the route handler that issued the query; fall back to the first non-internal frame
+    frame = sys._getframe(2)
+    fallback = None
+    while frame is not None:
+        filename = os.path.abspath(frame.f_code.co_filename)
+        if filename.startswith(_ROUTES_DIR):
+            return f'{os.path.relpath(filename, _PACKAGE_DIR)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        if fallback is None and not filename.startswith(_INTERNAL_DIRS):
+            fallback = f'{filename}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return fallback or 'unknown'
+
+
+def _record_rpc(collection, kind, shape, reads=0, writes=0, deletes=0):
+    firestore_rpcs.inc((collection, kind))
+    if reads:
+        firestore_documents.inc((collection, 'read'), reads)
+    if writes:
+        firestore_documents.inc((collection, 'write'), writes)
+    if deletes:
+        firestore_documents.inc((collection, 'delete'), deletes)
+
+    stats = current_stats.get()
+    if stats is None:
+        return
+    with stats.lock:
+        stats.rpcs += 1
+        stats.reads += reads
+        stats.writes += writes
+        stats.deletes += deletes
+        if shape is None:
+            return
+        count = stats.shapes.get(shape, 0) + 1
+        stats.shapes[shape] = count
+        if count == stats.threshold + 1:
+            suspect = {'shape': _describe_shape(shape), 'count': count, 'call_site': _call_site()}
+            stats.suspects[shape] = suspect
+            logger.warning("Probable N+1: %s repeated %d times at %s", suspect['shape'], count, suspect['call_site'])
+        elif count > stats.threshold + 1:
+            stats.suspects[shape]['count'] = count
+
+
+def _describe_shape(shape):
+    kind, collection, filters, order, limit = shape
+    text = f'{kind} {collection}'
+    if filters:
+        text += ' where ' + ' and '.join(f'{field} {op}' for field, op in filters)
+    if order:
+        text += ' order by ' + ', '.join(order)
+    if limit is not None:
+        text += f' limit {limit}'
+    return text
+
+
+def _unwrap(ref):
+    return getattr(ref, '_ref', ref)
+
+
+class InstrumentedQuery:
+    def __init__(self, query, collection, filters=(), order=(), limit=None):
+        self._query = query
+        self._collection = collection
+        self._filters = filters
+        self._order = order
+        self._limit = limit
+
+    def _derive(self, query, filters=None, order=None, limit=None):
+        return InstrumentedQuery(
+            query,
+            self._collection,
+            self._filters if filters is None else filters,
+            self._order if order is None else order,
+            self._limit if limit is None else limit,
+        )
+
+    def where(self, field, op, value):
+        return self._derive(self._query.where(field, op, value), filters=self._filters + ((field, op),))
+
+    def order_by(self, field, **kwargs):
+        return self._derive(self._query.order_by(field, **kwargs), order=self._order + (field,))
+
+    def limit(self, count):
+        return self._derive(self._query.limit(count), limit=count)
+
+    def start_after(self, snapshot):
+        return self._derive(self._query.start_after(snapshot))
+
+    def stream(self, **kwargs):
+        count = 0
+        try:
+            for snapshot in self._query.stream(**kwargs):
+                count += 1
+                yield snapshot
+        finally:
+            # Firestore bills one read for a query even when nothing matches
+            shape = ('query', self._collection, self._filters, self._order, self._limit)
+            _record_rpc(self._collection, 'query', shape, reads=max(count, 1))
+
+    def get(self, **kwargs):
+        return list(self.stream(**kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._query, name)
+
+
+class InstrumentedCollection(InstrumentedQuery):
+    def __init__(self, collection_ref, name):
+        super().__init__(collection_ref, name)
+
+    def document(self, document_id=None):
+        ref = self._query.document(document_id) if document_id is not None else self._query.document()
+        return InstrumentedDocument(ref, self._collection)
+
+
+class InstrumentedDocument:
+    def __init__(self, ref, collection):
+        self._ref = ref
+        self._collection = collection
+
+    @property
+    def id(self):
+        return self._ref.id
+
+    def get(self, **kwargs):
+        snapshot = self._ref.get(**kwargs)
+        _record_rpc(self._collection, 'get', ('get', self._collection, (), (), None), reads=1)
+        return snapshot
+
+    def set(self, data, **kwargs):
+        result = self._ref.set(data, **kwargs)
+        _record_rpc(self._collection, 'write', None, writes=1)
+        return result
+
+    def create(self, data):
+        result = self._ref.create(data)
+        _record_rpc(self._collection, 'write', None, writes=1)
+        return result
+
+    def update(self, data, **kwargs):
+        result = self._ref.update(data, **kwargs)
+        _record_rpc(self._collection, 'write', None, writes=1)
+        return result
+
+    def delete(self, **kwargs):
+        result = self._ref.delete(**kwargs)
+        _record_rpc(self._collection, 'write', None, deletes=1)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+
+class InstrumentedBatch:
+    def __init__(self, batch):
+        self._batch = batch
+        self._writes = 0
+        self._deletes = 0
+
+    def set(self, ref, data, **kwargs):
+        self._writes += 1
+        return self._batch.set(_unwrap(ref), data, **kwargs)
+
+    def create(self, ref, data):
+        self._writes += 1
+        return self._batch.create(_unwrap(ref), data)
+
+    def update(self, ref, data, **kwargs):
+        self._writes += 1
+        return self._batch.update(_unwrap(ref), data, **kwargs)
+
+    def delete(self, ref, **kwargs):
+        self._deletes += 1
+        return self._batch.delete(_unwrap(ref), **kwargs)
+
+    def commit(self, **kwargs):
+        with start_span('firestore.batch.commit', attributes={'db.operation': 'commit', 'db.writes': self._writes,
+                                                               'db.deletes': self._deletes}):
+            result = self._batch.commit(**kwargs)
+        _record_rpc('batch', 'commit', None, writes=self._writes, deletes=self._deletes)
+        return result
+
+    def __len__(self):
+        return self._writes + self._deletes
+
+    def __getattr__(self, name):
+        return getattr(self._batch, name)
+
+
+class InstrumentedTransaction(InstrumentedBatch):
+    def get(self, ref):
+        ref = _unwrap(ref)
+        snapshot = self._batch.get(ref)
+        collection = ref.parent.id
+        _record_rpc(collection, 'get', ('get', collection, (), (), None), reads=1)
+        return snapshot
+
+    def get_all(self, refs):
+        refs = [_unwrap(ref) for ref in refs]
+        collection = refs[0].parent.id if refs else 'unknown'
+        snapshots = self._batch.get_all(refs)
+        _record_rpc(collection, 'get_all', ('get_all', collection, (), (), None), reads=max(len(snapshots), 1))
+        return snapshots
+
+
+class InstrumentedClient:
+    """Wraps the storage client used by every model and counts what it costs"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def collection(self, name):
+        return InstrumentedCollection(self._client.collection(name), name)
+
+    def batch(self):
+        return InstrumentedBatch(self._client.batch())
+
+    def get_all(self, refs, **kwargs):
+        refs = [_unwrap(ref) for ref in refs]
+        collection = refs[0].parent.id if refs else 'unknown'
+        snapshots = list(self._client.get_all(refs, **kwargs))
+        _record_rpc(collection, 'get_all', ('get_all', collection, (), (), None), reads=max(len(snapshots), 1))
+        return snapshots
+
+    def run_transaction(self, callback):
+        attempts = []
+
+        def instrumented(transaction):
+            wrapper = InstrumentedTransaction(transaction)
+            attempts.append(wrapper)
+            return callback(wrapper)
+
+        with start_span('firestore.transaction', attributes={'db.operation': 'transaction'}) as span:
+            result = self._client.run_transaction(instrumented)
+            if span is not None:
+                span.set_attribute('db.attempts', len(attempts))
+        # Only the final attempt commits; earlier ones were retried after contention
+        final = attempts[-1]
+        _record_rpc('transaction', 'commit', None, writes=final._writes, deletes=final._deletes)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def instrument_client(client):
+    return InstrumentedClient(client)
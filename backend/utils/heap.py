@@ -0,0 +1,243 @@
+# Heap diagnostics: tracemalloc snapshots and diffs, plus per-request RSS growth by route
+import collections
+import linecache
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from .metrics import REGISTRY, route_template
+from .profiler import short_path
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUCKETS = tuple(mb * 1024 * 1024 for mb in (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500))
+
+request_rss_growth = REGISTRY.histogram(
+    'http_request_peak_rss_growth_bytes',
+    'Growth of process RSS between the start of a request and its peak while it ran',
+    ('route', 'method'),
+    buckets=MEMORY_BUCKETS,
+)
+process_rss = REGISTRY.gauge(
+    'process_resident_memory_bytes',
+    'Resident set size of this worker, as of the last request',
+)
+
+# Allocation frames that are the tracer's own bookkeeping rather than the application's
+_IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+KEY_TYPES = ('lineno', 'filename', 'traceback')
+
+try:
+    _PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+except (AttributeError, ValueError, OSError):
+    _PAGE_SIZE = 4096
+# ru_maxrss is kilobytes on Linux and bytes on macOS
+_MAXRSS_SCALE = 1 if sys.platform == 'darwin' else 1024
+
+
+def current_rss():
+    """Resident set size in bytes, or None where /proc is unavailable"""
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss():
+    """Process high-water mark RSS in bytes, or 0 where getrusage is unavailable"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_SCALE
+
+
+class HeapTracker:
+    """tracemalloc control with a bounded set of in-memory snapshots.
+
+    State is per worker process; with several workers each keeps its own
+    snapshots, so start, snapshot and diff against the same worker (responses
+    carry its pid).
+    """
+
+    def __init__(self, max_snapshots=5):
+        self.max_snapshots = max_snapshots
+        self._snapshots = collections.OrderedDict()  # id -> (meta, snapshot)
+        self._lock = threading.Lock()
+        self._sequence = 0
+
+    def status(self):
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            'pid': os.getpid(),
+            'tracing': tracing,
+            'frames': tracemalloc.get_traceback_limit() if tracing else 0,
+            'traced_bytes': current,
+            'traced_peak_bytes': peak,
+            'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory() if tracing else 0,
+            'rss_bytes': current_rss(),
+            'peak_rss_bytes': peak_rss(),
+            'snapshots': [meta for meta, _ in self._snapshots.values()],
+        }
+
+    def start(self, frames=1):
+        if tracemalloc.is_tracing():
+            # The traceback depth cannot change while tracing
+            if tracemalloc.get_traceback_limit() == frames:
+                return self.status()
+            tracemalloc.stop()
+        tracemalloc.start(frames)
+        logger.info("tracemalloc started with %s frame(s) per allocation", frames)
+        return self.status()
+
+    def stop(self):
+        """Stop tracing and drop every snapshot (their traces are meaningless afterwards)"""
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        logger.info("tracemalloc stopped")
+        return self.status()
+
+    def take_snapshot(self):
+        if not tracemalloc.is_tracing():
+            raise RuntimeError('tracemalloc is not running')
+        snapshot = tracemalloc.take_snapshot().filter_traces(_IGNORED)
+        current, peak = tracemalloc.get_traced_memory()
+        with self._lock:
+            self._sequence += 1
+            snapshot_id = f's{self._sequence}'
+            meta = {
+                'id': snapshot_id,
+                'timestamp': time.time(),
+                'traced_bytes': current,
+                'traced_peak_bytes': peak,
+                'rss_bytes': current_rss(),
+                'traces': len(snapshot.traces),
+            }
+            self._snapshots[snapshot_id] = (meta, snapshot)
+            while len(self._snapshots) > self.max_snapshots:
+                self._snapshots.popitem(last=False)
+        return meta
+
+    def _get(self, snapshot_id):
+        entry = self._snapshots.get(snapshot_id)
+        if entry is None:
+            raise KeyError(snapshot_id)
+        return entry[1]
+
+    def top(self, snapshot_id, key_type='lineno', limit=25):
+        stats = self._get(snapshot_id).statistics(key_type)
+        return {
+            'id': snapshot_id,
+            'key': key_type,
+            'total_bytes': sum(stat.size for stat in stats),
+            'sites': [_site(stat.traceback, stat.size, stat.count) for stat in stats[:limit]],
+        }
+
+    def diff(self, base_id, target_id, key_type='lineno', limit=25):
+        stats = self._get(target_id).compare_to(self._get(base_id), key_type)
+        return {
+            'base': base_id,
+            'target': target_id,
+            'key': key_type,
+            'total_size_diff_bytes': sum(stat.size_diff for stat in stats),
+            'sites': [
+                {**_site(stat.traceback, stat.size, stat.count), 'size_diff_bytes': stat.size_diff,
+                 'count_diff': stat.count_diff}
+                for stat in stats[:limit]
+            ],
+        }
+
+
+def _site(traceback, size, count):
+    frames = [
+        {'file': short_path(frame.filename), 'line': frame.lineno,
+         'code': linecache.getline(frame.filename, frame.lineno).strip()}
+        for frame in traceback
+    ]
+    return {'size_bytes': size, 'count': count, 'frames': frames}
+
+
+heap_tracker = HeapTracker()
+
+
+class RouteMemoryStats:
+    """Per-route count, largest and total RSS growth, for the diagnostics listing"""
+
+    def __init__(self):
+        self._routes = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, growth):
+        with self._lock:
+            entry = self._routes.get(route)
+            if entry is None:
+                entry = self._routes[route] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] = max(entry[1], growth)
+            entry[2] += growth
+
+    def summary(self):
+        with self._lock:
+            items = [(route, list(entry)) for route, entry in self._routes.items()]
+        rows = [
+            {'route': route, 'requests': count, 'max_growth_bytes': largest,
+             'mean_growth_bytes': round(total / count)}
+            for route, (count, largest, total) in items
+        ]
+        return sorted(rows, key=lambda row: row['max_growth_bytes'], reverse=True)
+
+
+route_memory = RouteMemoryStats()
+
+
+class MemoryMiddleware:
+    """Record how far each request pushed RSS above where it started.
+
+    The peak is taken from the process high-water mark (ru_maxrss) when the
+    request raised it, otherwise from RSS at the end, so short-lived spikes
+    from materialised result lists are caught without sampling. Requests
+    running concurrently share the same process, so overlapping requests may
+    each be charged for one spike. Growth above ``warn_bytes`` is logged.
+    """
+
+    def __init__(self, app, warn_bytes=0):
+        self.app = app
+        self.warn_bytes = warn_bytes
+
+    async def __call__(self, scope, receive, send):
+        start_rss = current_rss() if scope['type'] == 'http' else None
+        if start_rss is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_peak = peak_rss()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            end_rss = current_rss()
+            end_peak = peak_rss()
+            peak = max(end_rss, end_peak) if end_peak > start_peak else end_rss
+            growth = max(peak - start_rss, 0)
+            route = route_template(scope)
+            request_rss_growth.observe(growth, (route, scope['method']))
+            process_rss.set(end_rss)
+            route_memory.record(f"{scope['method']} {route}", growth)
+            if self.warn_bytes and growth >= self.warn_bytes:
+                logger.warning(
+                    "Request grew RSS by %.1fMB: %s %s", growth / 1048576, scope['method'], scope['path'],
+                    extra={'route': route, 'rss_growth_bytes': growth, 'rss_bytes': end_rss}
+                )
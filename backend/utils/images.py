@@ -0,0 +1,560 @@
+# Product image pipeline: spooled uploads, content-hash dedupe, WebP variants built by background workers
+import asyncio
+import contextlib
+import hashlib
+import io
+import logging
+import os
+import random
+import shutil
+import socket
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from starlette.concurrency import run_in_threadpool
+
+from .metrics import REGISTRY
+from .tracing import start_span, outbound_headers, SPAN_KIND_CLIENT
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process uses the cache, so the thread lock is enough
+    fcntl = None
+
+# Pillow is optional: without it the original upload is stored unchanged as the only variant
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+logger = logging.getLogger(__name__)
+
+# name -> longest edge in pixels
+VARIANTS = (('thumb', 320), ('medium', 800), ('full', 1920))
+SPOOL_CHUNK = 1024 * 1024
+
+# Leading bytes of the formats we accept, and the content type stored for an unprocessed original
+_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png', '.png'),
+    (b'GIF87a', 'image/gif', '.gif'),
+    (b'GIF89a', 'image/gif', '.gif'),
+    (b'RIFF', 'image/webp', '.webp'),
+    (b'BM', 'image/bmp', '.bmp'),
+)
+
+images_processed = REGISTRY.counter(
+    'images_processed_total',
+    'Uploaded images by outcome (processed, deduplicated, failed)',
+    ('result',),
+)
+image_processing_duration = REGISTRY.histogram(
+    'image_processing_duration_seconds',
+    'Time to build and store every variant of one upload',
+)
+image_queue_depth = REGISTRY.gauge(
+    'image_queue_depth',
+    'Uploads waiting for a pipeline worker',
+)
+
+SpooledImage = namedtuple('SpooledImage', 'sha256 path size content_type')
+
+
+class UploadRejected(ValueError):
+    """The upload is too large or not an image we accept"""
+
+
+class UploadTooLarge(UploadRejected):
+    """The upload is over the configured size limit"""
+
+
+def sniff_image_type(head):
+    for signature, content_type, extension in _SIGNATURES:
+        if head.startswith(signature):
+            if content_type == 'image/webp' and head[8:12] != b'WEBP':
+                continue
+            return content_type, extension
+    return None
+
+
+def render_variants(path, quality=80):
+    """[(name, data, content_type, extension, width, height)], smallest first; runs in a worker thread"""
+    if Image is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+        content_type, extension = sniff_image_type(data[:16]) or ('application/octet-stream', '')
+        return [('full', data, content_type, extension, None, None)]
+
+    with Image.open(path) as source:
+        # JPEG can decode straight at a reduced scale, which is most of the cost for camera photos
+        source.draft('RGB', (VARIANTS[-1][1], VARIANTS[-1][1]))
+        image = ImageOps.exif_transpose(source)
+        image = image.convert('RGBA' if image.mode in ('RGBA', 'LA', 'P') else 'RGB')
+    rendered = []
+    # Largest first, each variant downscaled from the previous one rather than from the original
+    for name, edge in reversed(VARIANTS):
+        image = image.copy()
+        image.thumbnail((edge, edge), Image.LANCZOS)
+        buffer = io.BytesIO()
+        image.save(buffer, 'WEBP', quality=quality, method=4)
+        rendered.append((name, buffer.getvalue(), 'image/webp', '.webp', image.width, image.height))
+    rendered.reverse()
+    return rendered
+
+
+class LocalImageStore:
+    """Variants written under a directory served at base_url (mounted by main.py)"""
+
+    def __init__(self, directory, base_url='/media'):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/')
+
+    def _write(self, key, data):
+        path = os.path.join(self.directory, *key.split('/'))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    async def put(self, key, data, content_type):
+        await run_in_threadpool(self._write, key, data)
+        return f'{self.base_url}/{key}'
+
+    async def close(self):
+        pass
+
+
+class ImgbbImageStore:
+    """ImgBB uploads over one pooled HTTP/1.1 client, retried with backoff on transient failures"""
+
+    API_URL = 'https://api.imgbb.com/1/upload'
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, api_key, retries=3, timeout=30.0, max_connections=10):
+        self.api_key = api_key
+        self.retries = retries
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def put(self, key, data, content_type):
+        import httpx
+        client = self._get_client()
+        name = key.replace('/', '-')
+        for attempt in range(self.retries + 1):
+            with start_span('POST api.imgbb.com/1/upload', SPAN_KIND_CLIENT, {
+                'http.request.method': 'POST',
+                'server.address': 'api.imgbb.com',
+                'http.request.body.size': len(data),
+                'http.request.resend_count': attempt,
+            }) as span:
+                try:
+                    # The key goes in the form body: httpx logs request URLs
+                    response = await client.post(
+                        self.API_URL,
+                        data={'key': self.api_key, 'name': name},
+                        files={'image': (name, data, content_type)},
+                        headers=outbound_headers(),
+                    )
+                    if span is not None:
+                        span.set_attribute('http.response.status_code', response.status_code)
+                    retryable = response.status_code in self.RETRY_STATUSES
+                    error = f'HTTP {response.status_code}'
+                except httpx.TransportError as e:
+                    response, retryable, error = None, True, f'{type(e).__name__}: {e}'
+            if response is not None and not retryable:
+                response.raise_for_status()
+                result = response.json()
+                if not result.get('success'):
+                    raise RuntimeError(f'ImgBB rejected the upload: {result}')
+                return result['data']['url']
+            if attempt == self.retries:
+                raise RuntimeError(f'ImgBB upload failed after {attempt + 1} attempts: {error}')
+            delay = min(0.5 * 2 ** attempt, 8.0) * random.uniform(0.5, 1.0)
+            logger.warning("ImgBB upload attempt %d failed (%s); retrying in %.1fs", attempt + 1, error, delay)
+            await asyncio.sleep(delay)
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_image_store(kind, directory=None, base_url='/media', imgbb_api_key='', retries=3):
+    if kind == 'local':
+        return LocalImageStore(directory, base_url)
+    if kind == 'imgbb':
+        if not imgbb_api_key:
+            raise ValueError('IMAGE_STORE=imgbb needs IMGBB_API_KEY')
+        return ImgbbImageStore(imgbb_api_key, retries=retries)
+    raise ValueError(f"Unknown IMAGE_STORE {kind!r}; expected 'local' or 'imgbb'")
+
+
+class ImagePipeline:
+    """Turn uploads into stored WebP variants without holding up the request.
+
+    ``spool`` copies the upload to disk in chunks off the event loop while
+    hashing it. ``attach`` links the image to a product. An image already
+    processed under the same hash is attached immediately; otherwise the job
+    is queued, and background workers render the variants in a thread pool,
+    store them and update every product waiting on that hash.
+
+    ``registry`` is ImageModel and ``products`` is ProductModel; they are
+    passed in so this module stays free of model imports.
+    """
+
+    def __init__(self, store, registry, products, spool_dir, max_bytes=10 * 1024 * 1024, workers=2, quality=80,
+                 lease_seconds=600):
+        self.store = store
+        self.registry = registry
+        self.products = products
+        self.spool_dir = spool_dir
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.quality = quality
+        self.lease_seconds = lease_seconds
+        self.owner = None
+        self._queue = None
+        self._tasks = []
+        self._executor = None
+        self._held = set()  # images leased to this process: queued or being rendered
+
+    def _spool_path(self, sha256):
+        return os.path.join(self.spool_dir, f'{sha256}.upload')
+
+    def _copy_to_spool(self, source):
+        os.makedirs(self.spool_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        fd, temp_path = tempfile.mkstemp(dir=self.spool_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as spool:
+                while True:
+                    chunk = source.read(SPOOL_CHUNK)
+                    if not chunk:
+                        break
+                    if not head:
+                        head = chunk[:16]
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadTooLarge(f'Image is larger than {self.max_bytes // (1024 * 1024)}MB')
+                    digest.update(chunk)
+                    spool.write(chunk)
+            sniffed = sniff_image_type(head)
+            if sniffed is None:
+                raise UploadRejected('Unsupported image format')
+            sha256 = digest.hexdigest()
+            os.replace(temp_path, self._spool_path(sha256))
+            return SpooledImage(sha256, self._spool_path(sha256), size, sniffed[0])
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    async def spool(self, upload):
+        """Copy a Starlette UploadFile to the spool directory; raises UploadRejected"""
+        await upload.seek(0)
+        return await run_in_threadpool(self._copy_to_spool, upload.file)
+
+    def _link(self, product_ids, image):
+        variants = image.get('variants') or {}
+        for product_id in product_ids:
+            self.products.update(product_id, {
+                'image': variants.get('full'),
+                'image_variants': variants,
+                'image_status': image.get('status')
+            })
+
+    async def attach(self, spooled, product_id):
+        """Link a spooled image to a product; returns the image status ('ready' or 'processing')"""
+        image, needs_processing = await run_in_threadpool(self.registry.claim, spooled.sha256, product_id,
+                                                          self.owner)
+        if image is not None:
+            images_processed.inc(('deduplicated',))
+            await run_in_threadpool(self._link, [product_id], image)
+            await run_in_threadpool(self._discard, spooled.sha256)
+            return 'ready'
+        await run_in_threadpool(self.products.update, product_id, {'image_status': 'processing'})
+        if needs_processing:
+            self._enqueue(spooled.sha256)
+        return 'processing'
+
+    def _enqueue(self, sha256):
+        self._held.add(sha256)
+        self._queue.put_nowait(sha256)
+        image_queue_depth.set(self._queue.qsize())
+
+    def _discard(self, sha256):
+        try:
+            os.remove(self._spool_path(sha256))
+        except FileNotFoundError:
+            pass
+
+    async def start(self):
+        """Start the workers and the job that keeps this process's leases renewed"""
+        # Set here rather than in __init__: the pipeline is created before gunicorn forks its workers
+        self.owner = f'{socket.gethostname()}:{os.getpid()}'
+        self._queue = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='image-render')
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._renew_leases()))
+
+    def start_recovery(self):
+        """Start looking for images whose owner stopped; call once storage is reachable"""
+        self._tasks.append(asyncio.create_task(self._recover_periodically()))
+
+    async def _renew_leases(self):
+        # Renewed well inside the lease, so an expired lease means its owner has stopped
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not self._held:
+                continue
+            try:
+                await run_in_threadpool(self.registry.renew_leases, sorted(self._held), self.owner)
+            except Exception as e:
+                logger.warning("Could not renew image leases: %s", e)
+
+    async def _recover_periodically(self):
+        # Every worker looks; claim_leftover lets only one of them take each image
+        while True:
+            await self._recover()
+            await asyncio.sleep(self.lease_seconds)
+
+    async def _recover(self):
+        try:
+            leftover = await run_in_threadpool(self.registry.get_processing)
+        except Exception as e:
+            logger.warning("Could not look for unfinished images: %s", e)
+            return
+        recovered = 0
+        for sha256 in leftover:
+            if sha256 in self._held:
+                continue
+            # Only images whose owner's lease has run out; a live worker keeps renewing the rest
+            try:
+                won = await run_in_threadpool(self.registry.claim_leftover, sha256, self.owner, self.lease_seconds)
+            except Exception as e:
+                logger.warning("Could not claim unfinished image %s: %s", sha256, e)
+                continue
+            if won:
+                self._enqueue(sha256)
+                recovered += 1
+        if recovered:
+            logger.info("Requeued %d unfinished image(s)", recovered)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        await self.store.close()
+
+    async def _work(self):
+        while True:
+            sha256 = await self._queue.get()
+            image_queue_depth.set(self._queue.qsize())
+            try:
+                await self._process(sha256)
+            except Exception:
+                logger.exception("Image pipeline worker failed on %s", sha256)
+            finally:
+                self._held.discard(sha256)
+
+    async def _process(self, sha256):
+        path = self._spool_path(sha256)
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        try:
+            rendered = await loop.run_in_executor(self._executor, render_variants, path, self.quality)
+        except Exception as e:
+            # A file Pillow cannot decode will never succeed; keep it aside for inspection
+            await run_in_threadpool(self._quarantine, path)
+            await self._fail(sha256, e)
+            return
+        try:
+            urls = await asyncio.gather(*(
+                self.store.put(f'{sha256[:2]}/{sha256}/{name}{extension}', data, content_type)
+                for name, data, content_type, extension, _, _ in rendered
+            ))
+        except Exception as e:
+            # The spool file stays, so re-uploading the same image retries the store
+            await self._fail(sha256, e)
+            return
+
+        variants = {name: url for (name, *_), url in zip(rendered, urls)}
+        for name, _ in VARIANTS:
+            variants.setdefault(name, variants['full'])
+        full = rendered[-1]
+        pending = await run_in_threadpool(self.registry.mark_ready, sha256, variants, full[4], full[5],
+                                          os.path.getsize(path))
+        await run_in_threadpool(self._link, pending, {'status': 'ready', 'variants': variants})
+        await run_in_threadpool(self._discard, sha256)
+        images_processed.inc(('processed',))
+        image_processing_duration.observe(time.perf_counter() - started)
+
+    async def _fail(self, sha256, error):
+        logger.warning("Image %s failed: %s", sha256, error)
+        images_processed.inc(('failed',))
+        pending = await run_in_threadpool(self.registry.mark_failed, sha256, error)
+        await run_in_threadpool(self._link, pending, {'status': 'failed'})
+
+    def _quarantine(self, path):
+        failed_dir = os.path.join(self.spool_dir, 'failed')
+        os.makedirs(failed_dir, exist_ok=True)
+        try:
+            shutil.move(path, os.path.join(failed_dir, os.path.basename(path)))
+        except FileNotFoundError:
+            pass
+
+
+# On-demand resizing for /api/images (see backend/routes/images.py)
+
+RESIZE_FORMATS = {'webp': ('WEBP', 'image/webp', '.webp'), 'jpeg': ('JPEG', 'image/jpeg', '.jpg'),
+                  'png': ('PNG', 'image/png', '.png')}
+
+
+def resize_to_file(source, destination, width, fmt, quality):
+    """Resize source to at most `width` pixels wide and write it to destination; runs in a worker process"""
+    pil_format = RESIZE_FORMATS[fmt][0]
+    with Image.open(source) as original:
+        original.draft('RGB', (width, width * 4))
+        image = ImageOps.exif_transpose(original)
+        if image.width > width:
+            image = image.resize((width, max(round(image.height * width / image.width), 1)), Image.LANCZOS)
+        if pil_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if image.mode in ('LA', 'P', 'PA') else 'RGB')
+        temp = f'{destination}.{os.getpid()}.tmp'
+        options = {'optimize': True} if pil_format == 'PNG' else {'quality': quality}
+        if pil_format == 'JPEG':
+            options.update(optimize=True, progressive=True)
+        image.save(temp, pil_format, **options)
+    os.replace(temp, destination)
+    return os.path.getsize(destination)
+
+
+class DiskLRUCache:
+    """Files under a directory, evicted least-recently-used first once they exceed max_bytes.
+
+    Every worker process shares the directory and its budget: the running
+    total lives in a file next to the entries and is updated under an
+    advisory lock. Recency is the file mtime, bumped on every hit, so when
+    the total passes max_bytes whichever process notices rescans the
+    directory and removes the oldest files, down to `low_water` of the
+    budget so that rescans stay rare.
+    """
+
+    LOCK_FILE = '.lock'
+    TOTAL_FILE = '.total'
+
+    def __init__(self, directory, max_bytes, low_water=0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.low_water = low_water
+        self._lock = threading.Lock()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def open(self, name):
+        """The cached file opened for reading, or None.
+
+        An open file stays readable after another process evicts it, so
+        callers serve from the handle rather than reopening the path.
+        """
+        try:
+            f = open(self.path(name), 'rb')
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(f.fileno())
+        except OSError:
+            pass
+        return f
+
+    @contextlib.contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, self.LOCK_FILE), 'a') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _scan(self):
+        """[(mtime, name, size)] of the entries, oldest first"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp') or name.startswith('.'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, os.path.relpath(os.path.join(root, name), self.directory), stat.st_size))
+        entries.sort()
+        return entries
+
+    def _read_total(self):
+        try:
+            with open(os.path.join(self.directory, self.TOTAL_FILE)) as f:
+                return int(f.read())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_total(self, total):
+        path = os.path.join(self.directory, self.TOTAL_FILE)
+        with open(f'{path}.{os.getpid()}.tmp', 'w') as f:
+            f.write(str(total))
+        os.replace(f'{path}.{os.getpid()}.tmp', path)
+
+    def add(self, name, size):
+        """Account for a file just written under `name`, evicting the oldest entries if over budget"""
+        with self._locked():
+            total = self._read_total()
+            if total is None:
+                # First use, or the total file was lost: the scan already includes the new file
+                total = sum(entry_size for _, _, entry_size in self._scan())
+            else:
+                total += size
+            if total > self.max_bytes:
+                entries = self._scan()
+                total = sum(entry_size for _, _, entry_size in entries)
+                target = self.max_bytes * self.low_water
+                for _, oldest, oldest_size in entries[:-1]:
+                    if total <= target:
+                        break
+                    try:
+                        os.remove(self.path(oldest))
+                    except FileNotFoundError:
+                        pass
+                    total -= oldest_size
+            self._write_total(total)
+
+    def stats(self):
+        with self._locked():
+            return {'bytes': self._read_total() or 0, 'max_bytes': self.max_bytes}
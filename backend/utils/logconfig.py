@@ -0,0 +1,130 @@
+# Non-blocking structured logging: QueueHandler on the caller, formatting and I/O on a writer thread
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+from . import workers
+
+# Set by the request middleware so every record logged while serving a request carries its id
+request_id_var = contextvars.ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RESERVED_ATTRS = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'sample'}
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+class RequestContextFilter(logging.Filter):
+    def filter(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = request_id_var.get()
+        return True
+
+
+class SuccessSamplingFilter(logging.Filter):
+    """Keep only a fraction of high-volume success records.
+
+    Records opt in with ``extra={'sample': True}``; those with a status >= 400
+    are always kept.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        if self.rate >= 1.0 or not getattr(record, 'sample', False):
+            return True
+        if getattr(record, 'status', 0) >= 400:
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # The stock prepare() formats the message on the calling thread; leave that to the listener
+    def prepare(self, record):
+        return record
+
+
+def _build_file_handler(path, max_bytes, rotate_when, backup_count):
+    if rotate_when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=rotate_when, backupCount=backup_count, encoding='utf-8', delay=True
+        )
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+    )
+
+
+_listener = None
+
+
+def setup_logging(level='INFO', log_file='backend.log', log_format='json', max_bytes=50 * 1024 * 1024,
+                  rotate_when='', backup_count=5, success_sample_rate=1.0):
+    """Route all logging through a queue drained by a background writer thread.
+
+    The console always gets the human-readable text format; ``log_format``
+    selects ``json`` or ``text`` for the file. Setting ``rotate_when`` (e.g.
+    ``midnight`` or ``H``) switches from size-based to time-based rotation.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    console = logging.StreamHandler()
+    console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    file_handler = _build_file_handler(log_file, max_bytes, rotate_when, backup_count)
+    file_handler.setFormatter(JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _DeferredQueueHandler(log_queue)
+    # Filters run on the caller, so sampled-out records never reach the queue
+    queue_handler.addFilter(SuccessSamplingFilter(success_sample_rate))
+    queue_handler.addFilter(RequestContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, console, file_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    workers.after_fork(_restart_after_fork)
+    return _listener
+
+
+def _restart_after_fork():
+    # A forked worker (gunicorn --preload) inherits the queue but not the writer thread
+    if _listener is not None:
+        _listener.start()
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
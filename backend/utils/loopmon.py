@@ -0,0 +1,174 @@
+# Event-loop lag monitor: measures scheduling delay and attributes stalls to the route and call site
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+
+from .logconfig import request_id_var
+from .metrics import REGISTRY, route_template
+from .profiler import short_path
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+event_loop_lag = REGISTRY.histogram(
+    'event_loop_lag_seconds',
+    'Delay between when the loop probe was due and when it ran',
+    buckets=LAG_BUCKETS,
+)
+event_loop_stalls = REGISTRY.counter(
+    'event_loop_stalls_total',
+    'Event loop stalls longer than the threshold, by route and application call site',
+    ('route', 'call_site'),
+)
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Frames in these packages are plumbing; the call site is the application code that called into them
+_PLUMBING_DIRS = tuple(os.path.join(_BACKEND_ROOT, name) + os.sep for name in ('utils', 'storage'))
+
+
+def _frame_label(frame):
+    return f'{short_path(frame.f_code.co_filename)}:{frame.f_lineno} in {frame.f_code.co_name}'
+
+
+def describe_stack(frame, limit=40):
+    """(call_site, blocking_frame, stack) for the innermost frame of a blocked thread"""
+    call_site = None
+    stack = []
+    blocking = _frame_label(frame) if frame is not None else None
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (call_site is None and filename.startswith(_BACKEND_ROOT + os.sep)
+                and not filename.startswith(_PLUMBING_DIRS)):
+            call_site = _frame_label(frame)
+        if len(stack) < limit:
+            stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return call_site or blocking or 'unknown', blocking, stack
+
+
+class LoopLagMonitor:
+    """Probe the event loop every `interval` seconds and report stalls longer than `threshold`.
+
+    A probe coroutine sleeps for `interval` and records how late it woke up.
+    A watchdog thread notices when the probe is overdue while the loop is still
+    blocked and snapshots the loop thread's stack at that moment, so the stall
+    is attributed to the code that is actually blocking rather than to whatever
+    runs after it. The request being served is found through the running task,
+    which ``LoopLagMiddleware`` maps to its ASGI scope.
+    """
+
+    def __init__(self, interval=0.05, threshold=0.1, history=100):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls = collections.deque(maxlen=history)
+        self._requests = {}  # task -> (scope, request id)
+        self._loop = None
+        self._loop_thread = None
+        self._probe_task = None
+        self._beat = None
+        self._snapshot = None
+        self._stopped = threading.Event()
+
+    def track(self, task, scope):
+        self._requests[task] = (scope, request_id_var.get())
+
+    def untrack(self, task):
+        self._requests.pop(task, None)
+
+    def start(self):
+        """Start probing the running loop; call from a startup handler"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._stopped.clear()
+        self._beat = time.monotonic()
+        self._probe_task = self._loop.create_task(self._probe())
+        threading.Thread(target=self._watch, name='loop-watchdog', daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+
+    async def _probe(self):
+        while True:
+            due = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._beat = now
+            lag = max(now - due, 0.0)
+            event_loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _watch(self):
+        poll = max(min(self.threshold / 2, self.interval), 0.005)
+        reported_beat = None
+        while not self._stopped.wait(poll):
+            beat = self._beat
+            if beat == reported_beat or time.monotonic() - beat < self.interval + self.threshold:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread)
+            task = asyncio.current_task(self._loop)
+            scope, request_id = self._requests.get(task, (None, None))
+            call_site, blocking, stack = describe_stack(frame)
+            if task is None and frame is not None and frame.f_code.co_filename.endswith('selectors.py'):
+                # The loop is past its select() timeout but cannot run: another thread holds the GIL
+                call_site = 'GIL held by another thread'
+            self._snapshot = {
+                'route': f"{scope['method']} {route_template(scope)}" if scope else 'no request',
+                'path': scope['path'] if scope else None,
+                'request_id': request_id,
+                'task': task.get_name() if task is not None else None,
+                'call_site': call_site,
+                'blocking_in': blocking,
+                'stack': stack,
+            }
+
+    def _report(self, lag):
+        snapshot, self._snapshot = self._snapshot, None
+        if snapshot is None:
+            # Shorter than the watchdog's poll period, or the stall ended before it could look
+            snapshot = {'route': 'unknown', 'call_site': 'unknown', 'stack': []}
+        event = {'timestamp': time.time(), 'lag_ms': round(lag * 1000, 3), **snapshot}
+        self.stalls.append(event)
+        event_loop_stalls.inc((snapshot['route'], snapshot['call_site']))
+        logger.warning(
+            "Event loop blocked for %.0fms by %s at %s",
+            lag * 1000, snapshot['route'], snapshot['call_site'],
+            extra={
+                'route': snapshot['route'],
+                'call_site': snapshot['call_site'],
+                'blocking_in': snapshot.get('blocking_in'),
+                'lag_ms': event['lag_ms'],
+            }
+        )
+
+
+class LoopLagMiddleware:
+    """Map the task serving each request to its scope so stalls can be attributed to a route.
+
+    Must sit inside any BaseHTTPMiddleware, which runs the rest of the stack in a new task.
+    """
+
+    def __init__(self, app, monitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        task = asyncio.current_task()
+        self.monitor.track(task, scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.untrack(task)
@@ -0,0 +1,226 @@
+# In-process metrics registry with Prometheus text exposition
+import contextlib
+import functools
+import threading
+import time
+from bisect import bisect_left
+
+# Latency buckets (seconds) shared by request and compression timings
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATIO_BUCKETS = (0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{name}="{value}"')
+    return '{' + ','.join(escaped) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    TYPE = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1.0):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def get(self, labels=()):
+        return self._values.get(labels, 0.0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labels, value in items:
+            yield self.name, labels, None, value
+
+
+class Gauge(Counter):
+    TYPE = 'gauge'
+
+    def set(self, value, labels=()):
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, labels=(), amount=1.0):
+        self.inc(labels, -amount)
+
+
+class Histogram:
+    TYPE = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [per-bucket counts..., +Inf count, sum]
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def get(self, labels=()):
+        """Return (count, sum) for a label set"""
+        series = self._series.get(labels)
+        if series is None:
+            return 0, 0.0
+        return sum(series[:-1]), series[-1]
+
+    def samples(self):
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in self._series.items()]
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                yield self.name + '_bucket', labels, ('le', _format_value(bound)), cumulative
+            yield self.name + '_count', labels, None, cumulative
+            yield self.name + '_sum', labels, None, series[-1]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        """Render every metric in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.TYPE}')
+            for name, labels, extra, value in metric.samples():
+                lines.append(f'{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def route_template(scope):
+    """Route path template for an ASGI scope once routing has run, e.g. /api/products/{product_id}"""
+    route = scope.get('route')
+    if route is not None:
+        return getattr(route, 'path', None) or 'unmatched'
+    return 'unmatched'
+
+
+# Request, model and cache instrumentation
+
+http_request_duration = REGISTRY.histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by route template',
+    ('route', 'method', 'status'),
+)
+http_requests_in_flight = REGISTRY.gauge(
+    'http_requests_in_flight',
+    'Requests currently being served',
+)
+model_call_duration = REGISTRY.histogram(
+    'model_call_duration_seconds',
+    'Latency of data model method calls (Firestore round trips included)',
+    ('method',),
+)
+model_call_errors = REGISTRY.counter(
+    'model_call_errors_total',
+    'Data model method calls that raised',
+    ('method',),
+)
+cache_requests = REGISTRY.counter(
+    'cache_requests_total',
+    'Cache lookups by result',
+    ('cache', 'result'),
+)
+cache_hit_ratio = REGISTRY.gauge(
+    'cache_hit_ratio',
+    'Fraction of cache lookups served without a backend read',
+    ('cache',),
+)
+
+
+def record_cache_lookup(cache, hit):
+    cache_requests.inc((cache, 'hit' if hit else 'miss'))
+    hits = cache_requests.get((cache, 'hit'))
+    cache_hit_ratio.set(hits / (hits + cache_requests.get((cache, 'miss'))), (cache,))
+
+
+# Set by tracing.configure_tracing so model calls also become child spans of the request
+span_hook = None
+_NO_SPAN = contextlib.nullcontext()
+
+
+def _timed(label, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with span_hook(label) if span_hook is not None else _NO_SPAN:
+                return func(*args, **kwargs)
+        except Exception:
+            model_call_errors.inc((label,))
+            raise
+        finally:
+            model_call_duration.observe(time.perf_counter() - start, (label,))
+    return wrapper
+
+
+# Accessors that never touch the network are not worth a histogram series
+_UNTIMED_METHODS = {'get_collection'}
+
+
+def instrument_model(cls):
+    """Class decorator timing every public classmethod/staticmethod as `Class.method`"""
+    for name, attr in list(vars(cls).items()):
+        if name.startswith('_') or name in _UNTIMED_METHODS:
+            continue
+        label = f'{cls.__name__}.{name}'
+        if isinstance(attr, classmethod):
+            setattr(cls, name, classmethod(_timed(label, attr.__func__)))
+        elif isinstance(attr, staticmethod):
+            setattr(cls, name, staticmethod(_timed(label, attr.__func__)))
+    return cls
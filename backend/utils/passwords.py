@@ -0,0 +1,152 @@
+# Password hashing: scrypt in a bounded process pool, with legacy SHA-256 hashes upgraded on login
+import asyncio
+import base64
+import hashlib
+import hmac
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SCHEME = 'scrypt'
+DEFAULT_N = 2 ** 14
+DEFAULT_R = 8
+DEFAULT_P = 1
+SALT_BYTES = 16
+KEY_BYTES = 32
+
+hash_queue_depth = REGISTRY.gauge(
+    'password_hash_queue_depth',
+    'Password hash and verify jobs submitted to the process pool and not yet finished',
+)
+hash_duration = REGISTRY.histogram(
+    'password_hash_seconds',
+    'Time from submitting a password job to its result, queueing included',
+    ('operation',),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+hash_rejected = REGISTRY.counter(
+    'password_hash_rejected_total',
+    'Password jobs refused because the pool queue was full',
+)
+hash_upgrades = REGISTRY.counter(
+    'password_hash_upgrades_total',
+    'Stored password hashes replaced on login, by the scheme they were upgraded from',
+    ('from_scheme',),
+)
+
+
+def _b64(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+
+def _unb64(text):
+    return base64.b64decode(text + '=' * (-len(text) % 4))
+
+
+def hash_password(password, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    """'scrypt$<n>$<r>$<p>$<salt>$<key>' for a new random salt"""
+    salt = os.urandom(SALT_BYTES)
+    key = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p,
+                         maxmem=256 * n * r + 1024 * 1024, dklen=KEY_BYTES)
+    return f'{SCHEME}${n}${r}${p}${_b64(salt)}${_b64(key)}'
+
+
+def scheme_of(stored):
+    if stored.startswith(SCHEME + '$'):
+        return SCHEME
+    if len(stored) == 64 and all(c in '0123456789abcdef' for c in stored):
+        return 'sha256'
+    return 'unknown'
+
+
+def verify_password(password, stored, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+    """(matches, needs_rehash): needs_rehash is set for legacy hashes and scrypt ones with other parameters"""
+    scheme = scheme_of(stored)
+    if scheme == 'sha256':
+        # Unsalted SHA-256 from before scrypt; only ever verified so it can be replaced
+        digest = hashlib.sha256(password.encode('utf-8')).hexdigest()
+        return hmac.compare_digest(digest, stored), True
+    if scheme != SCHEME:
+        return False, False
+    try:
+        _, stored_n, stored_r, stored_p, salt, key = stored.split('$')
+        stored_n, stored_r, stored_p = int(stored_n), int(stored_r), int(stored_p)
+        expected = _unb64(key)
+        candidate = hashlib.scrypt(password.encode('utf-8'), salt=_unb64(salt), n=stored_n, r=stored_r,
+                                   p=stored_p, maxmem=256 * stored_n * stored_r + 1024 * 1024,
+                                   dklen=len(expected))
+    except (ValueError, TypeError):
+        return False, False
+    return hmac.compare_digest(candidate, expected), (stored_n, stored_r, stored_p) != (n, r, p)
+
+
+class HasherBusy(Exception):
+    """More password jobs are waiting than the pool is allowed to queue"""
+
+
+class PasswordHasher:
+    """Run scrypt off the event loop in a pool of `workers` processes.
+
+    At most `max_queue` jobs may be waiting or running at once; beyond that
+    ``HasherBusy`` is raised so a login storm is answered with 503s instead
+    of an ever-growing queue. Legacy SHA-256 hashes are checked inline since
+    they cost microseconds.
+    """
+
+    def __init__(self, workers=None, max_queue=64, n=DEFAULT_N, r=DEFAULT_R, p=DEFAULT_P):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.params = (n, r, p)
+        self.pending = 0
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def _submit(self, operation, func, *args):
+        if self.pending >= self.max_queue:
+            hash_rejected.inc()
+            raise HasherBusy(f'{self.pending} password jobs already queued')
+        self.pending += 1
+        hash_queue_depth.inc()
+        started = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), func, *args)
+        except BrokenProcessPool:
+            self._pool = None  # a worker died; the next job starts a fresh pool
+            raise
+        finally:
+            self.pending -= 1
+            hash_queue_depth.dec()
+            hash_duration.observe(time.perf_counter() - started, (operation,))
+
+    async def hash(self, password):
+        return await self._submit('hash', hash_password, password, *self.params)
+
+    async def verify(self, password, stored):
+        """(matches, needs_rehash)"""
+        if scheme_of(stored) != SCHEME:
+            return verify_password(password, stored, *self.params)
+        return await self._submit('verify', verify_password, password, stored, *self.params)
+
+    async def upgrade(self, password, stored, save):
+        """Re-hash a password that verified against an outdated hash and hand it to `save`"""
+        try:
+            new_hash = await self.hash(password)
+            await asyncio.get_running_loop().run_in_executor(None, save, new_hash)
+            hash_upgrades.inc((scheme_of(stored),))
+        except Exception as e:
+            logger.warning("Password hash upgrade failed: %s", e)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
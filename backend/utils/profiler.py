@@ -0,0 +1,278 @@
+# Statistical profiler for individual requests, stored as speedscope files in an on-disk ring buffer
+import collections
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .logconfig import request_id_var
+from .metrics import REGISTRY, route_template
+
+SPEEDSCOPE_SCHEMA = 'https://www.speedscope.app/file-format-schema.json'
+
+profiles_captured = REGISTRY.counter(
+    'http_profiles_captured_total',
+    'Request profiles written to the ring buffer, by trigger',
+    ('route', 'trigger'),
+)
+
+_BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Longest first, so site-packages wins over the stdlib directory that contains it
+_PATH_PREFIXES = sorted({os.path.dirname(_BACKEND_ROOT), os.path.dirname(os.__file__)} |
+                        {p for p in sys.path if p.endswith('site-packages')}, key=len, reverse=True)
+_SAFE_ID = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def short_path(filename):
+    """Source path relative to the project, site-packages or the stdlib"""
+    for prefix in _PATH_PREFIXES:
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class StackSampler(threading.Thread):
+    """Samples the Python stacks of threads serving requests every `interval` seconds.
+
+    Samples go into a time-ordered ring and each request carves its own window
+    out of it afterwards, so one sampler serves every request and a request
+    only has to turn out slow, not be predicted slow, to get a profile.
+    Nothing is sampled while no request is in flight. On the event-loop
+    thread, other requests interleaving at await points share the window.
+    """
+
+    def __init__(self, interval=0.005, window=30.0):
+        super().__init__(name='request-profiler', daemon=True)
+        self.interval = interval
+        self._samples = collections.deque(maxlen=max(int(window / interval), 1))
+        self._lock = threading.Lock()
+        self._active = collections.Counter()
+        self._labels = {}
+        self._stopped = threading.Event()
+
+    def enter(self):
+        with self._lock:
+            self._active[threading.get_ident()] += 1
+
+    def exit(self):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] -= 1
+            if self._active[thread_id] <= 0:
+                del self._active[thread_id]
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            with self._lock:
+                threads = list(self._active)
+            if not threads:
+                continue
+            frames = sys._current_frames()
+            now = time.perf_counter()
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                stack = []
+                while frame is not None:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                if stack:
+                    stack.reverse()
+                    with self._lock:
+                        self._samples.append((now, thread_id, tuple(stack)))
+
+    def stop(self):
+        self._stopped.set()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = (code.co_name, short_path(code.co_filename), code.co_firstlineno)
+        return label
+
+    def window(self, start, end, thread_id):
+        with self._lock:
+            return [stack for ts, tid, stack in self._samples if tid == thread_id and start <= ts <= end]
+
+
+def frame_name(frame):
+    name, filename, line = frame
+    return f'{name} ({filename}:{line})'
+
+
+class ProfileStore:
+    """Speedscope files in one directory, oldest evicted beyond max_files or max_bytes"""
+
+    def __init__(self, directory, max_files=50, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+
+    def save(self, profile_id, meta, stacks, interval):
+        frames, index, samples = [], {}, []
+        for stack in stacks:
+            row = []
+            for frame in stack:
+                position = index.get(frame)
+                if position is None:
+                    position = index[frame] = len(frames)
+                    frames.append({'name': frame[0], 'file': frame[1], 'line': frame[2]})
+                row.append(position)
+            samples.append(row)
+        interval_ms = interval * 1000
+        document = {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': f"{meta['method']} {meta['path']} ({meta['duration_ms']:.1f}ms)",
+            'exporter': 'trademart-profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': f"{meta['method']} {meta['route']}",
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': len(samples) * interval_ms,
+                'samples': samples,
+                'weights': [interval_ms] * len(samples),
+            }],
+            'trademart': meta,
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f'{profile_id}.speedscope.json')
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(document, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+        self._evict()
+
+    def _files(self):
+        try:
+            names = [name for name in os.listdir(self.directory) if name.endswith('.speedscope.json')]
+        except FileNotFoundError:
+            return []
+        # Ids start with a millisecond timestamp, so name order is age order
+        return sorted(names)
+
+    def _evict(self):
+        files = self._files()
+        sizes = {name: os.path.getsize(os.path.join(self.directory, name)) for name in files}
+        total = sum(sizes.values())
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            oldest = files.pop(0)
+            total -= sizes[oldest]
+            try:
+                os.remove(os.path.join(self.directory, oldest))
+            except FileNotFoundError:
+                pass
+
+    def list(self):
+        profiles = []
+        for name in reversed(self._files()):
+            document = self.load(name[:-len('.speedscope.json')])
+            if document is not None:
+                profiles.append(document['trademart'])
+        return profiles
+
+    def load(self, profile_id):
+        if not _SAFE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f'{profile_id}.speedscope.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+
+def to_collapsed(document):
+    """Brendan Gregg's collapsed-stack text (flamegraph.pl, speedscope, inferno) for a stored profile"""
+    frames = [frame_name((f['name'], f['file'], f['line'])) for f in document['shared']['frames']]
+    counts = collections.Counter(';'.join(frames[i] for i in sample) for sample in document['profiles'][0]['samples'])
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+class ProfilerMiddleware:
+    """Profile requests armed by an admin header, a sampling rate or a latency threshold.
+
+    Sending ``X-Profile: 1`` together with a valid ``X-Admin-Token`` always
+    profiles that request and returns the profile id in ``X-Profile-Id``.
+    Profiles are written by a background thread, never on the request path.
+    """
+
+    def __init__(self, app, store, sample_rate=0.0, slow_threshold=0.0, admin_token='', interval=0.005):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold
+        self.admin_token = admin_token
+        self.interval = interval
+        self.sampler = None
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-writer')
+
+    def _header_armed(self, scope):
+        if not self.admin_token:
+            return False
+        headers = dict(scope['headers'])
+        if headers.get(b'x-profile', b'').lower() not in (b'1', b'true', b'yes'):
+            return False
+        return hmac.compare_digest(headers.get(b'x-admin-token', b''), self.admin_token.encode('utf-8'))
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        if self._header_armed(scope):
+            trigger = 'header'
+        elif self.sample_rate and random.random() < self.sample_rate:
+            trigger = 'sampled'
+        elif self.slow_threshold:
+            trigger = None
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        if self.sampler is None:
+            self.sampler = StackSampler(self.interval)
+            self.sampler.start()
+
+        profile_id = f'{int(time.time() * 1000)}-{os.urandom(4).hex()}'
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if trigger == 'header':
+                    message['headers'] = list(message.get('headers', [])) + [(b'x-profile-id', profile_id.encode())]
+            await send(message)
+
+        thread_id = threading.get_ident()
+        self.sampler.enter()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            self.sampler.exit()
+            duration = end - start
+            reason = trigger or ('slow' if duration >= self.slow_threshold else None)
+            if reason:
+                route = route_template(scope)
+                meta = {
+                    'id': profile_id,
+                    'trigger': reason,
+                    'method': scope['method'],
+                    'path': scope['path'],
+                    'route': route,
+                    'status': status,
+                    'duration_ms': round(duration * 1000, 3),
+                    'request_id': request_id_var.get(),
+                    'timestamp': time.time(),
+                }
+                stacks = self.sampler.window(start, end, thread_id)
+                meta['samples'] = len(stacks)
+                profiles_captured.inc((route, reason))
+                self._writer.submit(self.store.save, profile_id, meta, stacks, self.interval)
@@ -0,0 +1,332 @@
+# Rate limiting and load shedding: per-client token buckets, per-group concurrency limits, adaptive 503s
+import asyncio
+import collections
+import json
+import logging
+import math
+import time
+from urllib.parse import parse_qsl
+
+try:
+    import redis.asyncio as redis
+except ImportError:
+    redis = None
+
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+QUEUE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+requests_rejected = REGISTRY.counter(
+    'http_requests_rejected_total',
+    'Requests turned away before reaching a route, by endpoint group and reason',
+    ('group', 'reason'),
+)
+queue_delay = REGISTRY.histogram(
+    'http_request_queue_delay_seconds',
+    'Time requests waited for a concurrency slot in their endpoint group',
+    ('group',),
+    buckets=QUEUE_BUCKETS,
+)
+group_in_flight = REGISTRY.gauge(
+    'http_group_requests_in_flight',
+    'Requests holding a concurrency slot, by endpoint group',
+    ('group',),
+)
+group_queued = REGISTRY.gauge(
+    'http_group_requests_queued',
+    'Requests waiting for a concurrency slot, by endpoint group',
+    ('group',),
+)
+
+AUTH_PATHS = frozenset({'/api/auth/login', '/api/auth/register', '/api/auth/google-login'})
+WRITE_METHODS = frozenset({'POST', 'PUT', 'PATCH', 'DELETE'})
+GROUPS = ('login', 'search', 'admin', 'write', 'default')
+
+
+def classify(scope):
+    """Endpoint group of a request, from its method, path and query (routing has not run yet)"""
+    method, path = scope['method'], scope['path'].rstrip('/') or '/'
+    if method == 'POST' and path in AUTH_PATHS:
+        return 'login'
+    if path.startswith('/api/admin/'):
+        return 'admin'
+    if method == 'GET' and path == '/api/products':
+        query = scope.get('query_string', b'').decode('latin-1')
+        if any(key == 'q' and value for key, value in parse_qsl(query)):
+            return 'search'
+    if method in WRITE_METHODS:
+        return 'write'
+    return 'default'
+
+
+def parse_limits(spec, parse_value):
+    """'login=0.5/10,admin=5/20' -> {'login': ..., 'admin': ...}; unknown groups are rejected"""
+    limits = {}
+    for item in filter(None, (part.strip() for part in (spec or '').split(','))):
+        group, _, value = item.partition('=')
+        group = group.strip()
+        if group not in GROUPS:
+            raise ValueError(f"Unknown endpoint group '{group}' (expected one of {', '.join(GROUPS)})")
+        limits[group] = parse_value(value.strip())
+    return limits
+
+
+def parse_rate(value):
+    """'<requests per second>/<burst>' -> (rate, burst)"""
+    rate, _, burst = value.partition('/')
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+class MemoryBuckets:
+    """Token buckets held by this process; each worker enforces its own share of a limit"""
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._buckets = collections.OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, key, rate, burst):
+        """(allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    async def close(self):
+        pass
+
+
+# Refill and take atomically on the server, using the server's clock so every worker agrees
+_TAKE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(now - updated, 0) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every worker and instance.
+
+    If Redis cannot be reached the request is allowed: a rate limiter
+    outage must not take the API down with it.
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        if redis is None:
+            raise RuntimeError("RATE_LIMIT_STORE is a Redis URL but the redis package is not installed")
+        self.prefix = prefix
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(_TAKE_SCRIPT)
+        self._last_error = 0.0
+
+    async def take(self, key, rate, burst):
+        try:
+            allowed, tokens = await self._script(keys=[self.prefix + key], args=[rate, burst])
+        except Exception as e:
+            now = time.monotonic()
+            if now - self._last_error > 60:
+                self._last_error = now
+                logger.warning("Rate limit store unavailable, allowing requests: %s", e)
+            return True, 0.0
+        return bool(allowed), 0.0 if allowed else (1 - float(tokens)) / rate
+
+    async def close(self):
+        await self._client.aclose()
+
+
+def create_bucket_store(spec):
+    """'memory' (default) or a redis:// / rediss:// URL"""
+    if not spec or spec == 'memory':
+        return MemoryBuckets()
+    if spec.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBuckets(spec)
+    raise ValueError(f"Unknown rate limit store '{spec}' (expected 'memory' or a redis:// URL)")
+
+
+class Shed(Exception):
+    def __init__(self, reason, retry_after):
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """At most `limit` requests of one endpoint group at a time in this worker, queueing the rest.
+
+    Shedding follows CoDel: the queue is only considered overloaded when
+    every request over the last `interval` waited longer than `target`, so
+    a short burst is absorbed while a standing queue is not. While
+    overloaded, requests that would have to queue are turned away at once
+    instead of adding to the delay of everyone behind them; the first
+    request that gets a slot within `target` ends the episode. No request
+    waits longer than `max_wait`.
+    """
+
+    def __init__(self, group, limit, target=0.05, interval=0.1, max_wait=2.0):
+        self.group = group
+        self.limit = limit
+        self.target = target
+        self.interval = interval
+        self.max_wait = max_wait
+        self.active = 0
+        self.shedding = False
+        self._waiters = collections.deque()
+        self._above_since = None
+        self._recent_delay = 0.0
+
+    def _retry_after(self):
+        return max(self._recent_delay * 2, 1.0)
+
+    async def acquire(self):
+        arrived = time.monotonic()
+        while self._waiters and self._waiters[0].done():
+            self._waiters.popleft()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._observe(0.0, arrived)
+            return
+        if self.shedding:
+            raise Shed('overloaded', self._retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        group_queued.inc((self.group,))
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if not waiter.done():
+                waiter.cancel()
+                self.shedding = True
+                raise Shed('queue_timeout', self._retry_after())
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()  # the slot was handed over just as the client went away
+            else:
+                waiter.cancel()
+            raise
+        finally:
+            group_queued.dec((self.group,))
+        now = time.monotonic()
+        self._observe(now - arrived, now)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)  # the slot passes straight to the next waiter
+                return
+        self.active -= 1
+
+    def _observe(self, delay, now):
+        queue_delay.observe(delay, (self.group,))
+        self._recent_delay = delay
+        if delay < self.target:
+            self._above_since = None
+            self.shedding = False
+        elif self._above_since is None:
+            self._above_since = now
+        elif now - self._above_since >= self.interval:
+            if not self.shedding:
+                logger.warning("Shedding load for %s: requests queued %.0fms (target %.0fms)",
+                               self.group, delay * 1000, self.target * 1000)
+            self.shedding = True
+
+
+class RateLimitMiddleware:
+    """Reject over-limit clients with 429 and shed overload with 503, both with ``Retry-After``.
+
+    ``rates`` maps an endpoint group (see ``classify``) to ``(requests per
+    second, burst)`` per client IP; ``concurrency`` maps a group to the
+    requests of that group one worker serves at once. ``trust_forwarded`` is
+    the number of proxies in front of the app: the client IP is the
+    X-Forwarded-For hop the outermost of them appended, counted from the
+    right, since clients can put anything to the left of it. With 0 it is the
+    peer address.
+    """
+
+    def __init__(self, app, rates=None, concurrency=None, store=None, target_delay=0.05, interval=0.1,
+                 max_wait=2.0, trust_forwarded=0, exempt_prefixes=('/metrics', '/api/health')):
+        self.app = app
+        self.rates = rates or {}
+        self.store = store or MemoryBuckets()
+        self.gates = {
+            group: ConcurrencyGate(group, limit, target_delay, interval, max_wait)
+            for group, limit in (concurrency or {}).items() if limit > 0
+        }
+        self.trust_forwarded = trust_forwarded
+        self.exempt_prefixes = tuple(exempt_prefixes)
+
+    def client_id(self, scope):
+        if self.trust_forwarded:
+            hops = [hop.strip() for name, value in scope['headers'] if name == b'x-forwarded-for'
+                    for hop in value.decode('latin-1').split(',')]
+            hops = [hop for hop in hops if hop]
+            if hops:
+                return hops[-min(self.trust_forwarded, len(hops))]
+        client = scope.get('client')
+        return client[0] if client else 'unknown'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'].startswith(self.exempt_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        group = classify(scope)
+        rate = self.rates.get(group)
+        if rate is not None and rate[0] > 0:
+            allowed, wait = await self.store.take(f'{group}:{self.client_id(scope)}', *rate)
+            if not allowed:
+                requests_rejected.inc((group, 'rate_limited'))
+                await _reject(send, 429, 'Too many requests', wait)
+                return
+
+        gate = self.gates.get(group)
+        if gate is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await gate.acquire()
+        except Shed as e:
+            requests_rejected.inc((group, e.reason))
+            await _reject(send, 503, 'Server is busy, retry shortly', e.retry_after)
+            return
+        group_in_flight.inc((group,))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group_in_flight.dec((group,))
+            gate.release()
+
+
+async def _reject(send, status, detail, retry_after):
+    body = json.dumps({'detail': detail}).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(body)).encode()),
+            (b'retry-after', str(max(math.ceil(retry_after), 1)).encode()),
+        ],
+    })
+    await send({'type': 'http.response.body', 'body': body})
@@ -0,0 +1,84 @@
+# Bearer token verification with decoded claims cached until expiry, and the TTL cache behind it
+import collections
+import hashlib
+import threading
+import time
+
+from jose import jwt, JWTError
+
+from .metrics import record_cache_lookup
+
+
+class TTLCache:
+    """Bounded mapping whose entries expire `ttl` seconds after being set (or at an explicit time).
+
+    Safe to share between the event loop and threadpool workers; the least
+    recently used entry is dropped once `max_entries` is reached.
+    """
+
+    def __init__(self, name, ttl, max_entries=10_000):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+        record_cache_lookup(self.name, hit=entry is not None)
+        return entry[1] if entry is not None else None
+
+    def set(self, key, value, expires_at=None):
+        expires_at = time.time() + self.ttl if expires_at is None else min(expires_at, time.time() + self.ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class InvalidToken(Exception):
+    pass
+
+
+class TokenVerifier:
+    """Verify access tokens, remembering decoded claims until the token expires.
+
+    Claims are keyed by the SHA-256 of the token, so the token itself is not
+    kept. A cache hit costs a hash and a dict lookup instead of an HMAC check
+    and JSON decoding; an expired token misses and fails verification.
+    """
+
+    def __init__(self, secret, algorithm, max_entries=50_000, max_ttl=3600):
+        self.secret = secret
+        self.algorithm = algorithm
+        self.claims = TTLCache('token_claims', max_ttl, max_entries)
+
+    def verify(self, token):
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        claims = self.claims.get(key)
+        if claims is not None:
+            return claims
+        try:
+            claims = jwt.decode(token, self.secret, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise InvalidToken(str(e))
+        if 'sub' not in claims:
+            raise InvalidToken('Token has no subject')
+        self.claims.set(key, claims, expires_at=claims.get('exp'))
+        return claims
@@ -0,0 +1,313 @@
+# Lightweight distributed tracing: W3C traceparent propagation and OTLP/JSON span export
+import atexit
+import contextlib
+import contextvars
+import json
+import logging
+import queue
+import random
+import threading
+import time
+import urllib.request
+
+from . import metrics, workers
+from .metrics import REGISTRY, route_template
+
+logger = logging.getLogger(__name__)
+
+# OTLP SpanKind values
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_ERROR = 2
+
+spans_dropped = REGISTRY.counter(
+    'trace_spans_dropped_total',
+    'Finished spans discarded because the export queue was full',
+)
+
+current_span = contextvars.ContextVar('trace_span', default=None)
+
+
+class Span:
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'kind', 'start_ns', 'end_ns',
+                 'attributes', 'status', 'status_message')
+
+    def __init__(self, name, trace_id, parent_id=None, kind=SPAN_KIND_INTERNAL, attributes=None):
+        self.trace_id = trace_id
+        self.span_id = '%016x' % random.getrandbits(64)
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.attributes = dict(attributes) if attributes else {}
+        self.status = None
+        self.status_message = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def set_error(self, message):
+        self.status = STATUS_ERROR
+        self.status_message = message
+
+    def to_otlp(self):
+        span = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(self.start_ns),
+            'endTimeUnixNano': str(self.end_ns),
+            'attributes': [_otlp_attribute(k, v) for k, v in self.attributes.items() if v is not None],
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        if self.status is not None:
+            span['status'] = {'code': self.status}
+            if self.status_message:
+                span['status']['message'] = self.status_message
+        return span
+
+
+def _otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {'key': key, 'value': {'boolValue': value}}
+    if isinstance(value, int):
+        return {'key': key, 'value': {'intValue': str(value)}}
+    if isinstance(value, float):
+        return {'key': key, 'value': {'doubleValue': value}}
+    return {'key': key, 'value': {'stringValue': str(value)}}
+
+
+def parse_traceparent(header):
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None if invalid"""
+    if not header:
+        return None
+    parts = header.strip().lower().split('-')
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == 'ff':
+        return None
+    version, trace_id, span_id, flags = parts[:4]
+    if version == '00' and len(parts) != 4:
+        return None
+    if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    if trace_id == '0' * 32 or span_id == '0' * 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+def format_traceparent(span):
+    return f'00-{span.trace_id}-{span.span_id}-01'
+
+
+def outbound_headers(headers=None):
+    """Headers for an outgoing request with the current span's traceparent added"""
+    headers = dict(headers or {})
+    span = current_span.get()
+    if span is not None:
+        headers['traceparent'] = format_traceparent(span)
+    return headers
+
+
+@contextlib.contextmanager
+def start_span(name, kind=SPAN_KIND_INTERNAL, attributes=None):
+    """Child of the current span; a no-op (yields None) outside a sampled request"""
+    parent = current_span.get()
+    if parent is None or _tracer is None:
+        yield None
+        return
+    span = Span(name, parent.trace_id, parent.span_id, kind, attributes)
+    token = current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.set_error(f'{type(e).__name__}: {e}')
+        raise
+    finally:
+        current_span.reset(token)
+        span.end_ns = time.time_ns()
+        _tracer.export(span)
+
+
+class SpanExporter(threading.Thread):
+    """Batch finished spans on a background thread into OTLP/JSON.
+
+    Each batch is one ExportTraceServiceRequest, appended as a line to a file
+    (the layout of the OpenTelemetry Collector's file exporter) and/or POSTed
+    to a collector's OTLP/HTTP endpoint (``<endpoint>/v1/traces``).
+    """
+
+    def __init__(self, service_name, path=None, endpoint=None, max_queue=10000, batch_size=512, interval=1.0):
+        super().__init__(name='span-exporter', daemon=True)
+        self.service_name = service_name
+        self.path = path
+        self.endpoint = endpoint.rstrip('/') + '/v1/traces' if endpoint else None
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stopped = threading.Event()
+
+    def export(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            spans_dropped.inc()
+
+    def run(self):
+        while not self._stopped.is_set():
+            batch = self._drain()
+            if batch:
+                self._write(batch)
+
+    def _drain(self):
+        batch = []
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _payload(self, batch):
+        return {'resourceSpans': [{
+            'resource': {'attributes': [_otlp_attribute('service.name', self.service_name)]},
+            'scopeSpans': [{'scope': {'name': 'trademart.tracing'}, 'spans': [span.to_otlp() for span in batch]}],
+        }]}
+
+    def _write(self, batch):
+        body = json.dumps(self._payload(batch), separators=(',', ':'))
+        if self.path:
+            try:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(body + '\n')
+            except OSError as e:
+                logger.warning("Trace export to %s failed: %s", self.path, e)
+        if self.endpoint:
+            request = urllib.request.Request(self.endpoint, data=body.encode('utf-8'), method='POST',
+                                             headers={'Content-Type': 'application/json'})
+            try:
+                urllib.request.urlopen(request, timeout=5).close()
+            except Exception as e:
+                logger.warning("Trace export to %s failed: %s", self.endpoint, e)
+
+    def flush(self):
+        """Write everything queued so far; used at exit"""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def stop(self):
+        self._stopped.set()
+        # Let the thread write the batch it is holding before draining what is left
+        if self.is_alive():
+            self.join(self.interval + 5)
+        self.flush()
+
+
+_tracer = None
+
+
+def configure_tracing(service_name, path=None, endpoint=None):
+    """Start the exporter; spans are only recorded once this has been called"""
+    global _tracer
+    _tracer = SpanExporter(service_name, path, endpoint)
+    _tracer.start()
+    metrics.span_hook = start_span
+    atexit.register(_stop_tracer)
+    # Threads do not survive fork: each preloaded worker (gunicorn --preload) needs its own exporter
+    workers.after_fork(lambda: _restart_after_fork(service_name, path, endpoint))
+    return _tracer
+
+
+def _restart_after_fork(service_name, path, endpoint):
+    global _tracer
+    if _tracer is not None:
+        _tracer = SpanExporter(service_name, path, endpoint)
+        _tracer.start()
+
+
+def _stop_tracer():
+    if _tracer is not None:
+        _tracer.stop()
+
+
+class TracingMiddleware:
+    """Open a server span per request, continuing the caller's trace from ``traceparent``.
+
+    The caller's sampled flag is honoured; requests without one are sampled
+    at ``sample_rate``. Sampled responses carry a W3C ``traceresponse``
+    header naming the trace and server span.
+    """
+
+    def __init__(self, app, sample_rate=1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for name, value in scope['headers']:
+            if name == b'traceparent':
+                parent = parse_traceparent(value.decode('latin-1'))
+                break
+        if parent is not None:
+            trace_id, parent_id, sampled = parent
+        else:
+            trace_id, parent_id = '%032x' % random.getrandbits(128), None
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        span = Span(scope['method'], trace_id, parent_id, SPAN_KIND_SERVER, {
+            'http.request.method': scope['method'],
+            'url.path': scope['path'],
+        })
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'traceresponse', format_traceparent(span).encode())]
+            await send(message)
+
+        token = current_span.set(span)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            span.set_error(f'{type(e).__name__}: {e}')
+            raise
+        finally:
+            current_span.reset(token)
+            span.end_ns = time.time_ns()
+            route = route_template(scope)
+            span.name = f"{scope['method']} {route}"
+            span.set_attribute('http.route', route)
+            span.set_attribute('http.response.status_code', status)
+            if status >= 500 and span.status is None:
+                span.set_error(f'HTTP {status}')
+            _tracer.export(span)
@@ -0,0 +1,29 @@
+# Server worker lifecycle: per-worker re-initialisation after fork
+# Imported by backend.server in the gunicorn master, so it must not import backend.config
+import logging
+
+logger = logging.getLogger(__name__)
+
+_after_fork = []
+
+
+def after_fork(func):
+    """Run `func` in each gunicorn worker forked from a preloaded master.
+
+    Background threads and open connections do not survive fork, so modules
+    that start them register here to start fresh ones. Unlike
+    os.register_at_fork this does not fire in ProcessPoolExecutor children
+    (password hashing, image resizing), which need neither.
+    """
+    _after_fork.append(func)
+    return func
+
+
+def worker_started():
+    """Called by ProductionWorker.init_process in the newly forked worker"""
+    for func in _after_fork:
+        try:
+            func()
+        except Exception:
+            logger.exception("After-fork hook %s failed", getattr(func, '__name__', func))
+
@@ -3,12 +3,12 @@ import { Link } from 'react-router-dom';
 import { useAuth } from '../../context/AuthContext';
 import { useToast } from '../Common/Toast';
 import { cartAPI } from '../../services/api';
+import { productImageUrl, productImageSrcSet } from '../../services/images';
 import './Product.css';
 
 const ProductCard = ({ product }) => {
   const { user, isBuyer } = useAuth();
   const toast = useToast();
-  const apiBaseUrl = 'http://localhost:8000';
   const [imageLoaded, setImageLoaded] = useState(false);
   const [isWideImage, setIsWideImage] = useState(false);
 
@@ -34,25 +34,25 @@ const ProductCard = ({ product }) => {
     setImageLoaded(true);
   };
 
-  const getImageUrl = (imagePath) => {
+  const getImageUrl = () => {
     // If no image, return category specific placeholder if possible, or general placeholder
-    if (!imagePath) {
+    if (!product.image) {
       if (product.category_name === 'Electronics') return '/images/products/electronics.jpg';
       if (product.category_name === 'Furniture') return '/images/products/furniture.jpg';
       if (product.category_name === 'Clothing') return '/images/products/perfume.jpg'; // Using perfume for fashion-ish
       return '/images/products/placeholder.jpg';
     }
-    // If it's a full URL (e.g. from seed data), use it
-    if (imagePath.startsWith('http')) return imagePath;
-    // Otherwise serve from backend static files
-    return `${apiBaseUrl}/uploads/${imagePath}`;
+    // Cards are at most 280px tall: a 320px-wide copy instead of the original
+    return productImageUrl(product, 320);
   };
 
   return (
     <Link to={`/products/${product.id}`} className="product-card">
       <div className={`product-image ${isWideImage ? 'cover-fit' : ''}`}>
         <img 
-          src={getImageUrl(product.image)} 
+          src={getImageUrl()} 
+          srcSet={productImageSrcSet(product, 320)}
+          loading="lazy"
           alt={product.name}
           onLoad={handleImageLoad}
           onError={(e) => {
@@ -4,6 +4,7 @@ import { Link, useNavigate } from 'react-router-dom';
 import { cartAPI } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 import { useToast } from '../components/Common/Toast';
+import { productImageUrl } from '../services/images';
 import './Cart.css';
 
 const Cart = () => {
@@ -79,11 +80,7 @@ const Cart = () => {
     return cartItems.reduce((total, item) => total + (item.product.price * item.quantity), 0);
   };
 
-  const getImageUrl = (imagePath) => {
-    if (!imagePath) return '/images/products/placeholder.jpg';
-    if (imagePath.startsWith('http')) return imagePath;
-    return `http://localhost:8000/uploads/${imagePath}`;
-  };
+  const getImageUrl = (product) => productImageUrl(product, 160) || '/images/products/placeholder.jpg';
 
   if (loading) return <div className="loading">Loading cart...</div>;
 
@@ -108,7 +105,7 @@ const Cart = () => {
                 <div key={item.id} className="cart-item">
                   <div className="item-image">
                     <img 
-                      src={getImageUrl(item.product.image)} 
+                      src={getImageUrl(item.product)} 
                       alt={item.product.name}
                       onError={(e) => {e.target.src = '/images/products/placeholder.jpg'}}
                     />
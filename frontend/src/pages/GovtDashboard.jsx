@@ -4,6 +4,7 @@ import { useAuth } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import { useToast } from '../components/Common/Toast';
 import { adminAPI } from '../services/api';
+import { productImageUrl } from '../services/images';
 import './GovtDashboard.css';
 
 const GovtDashboard = () => {
@@ -110,7 +111,7 @@ const GovtDashboard = () => {
     <div key={product.id} className="product-approval-card">
       <div className="product-image-section">
         {product.image ? (
-          <img src={product.image} alt={product.name} />
+          <img src={productImageUrl(product, 320)} alt={product.name} loading="lazy" />
         ) : (
           <div className="no-image"><i className="fas fa-image"></i></div>
         )}
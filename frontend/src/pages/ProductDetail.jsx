@@ -5,6 +5,7 @@ import { productsAPI, cartAPI, offersAPI } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 import { useToast } from '../components/Common/Toast';
 import ProductCard from '../components/Product/ProductCard';
+import { productImageUrl } from '../services/images';
 import './ProductDetail.css';
 
 const ProductDetail = () => {
@@ -16,7 +17,6 @@ const ProductDetail = () => {
   const [error, setError] = useState('');
   const [offerPrice, setOfferPrice] = useState('');
   const [offerSubmitLoading, setOfferSubmitLoading] = useState(false);
-  const apiBaseUrl = 'http://localhost:8000';
 
   useEffect(() => {
     fetchProduct();
@@ -62,11 +62,7 @@ const ProductDetail = () => {
     }
   };
 
-  const getImageUrl = (imagePath) => {
-    if (!imagePath) return '/images/products/placeholder.jpg';
-    if (imagePath.startsWith('http')) return imagePath;
-    return `${apiBaseUrl}/uploads/${imagePath}`;
-  };
+  const getImageUrl = (product) => productImageUrl(product, 1280) || '/images/products/placeholder.jpg';
 
   if (loading) return <div className="loading">Loading product details...</div>;
   if (error) return <div className="container error-container">{error} <Link to="/products">Back to products</Link></div>;
@@ -80,7 +76,7 @@ const ProductDetail = () => {
           <div className="product-gallery">
             <div className="main-image">
               <img 
-                src={getImageUrl(product.image)} 
+                src={getImageUrl(product)} 
                 alt={product.name} 
                 onError={(e) => {e.target.src = '/images/products/placeholder.jpg'}}
               />
@@ -2,6 +2,7 @@
 import { useState, useEffect } from 'react';
 import { useNavigate, useParams, Link } from 'react-router-dom';
 import { productsAPI } from '../services/api';
+import { productImageUrl } from '../services/images';
 import { useAuth } from '../context/AuthContext';
 import { useToast } from '../components/Common/Toast';
 import './SellerProductForm.css';
@@ -61,7 +62,7 @@ const SellerProductForm = () => {
           condition_id: product.condition_id,
           negotiable: product.negotiable
         });
-        setCurrentImage(product.image);
+        setCurrentImage(product.image ? { image: product.image, image_variants: product.image_variants } : null);
       }
     } catch (err) {
       console.error('Error fetching initial data:', err);
@@ -216,7 +217,7 @@ const SellerProductForm = () => {
              <div className="form-group">
                <label>Current Image</label>
                <div className="current-image-preview">
-                 <img src={currentImage.startsWith('http') ? currentImage : `http://localhost:8000/uploads/${currentImage}`} alt="Current" />
+                 <img src={productImageUrl(currentImage, 640)} alt="Current" />
                  <p className="note">Image updates are not supported in edit mode currently.</p>
                </div>
              </div>
@@ -4,6 +4,7 @@ import { Link, useNavigate } from 'react-router-dom';
 import { productsAPI } from '../services/api';
 import { useAuth } from '../context/AuthContext';
 import { useToast } from '../components/Common/Toast';
+import { productImageUrl } from '../services/images';
 import './SellerProducts.css';
 
 const SellerProducts = () => {
@@ -43,11 +44,7 @@ const SellerProducts = () => {
     }
   };
 
-  const getImageUrl = (imagePath) => {
-    if (!imagePath) return '/images/products/placeholder.jpg';
-    if (imagePath.startsWith('http')) return imagePath;
-    return `http://localhost:8000/uploads/${imagePath}`;
-  };
+  const getImageUrl = (product) => productImageUrl(product, 320) || '/images/products/placeholder.jpg';
 
   if (loading) return <div className="loading">Loading products...</div>;
 
@@ -71,7 +68,7 @@ const SellerProducts = () => {
             {products.map(product => (
               <div key={product.id} className="seller-product-card">
                 <div className="product-image">
-                  <img src={getImageUrl(product.image)} alt={product.name} />
+                  <img src={getImageUrl(product)} alt={product.name} loading="lazy" />
                   <span className={`status-badge ${product.status}`}>
                     {product.status}
                   </span>
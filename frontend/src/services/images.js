@@ -0,0 +1,32 @@
+// Product image URLs: resized copies from the backend's /api/images endpoint instead of full-size originals
+const BACKEND_URL = 'http://localhost:8000';
+// Where the backend serves stored variants; must match its IMAGE_BASE_URL (set VITE_IMAGE_BASE_URL in frontend/.env)
+const MEDIA_BASE_URL = (import.meta.env.VITE_IMAGE_BASE_URL || '/media').replace(/\/+$/, '');
+
+// Variants the upload pipeline stores for each image, by longest edge
+const VARIANT_WIDTHS = [['thumb', 320], ['medium', 800], ['full', 1920]];
+
+// The smallest stored variant at least `width` wide, so the resizer starts from as few pixels as possible
+const storedVariant = (product, width) => {
+  const variants = product.image_variants || {};
+  const match = VARIANT_WIDTHS.find(([name, edge]) => edge >= width && variants[name]);
+  return match ? variants[match[0]] : product.image;
+};
+
+export const productImageUrl = (product, width) => {
+  if (!product?.image) return null;
+  const image = storedVariant(product, width);
+  // Externally hosted (ImgBB): the stored variant is used as is
+  if (image.startsWith('http')) return image;
+  const source = image.startsWith(`${MEDIA_BASE_URL}/`)
+    ? `media/${image.slice(MEDIA_BASE_URL.length + 1)}`
+    : `uploads/${image}`;
+  return `${BACKEND_URL}/api/images/${source}?w=${width}`;
+};
+
+// 1x/2x candidates so high-density screens get a sharp image without downloading the original
+export const productImageSrcSet = (product, width) => {
+  const image = product?.image;
+  if (!image || image.startsWith('http')) return undefined;
+  return `${productImageUrl(product, width)} 1x, ${productImageUrl(product, width * 2)} 2x`;
+};
@@ -1,9 +1,16 @@
+import argparse
 import subprocess
 import sys
 import os
 import platform
 import time
 import signal
+import importlib.util
+
+try:
+    from dotenv import load_dotenv
+except ImportError:
+    load_dotenv = None
 
 def handle_exit(signum, frame):
     print("\nStopping servers...")
@@ -90,5 +97,98 @@ def start_servers():
                     p.kill()
         print("Goodbye!")
 
+def cpu_count():
+    # Respect CPU affinity / container cpusets where the platform exposes them
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def parse_args(argv=None):
+    env = os.environ.get
+    parser = argparse.ArgumentParser(description="Start the Trade Mart backend and frontend")
+    parser.add_argument('--prod', action='store_true',
+                        help='serve the backend only, with multiple workers and no auto-reload')
+    parser.add_argument('--host', default=env('WEB_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=int(env('PORT', 8000)))
+    parser.add_argument('--workers', type=int, default=int(env('WEB_CONCURRENCY', 0)),
+                        help='worker processes (default: one per available CPU)')
+    parser.add_argument('--limit-concurrency', type=int, default=int(env('WEB_LIMIT_CONCURRENCY', 1000)),
+                        help='concurrent connections per worker before answering 503')
+    parser.add_argument('--backlog', type=int, default=int(env('WEB_BACKLOG', 2048)),
+                        help='pending connections the listening socket queues')
+    parser.add_argument('--graceful-timeout', type=int, default=int(env('WEB_GRACEFUL_TIMEOUT', 30)),
+                        help='seconds in-flight requests get to finish after SIGTERM')
+    parser.add_argument('--keep-alive', type=int, default=int(env('WEB_KEEP_ALIVE', 5)),
+                        help='seconds an idle keep-alive connection stays open')
+    parser.add_argument('--max-requests', type=int, default=int(env('WEB_MAX_REQUESTS', 10000)),
+                        help='restart a worker after this many requests (0 disables)')
+    parser.add_argument('--max-requests-jitter', type=int, default=int(env('WEB_MAX_REQUESTS_JITTER', 1000)),
+                        help='random extra requests per worker so restarts are staggered')
+    return parser.parse_args(argv)
+
+def production_command(args, workers):
+    """gunicorn with preloaded app and recycled workers, or plain uvicorn workers without gunicorn"""
+    if importlib.util.find_spec('gunicorn') is not None:
+        cmd = [
+            sys.executable, "-m", "gunicorn", "backend.main:app",
+            "--worker-class", "backend.server.ProductionWorker",
+            "--preload",
+            "--workers", str(workers),
+            "--bind", f"{args.host}:{args.port}",
+            "--backlog", str(args.backlog),
+            "--worker-connections", str(args.limit_concurrency),
+            "--graceful-timeout", str(args.graceful_timeout),
+            "--keep-alive", str(args.keep_alive),
+            "--max-requests", str(args.max_requests),
+            "--max-requests-jitter", str(args.max_requests_jitter),
+        ]
+        if os.path.isdir('/dev/shm'):
+            # Heartbeat files on tmpfs, so a slow disk cannot make healthy workers look hung
+            cmd += ["--worker-tmp-dir", "/dev/shm"]
+        return cmd
+
+    has = lambda module: importlib.util.find_spec(module) is not None
+    cmd = [
+        sys.executable, "-m", "uvicorn", "backend.main:app",
+        "--host", args.host,
+        "--port", str(args.port),
+        "--workers", str(workers),
+        "--loop", "uvloop" if has('uvloop') else "auto",
+        "--http", "httptools" if has('httptools') else "auto",
+        "--limit-concurrency", str(args.limit_concurrency),
+        "--backlog", str(args.backlog),
+        "--timeout-keep-alive", str(args.keep_alive),
+        "--timeout-graceful-shutdown", str(args.graceful_timeout),
+    ]
+    # uvicorn's own supervisor does not replace workers that exit, so --limit-max-requests
+    # would shrink the pool; preloading and recycling need gunicorn
+    print("⚠️  gunicorn is not installed: the app is imported per worker and workers are not recycled.")
+    return cmd
+
+def start_production(args):
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    workers = args.workers or cpu_count()
+    storage = os.environ.get('STORAGE_BACKEND', 'firestore')
+    if storage == 'memory' and workers > 1:
+        print("⚠️  STORAGE_BACKEND=memory keeps data per process; using a single worker.")
+        workers = 1
+
+    cmd = production_command(args, workers)
+    print(f"🚀 Starting Trade Mart backend: {workers} worker(s) on http://{args.host}:{args.port}")
+    os.chdir(project_root)
+    if platform.system().lower() == 'windows':
+        sys.exit(subprocess.call(cmd))
+    # Replace this process so SIGTERM from a supervisor or container runtime reaches the
+    # server directly and starts its graceful drain
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    os.execv(cmd[0], cmd)
+
 if __name__ == "__main__":
-    start_servers()
+    if load_dotenv is not None:
+        load_dotenv()
+    args = parse_args()
+    if args.prod:
+        start_production(args)
+    else:
+        start_servers()